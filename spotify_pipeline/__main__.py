@@ -0,0 +1,6 @@
+import sys
+
+from spotify_pipeline.cli import main
+
+
+sys.exit(main())
@@ -0,0 +1,92 @@
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+from spotify_pipeline import config
+from spotify_pipeline.benchmarks.synthetic import generate_n_plays, to_records
+from spotify_pipeline.models.database import create_writer_engine
+from spotify_pipeline.models.spotify_models import Base, init_db
+from spotify_pipeline.resources.bulk_loader import DEFAULT_CHUNK_SIZE, upsert_plays
+from spotify_pipeline.visualization import data_loader
+
+
+def _timed(fn, repeat=1):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    return statistics.median(seconds)
+
+
+def dashboard_reads(start=None, end=None):
+    """
+    The exact dashboard queries: rollup tables without a filter, the plays table with one
+    """
+
+    data_loader.load_summary(start=start, end=end)
+    data_loader.load_top_artists(10, start=start, end=end)
+    data_loader.load_top_tracks(10, start=start, end=end)
+    data_loader.load_daily_counts(start=start, end=end)
+    data_loader.load_hourly_counts(start=start, end=end)
+
+
+def run(url, frame, chunk_size, repeat):
+    """
+    Load the history into an empty schema, reload it (all conflicts), then time the dashboard reads
+    :return: dict of seconds per step
+    """
+
+    engine = create_writer_engine(url)
+    Base.metadata.drop_all(engine)
+    init_db(engine)
+    records = to_records(frame)
+
+    results = {
+        "load": _timed(lambda: upsert_plays(records, engine, chunk_size=chunk_size)),
+        "reload": _timed(lambda: upsert_plays(records, engine, chunk_size=chunk_size)),
+    }
+
+    # the dashboard readers follow the configured database
+    config.DATABASE_URL = url
+    days = data_loader.pd.to_datetime(frame["played_at"], unit="ms").dt.date
+    last_month = days.max().replace(day=1)
+    results["rollups"] = _timed(dashboard_reads, repeat)
+    results["all_days"] = _timed(lambda: dashboard_reads(days.min(), days.max()), repeat)
+    results["one_month"] = _timed(lambda: dashboard_reads(last_month, days.max()), repeat)
+    engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load and dashboard query times on SQLite against Postgres")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each read, the median is shown")
+    parser.add_argument("--postgres-url", default=os.getenv("SPOTIFY_BENCH_POSTGRES_URL"),
+                        help="scratch Postgres database: its pipeline tables are dropped and recreated")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    workdir = tempfile.mkdtemp(prefix="spotify_backends_")
+    backends = [("sqlite", f"sqlite:///{os.path.join(workdir, 'bench.db')}")]
+    if args.postgres_url:
+        backends.append(("postgres", args.postgres_url))
+    else:
+        print("No --postgres-url given, timing SQLite only.")
+
+    steps = ["load", "reload", "rollups", "all_days", "one_month"]
+    print(f"{'plays':>10} {'backend':<9}" + "".join(f" {step:>10}" for step in steps))
+    for n in args.sizes:
+        frame = generate_n_plays(n, users=args.users)
+        for name, url in backends:
+            results = run(url, frame, args.chunk_size, args.repeat)
+            print(f"{len(frame):>10} {name:<9}" + "".join(f" {results[step]:9.2f}s" for step in steps))
+
+
+if __name__ == "__main__":
+    main()
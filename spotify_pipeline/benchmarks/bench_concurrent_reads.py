@@ -0,0 +1,92 @@
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from sqlalchemy import text
+
+from spotify_pipeline.benchmarks.bench_save_tracks import make_rows
+from spotify_pipeline.models.database import create_reader_engine, create_writer_engine
+from spotify_pipeline.models.spotify_models import Base
+from spotify_pipeline.resources.bulk_loader import upsert_plays
+
+
+DASHBOARD_QUERY = text("""
+    SELECT a.name, COUNT(*) AS play_count
+    FROM plays p JOIN artists a ON a.id = p.artist_id
+    GROUP BY a.name ORDER BY play_count DESC LIMIT 10
+""")
+
+
+def run(label, pragmas, seconds, readers, batch, seed_rows, directory=None):
+    """
+    One writer loads batches continuously while `readers` threads run a dashboard query
+    """
+
+    workdir = tempfile.mkdtemp(prefix="spotify_bench_", dir=directory)
+    url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    writer = create_writer_engine(url, pragmas=pragmas)
+    Base.metadata.create_all(writer)
+    upsert_plays(make_rows(seed_rows), writer, chunk_size=batch)
+    reader = create_reader_engine(url, pragmas=pragmas, pool_size=readers)
+
+    stop = threading.Event()
+    latencies, errors, written = [], [], [0]
+    lock = threading.Lock()
+
+    def write_loop():
+        offset = seed_rows
+        while not stop.is_set():
+            written[0] += upsert_plays(make_rows(batch, seed=offset, offset=offset), writer, chunk_size=batch).inserted
+            offset += batch
+
+    def read_loop():
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                with reader.connect() as conn:
+                    conn.execute(DASHBOARD_QUERY).fetchall()
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+
+    threads = [threading.Thread(target=write_loop)] + [threading.Thread(target=read_loop) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    writer.dispose()
+    reader.dispose()
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95)] if latencies else float("nan")
+    p50 = statistics.median(latencies) if latencies else float("nan")
+    return label, written[0] / seconds, len(latencies) / seconds, p50 * 1000, p95 * 1000, latencies[-1] * 1000 if latencies else float("nan"), len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dashboard reads while the ETL writes: default journal vs tuned WAL profile")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--seed-rows", type=int, default=100_000)
+    parser.add_argument("--dir", default=None, help="where to create the database (use a real disk, not tmpfs)")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'profile':<10} {'rows/s':>9} {'reads/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'errors':>7}")
+    for label, pragmas in (("default", {}), ("tuned", None)):
+        row = run(label, pragmas, args.seconds, args.readers, args.batch, args.seed_rows, args.dir)
+        print(f"{row[0]:<10} {row[1]:9.0f} {row[2]:8.1f} {row[3]:8.1f} {row[4]:8.1f} {row[5]:8.1f} {row[6]:>7}")
+
+
+if __name__ == "__main__":
+    main()
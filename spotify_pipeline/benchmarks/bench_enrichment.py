@@ -0,0 +1,58 @@
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from spotify_pipeline.benchmarks.mock_spotify import MockSpotifyServer, make_history
+from spotify_pipeline.models.spotify_models import Base
+from spotify_pipeline.resources.enrichment import MetadataEnricher
+from spotify_pipeline.resources.play_store import PlayBatch
+
+
+class StaticAuth:
+    """
+    Stands in for SpotifyAuth; the mock accepts any token
+    """
+
+    def get_access_token(self):
+        return "mock-token"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Metadata enrichment API calls per 10k plays against the local mock")
+    parser.add_argument("--plays", type=int, default=10_000)
+    parser.add_argument("--page-size", type=int, default=1000, help="plays handed to the enricher per load chunk")
+    parser.add_argument("--loads", type=int, default=3, help="repeat the load to show cache hits")
+    parser.add_argument("--rate", type=float, default=10, help="request rate limit (req/s, 0 disables)")
+    args = parser.parse_args()
+    os.environ["SPOTIFY_RATE_LIMIT"] = str(args.rate)
+
+    logging.getLogger().setLevel(logging.ERROR)
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='spotify_bench_'), 'enrich.db')}")
+    Base.metadata.create_all(engine)
+    # the records a load hands to the enricher: its PlayBatch, iterated
+    records = list(PlayBatch.from_items(make_history(args.plays), "bench_user"))
+
+    # the old per-track approach: one request per play for each of track, artist and album
+    print(f"per-play requests: {3 * 10_000:,} calls per 10k plays (track, artist and album)")
+
+    print(f"{'load':>5} {'api calls':>10} {'calls/10k':>10} {'cache hits':>11} {'fetched':>8} {'secs':>6}")
+    with MockSpotifyServer() as server:
+        MetadataEnricher.API_BASE = server.url + "/v1"
+        for load in range(1, args.loads + 1):
+            # a fresh enricher per load so stats cover that load only; the cache table persists
+            enricher = MetadataEnricher(engine, StaticAuth())
+            start = time.perf_counter()
+            for i in range(0, len(records), args.page_size):
+                enricher.enrich(records[i:i + args.page_size])
+            elapsed = time.perf_counter() - start
+            stats = enricher.stats
+            print(f"{load:>5} {stats.api_calls:>10} {stats.calls_per_10k_plays:>10.1f} "
+                  f"{stats.cache_hits:>11} {stats.fetched:>8} {elapsed:6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from spotify_pipeline.benchmarks.mock_spotify import MockSpotifyServer, make_history
+from spotify_pipeline.resources.http_client import SpotifyHttpClient, TokenBucket
+
+RECENTLY_PLAYED = "/v1/me/player/recently-played"
+
+
+def walk_bare(base_url):
+    """
+    The previous behaviour: bare requests.get, stop at the first non-200
+    """
+
+    pages, params = 0, {"limit": 50}
+    while True:
+        response = requests.get(base_url + RECENTLY_PLAYED, params=params)
+        if response.status_code != 200:
+            return pages, False
+        pages += 1
+        data = response.json()
+        if not data["next"]:
+            return pages, True
+        params = {"limit": 50, "before": data["cursors"]["before"]}
+
+
+def walk_client(base_url, client):
+    pages, params = 0, {"limit": 50}
+    while True:
+        response = client.get(base_url + RECENTLY_PLAYED, params=params)
+        if response.status_code != 200:
+            return pages, False
+        pages += 1
+        data = response.json()
+        if not data["next"]:
+            return pages, True
+        params = {"limit": 50, "before": data["cursors"]["before"]}
+
+
+def run(plays, jobs, fault_rate, rate):
+    history = make_history(plays)
+    rows = []
+    for label in ("bare requests", "pooled client"):
+        with MockSpotifyServer(history=history, fault_rate=fault_rate, seed=1) as server:
+            client = SpotifyHttpClient(
+                backoff_base=0.01, backoff_max=1.0, max_retries=10,
+                rate_limiter=TokenBucket(rate) if rate else None, pool_maxsize=jobs,
+            )
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                if label == "bare requests":
+                    results = list(pool.map(lambda _: walk_bare(server.url), range(jobs)))
+                else:
+                    results = list(pool.map(lambda _: walk_client(server.url, client), range(jobs)))
+            elapsed = time.perf_counter() - start
+            client.close()
+
+            pages = sum(p for p, _ in results)
+            completed = sum(1 for _, done in results if done)
+            rows.append((label, completed, jobs, pages, elapsed, pages / elapsed, server.stats["faults"], client.retry_count))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk the mock recently-played endpoint with injected 429/503 faults")
+    parser.add_argument("--plays", type=int, default=5000)
+    parser.add_argument("--jobs", type=int, default=4, help="concurrent extraction jobs")
+    parser.add_argument("--fault-rate", type=float, default=0.2)
+    parser.add_argument("--rate", type=float, default=0, help="shared token bucket rate (requests/s), 0 disables")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+
+    print(f"{'client':<15} {'complete':>9} {'pages':>7} {'secs':>7} {'pages/s':>8} {'faults':>7} {'retries':>8}")
+    for label, completed, jobs, pages, elapsed, throughput, faults, retries in run(args.plays, args.jobs, args.fault_rate, args.rate):
+        print(f"{label:<15} {completed:>4}/{jobs:<4} {pages:>7} {elapsed:7.2f} {throughput:8.1f} {faults:>7} {retries:>8}")
+
+
+if __name__ == "__main__":
+    main()
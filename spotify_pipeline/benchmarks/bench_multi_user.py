@@ -0,0 +1,48 @@
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from spotify_pipeline.benchmarks.mock_spotify import MockSpotifyServer, make_history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-user extraction against a local mock of recently-played")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--plays", type=int, default=50, help="plays served per user")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--latency", type=float, default=0.05, help="mock API latency per request (s)")
+    parser.add_argument("--rate", type=float, default=200, help="global request rate limit (req/s)")
+    args = parser.parse_args()
+
+    # the database and token cache live in the working directory, keep them out of the repo
+    workdir = tempfile.mkdtemp(prefix="spotify_bench_")
+    os.chdir(workdir)
+    os.environ["SPOTIFY_RATE_LIMIT"] = str(args.rate)
+    os.environ["SPOTIFY_HTTP_POOL_SIZE"] = str(max(args.workers))
+
+    from spotify_pipeline.pipelines.fetch_all_users import run_all
+    from spotify_pipeline.resources.spotify_auth import SpotifyAuth
+    from spotify_pipeline.resources.spotify_data import SpotifyData
+
+    logging.getLogger().setLevel(logging.ERROR)
+
+    print(f"{'workers':>8} {'users':>6} {'failed':>7} {'rows':>8} {'secs':>7} {'users/min':>10}")
+    with MockSpotifyServer(history=make_history(args.plays), latency=args.latency) as server:
+        SpotifyAuth.AUTH_URL = server.url + "/api/token"
+        SpotifyData.BASE_URL = server.url + "/v1/me/player/recently-played"
+
+        for workers in args.workers:
+            # fresh user ids per round so every run starts without watermark or cached token
+            registry = [{"user_id": f"w{workers}_user{i}", "refresh_token": "mock"} for i in range(args.users)]
+            start = time.perf_counter()
+            results = run_all(registry, max_workers=workers)
+            elapsed = time.perf_counter() - start
+            failed = sum(1 for r in results if not r.ok)
+            rows = sum(r.inserted for r in results)
+            print(f"{workers:>8} {len(results):>6} {failed:>7} {rows:>8} {elapsed:7.2f} {len(results) / elapsed * 60:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
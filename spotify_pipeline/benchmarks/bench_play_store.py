@@ -0,0 +1,72 @@
+import argparse
+import gc
+import time
+import tracemalloc
+
+import pandas as pd
+
+from spotify_pipeline.benchmarks.synthetic import generate_n_plays, to_api_items
+from spotify_pipeline.resources.play_store import PlayBatch
+from spotify_pipeline.resources.transform import flatten_play
+
+
+PAGE_SIZE = 50
+
+
+def records_frame(pages, user_id):
+    """
+    The previous transform: flattened record dicts for the whole history, then a DataFrame of them
+    """
+
+    records = []
+    for page in pages:
+        records += [flatten_play(item, user_id) for item in page]
+    for record in records:
+        record["artist_name"] = record["artists"][0][1] if record["artists"] else None
+    return records, pd.DataFrame(records)
+
+
+def play_batch_frame(pages, user_id):
+    batch = PlayBatch()
+    for page in pages:
+        batch.extend(page, user_id)
+    return batch, batch.to_pandas()
+
+
+def measure(build, pages):
+    """
+    :return: (seconds, bytes still allocated by the result, peak bytes while building)
+    """
+
+    # timed without tracing: tracemalloc slows every small allocation down
+    gc.collect()
+    start = time.perf_counter()
+    build(pages, "bench")
+    seconds = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    result = build(pages, "bench")
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return seconds, retained, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory of the interned PlayBatch vs flattened record dicts")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'plays':>10} {'store':<14} {'seconds':>8} {'retained MB':>12} {'peak MB':>9} {'bytes/play':>11}")
+    for n in args.sizes:
+        items = to_api_items(generate_n_plays(n))
+        pages = [items[i:i + PAGE_SIZE] for i in range(0, len(items), PAGE_SIZE)]
+        for label, build in (("records", records_frame), ("PlayBatch", play_batch_frame)):
+            seconds, retained, peak = measure(build, pages)
+            print(f"{len(items):>10} {label:<14} {seconds:8.2f} {retained / 2**20:12.1f} {peak / 2**20:9.1f} "
+                  f"{retained / len(items):11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import argparse
+import logging
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, Column, String
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+from spotify_pipeline.models.spotify_models import Base
+from spotify_pipeline.resources.bulk_loader import DEFAULT_CHUNK_SIZE, upsert_plays
+
+
+LegacyBase = declarative_base()
+
+
+class LegacyTrack(LegacyBase):
+    """
+    The original one-text-row-per-play table the merge loop wrote to
+    """
+    __tablename__ = "tracks_merge_bench"
+    user_id = Column(String, primary_key=True)
+    id = Column(String, primary_key=True)
+    name = Column(String)
+    artist = Column(String)
+    album = Column(String)
+    played_at = Column(String, primary_key=True)
+
+
+def make_rows(n, seed=0, offset=0):
+    """
+    Generate n synthetic flattened play records, the first one `offset` plays after the base time
+    """
+
+    rng = random.Random(seed)
+    base_ms = 1_700_000_000_000
+    rows = []
+    for i in range(offset, offset + n):
+        track_no = rng.randrange(5000)
+        artist_no = track_no % 500
+        rows.append({
+            "user_id": "bench",
+            "track_id": f"track{track_no:05d}",
+            "track_name": f"Song {track_no}",
+            "duration_ms": 180_000,
+            "album_id": f"album{track_no % 1500:05d}",
+            "album_name": f"Album {track_no % 1500}",
+            "artists": [(f"artist{artist_no:04d}", f"Artist {artist_no}")],
+            "played_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime((base_ms + i * 180_000) / 1000)) + ".000Z",
+        })
+    return rows
+
+
+def merge_loop(rows, engine):
+    """
+    The previous per-row session.merge path (with the commit actually called)
+    """
+
+    session = sessionmaker(bind=engine)()
+    for row in rows:
+        session.merge(LegacyTrack(
+            user_id=row["user_id"], id=row["track_id"], name=row["track_name"],
+            artist=row["artists"][0][1], album=row["album_name"], played_at=row["played_at"],
+        ))
+    session.commit()
+    session.close()
+
+
+def _fresh_engine(database_url, workdir, label):
+    if database_url:
+        engine = create_engine(database_url)
+        LegacyBase.metadata.drop_all(engine)
+        Base.metadata.drop_all(engine)
+    else:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, label)}.db")
+    LegacyBase.metadata.create_all(engine)
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def run(sizes, chunk_size, merge_max, database_url=None):
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in sizes:
+            rows = make_rows(n)
+
+            engine = _fresh_engine(database_url, workdir, f"bulk_{n}")
+            start = time.perf_counter()
+            load = upsert_plays(rows, engine, chunk_size=chunk_size)
+            bulk_s = time.perf_counter() - start
+            # reloading the same rows measures the all-conflict path
+            start = time.perf_counter()
+            upsert_plays(rows, engine, chunk_size=chunk_size)
+            reload_s = time.perf_counter() - start
+            engine.dispose()
+
+            merge_s = None
+            if n <= merge_max:
+                engine = _fresh_engine(database_url, workdir, f"merge_{n}")
+                start = time.perf_counter()
+                merge_loop(rows, engine)
+                merge_s = time.perf_counter() - start
+                engine.dispose()
+
+            results.append((n, load.inserted, bulk_s, reload_s, merge_s))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark bulk upsert against the session.merge loop")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--merge-max", type=int, default=1_000_000,
+                        help="skip the merge loop for sizes above this (it is very slow)")
+    parser.add_argument("--database-url", default=None,
+                        help="run against this database instead of a temporary SQLite file")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'rows':>10} {'inserted':>10} {'bulk s':>10} {'reload s':>10} {'merge s':>10} {'speedup':>8}")
+    for n, inserted, bulk_s, reload_s, merge_s in run(args.sizes, args.chunk_size, args.merge_max, args.database_url):
+        merge_col = f"{merge_s:10.2f}" if merge_s is not None else f"{'-':>10}"
+        speedup = f"{merge_s / bulk_s:7.1f}x" if merge_s is not None else f"{'-':>8}"
+        print(f"{n:>10} {inserted:>10} {bulk_s:10.2f} {reload_s:10.2f} {merge_col} {speedup}")
+
+
+if __name__ == "__main__":
+    main()
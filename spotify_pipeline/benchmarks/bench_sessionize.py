@@ -0,0 +1,63 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from spotify_pipeline.resources.sessionize import sessionize
+
+
+def make_plays(n, users=100, artists=5000, break_rate=0.05, seed=0):
+    """
+    Synthetic plays: mostly back-to-back tracks with occasional long breaks
+    """
+
+    rng = np.random.default_rng(seed)
+    user_ids = rng.integers(0, users, n)
+    gaps = np.where(rng.random(n) < break_rate, rng.integers(31, 600, n) * 60_000, rng.integers(150_000, 260_000, n))
+    # each user gets their own timeline
+    played_at = 1_700_000_000_000 + pd.Series(gaps).groupby(user_ids).cumsum().to_numpy()
+    return pd.DataFrame({
+        "user_id": user_ids.astype(str),
+        "played_at": played_at,
+        "artist": rng.integers(0, artists, n),
+        "duration_ms": rng.integers(120_000, 300_000, n),
+    })
+
+
+def groupby_apply(df, gap_minutes=30):
+    """
+    The previous chart implementation: one Python lambda per session
+    """
+
+    played_at = pd.to_datetime(df["played_at"], unit="ms").sort_values()
+    session_id = (played_at.diff().dt.total_seconds().div(60) > gap_minutes).cumsum()
+    return played_at.groupby(session_id).apply(lambda x: (x.max() - x.min()).seconds / 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized sessionization vs the old groupby-apply")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--break-rate", type=float, default=0.05, help="share of plays that follow a long break")
+    parser.add_argument("--apply-max", type=int, default=1_000_000, help="skip groupby-apply above this size")
+    args = parser.parse_args()
+
+    print(f"{'plays':>11} {'sessions':>10} {'vectorized s':>13} {'apply s':>9}")
+    for n in args.sizes:
+        df = make_plays(n, break_rate=args.break_rate)
+
+        start = time.perf_counter()
+        sessions = sessionize(df["played_at"], df["user_id"], df["artist"], df["duration_ms"])
+        vectorized = time.perf_counter() - start
+
+        applied = "-"
+        if n <= args.apply_max:
+            start = time.perf_counter()
+            groupby_apply(df)
+            applied = f"{time.perf_counter() - start:9.2f}"
+
+        print(f"{n:>11} {len(sessions):>10} {vectorized:13.2f} {applied:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def make_play_item(played_at_ms, track_no):
+    """
+    A recently-played item shaped like Spotify's API response
+    """
+
+    played_at = datetime.fromtimestamp(played_at_ms / 1000, tz=timezone.utc)
+    return {
+        "played_at": played_at.strftime("%Y-%m-%dT%H:%M:%S.") + f"{played_at_ms % 1000:03d}Z",
+        "track": {
+            "id": f"track{track_no:06d}",
+            "name": f"Song {track_no}",
+            "duration_ms": 180_000 + (track_no % 120) * 1000,
+            "artists": [{"id": f"artist{track_no % 997:05d}", "name": f"Artist {track_no % 997}"}],
+            "album": {"id": f"album{track_no % 3001:05d}", "name": f"Album {track_no % 3001}"},
+        },
+    }
+
+
+def make_catalog_object(kind, spotify_id):
+    """
+    The full object the catalog endpoints return for a mock id, None for unknown ids
+    """
+
+    prefix = {"tracks": "track", "artists": "artist", "albums": "album"}[kind]
+    if not spotify_id.startswith(prefix) or not spotify_id[len(prefix):].isdigit():
+        return None
+    n = int(spotify_id[len(prefix):])
+    if kind == "tracks":
+        obj = make_play_item(0, n)["track"]
+        obj.update({"popularity": n % 100, "explicit": n % 7 == 0, "available_markets": ["GB", "US"]})
+        return obj
+    if kind == "artists":
+        return {"id": spotify_id, "name": f"Artist {n}", "genres": [f"genre{n % 40}"], "popularity": n % 100}
+    return {"id": spotify_id, "name": f"Album {n}", "release_date": f"{2000 + n % 25}-01-01",
+            "total_tracks": 8 + n % 10, "available_markets": ["GB", "US"]}
+
+
+def make_history(n, start_ms=1_700_000_000_000, gap_ms=200_000, seed=0):
+    """
+    n synthetic plays, newest first (the order the API returns them in)
+    """
+
+    rng = random.Random(seed)
+    return [make_play_item(start_ms + i * gap_ms, rng.randrange(20_000)) for i in range(n)][::-1]
+
+
+class MockSpotifyServer:
+    """
+    Local stand-in for the Spotify endpoints the pipeline calls, with cursor
+    pagination, the catalog batch endpoints and optional injection of 429/503 responses.
+
+    Usage:
+        with MockSpotifyServer(history=make_history(500), fault_rate=0.2) as server:
+            client.get(server.url + "/v1/me/player/recently-played")
+    """
+
+    def __init__(self, history=None, fault_rate=0.0, fault_statuses=(429, 503), retry_after=0.05,
+                 latency=0.0, rate_limit=None, seed=0, host="127.0.0.1", port=0):
+        """
+        :param history: Play items (newest first) served by recently-played.
+        :param fault_rate: Probability that any request is answered with an injected fault.
+        :param fault_statuses: Statuses to pick injected faults from.
+        :param retry_after: Retry-After seconds sent with injected 429s (None to omit).
+        :param latency: Seconds of artificial latency per request.
+        :param rate_limit: Requests per second allowed (a rolling 1s window, like Spotify's);
+                           requests over it get a 429 with the Retry-After until the window frees up.
+        """
+
+        self.set_history(history if history is not None else make_history(1000))
+        self.fault_rate = fault_rate
+        self.fault_statuses = fault_statuses
+        self.retry_after = retry_after
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self._recent = []
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "faults": 0, "rate_limited": 0, "catalog_ids": 0}
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def set_history(self, history):
+        """
+        Replace the served plays (newest first)
+        """
+
+        self.history = history
+        self._played_ms = [_played_at_ms(item) for item in history]
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _rate_limited(self):
+        """
+        Seconds until the rolling window has room again, None when the request is allowed
+        """
+
+        now = time.monotonic()
+        with self.lock:
+            self._recent = [t for t in self._recent if t > now - 1.0]
+            if len(self._recent) >= self.rate_limit:
+                self.stats["rate_limited"] += 1
+                return self._recent[0] + 1.0 - now
+            self._recent.append(now)
+        return None
+
+    def _inject_fault(self):
+        with self.lock:
+            self.stats["requests"] += 1
+            if self.fault_rate and self.rng.random() < self.fault_rate:
+                self.stats["faults"] += 1
+                return self.rng.choice(self.fault_statuses)
+        return None
+
+    def recently_played(self, query):
+        limit = min(int(query.get("limit", ["20"])[0]), 50)
+        before = query.get("before", [None])[0]
+        after = query.get("after", [None])[0]
+
+        # history is newest first, so both cursors select a contiguous slice
+        lo, hi = 0, len(self.history)
+        if before is not None:
+            lo = next((n for n, ms in enumerate(self._played_ms) if ms < int(before)), hi)
+        if after is not None:
+            hi = next((n for n, ms in enumerate(self._played_ms) if ms <= int(after)), hi)
+        items = self.history[lo:max(lo, hi)]
+        page = items[:limit]
+
+        cursors = None
+        next_url = None
+        if page:
+            cursors = {"before": str(_played_at_ms(page[-1])), "after": str(_played_at_ms(page[0]))}
+            if len(items) > limit:
+                next_url = f"{self.url}/v1/me/player/recently-played?before={cursors['before']}&limit={limit}"
+        return {"items": page, "next": next_url, "cursors": cursors, "limit": limit}
+
+    def catalog(self, kind, limit):
+        """
+        Batch lookup route for /v1/{kind}?ids=a,b,c; objects come back in request order
+        """
+
+        def route(query):
+            ids = [i for i in query.get("ids", [""])[0].split(",") if i]
+            if not ids or len(ids) > limit:
+                return 400, {"error": {"status": 400, "message": "Invalid ids"}}
+            with self.lock:
+                self.stats["catalog_ids"] += len(ids)
+            return {kind: [make_catalog_object(kind, i) for i in ids]}
+        return route
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload, headers=None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _dispatch(self, routes):
+                if self.headers.get("Content-Length"):
+                    self.rfile.read(int(self.headers["Content-Length"]))
+                if server.latency:
+                    time.sleep(server.latency)
+
+                wait = server._rate_limited() if server.rate_limit else None
+                if wait is not None:
+                    return self._send(429, {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                                      {"Retry-After": f"{wait:.3f}"})
+
+                fault = server._inject_fault()
+                if fault == 429:
+                    headers = {"Retry-After": str(server.retry_after)} if server.retry_after is not None else {}
+                    return self._send(429, {"error": {"status": 429, "message": "API rate limit exceeded"}}, headers)
+                if fault:
+                    return self._send(fault, {"error": {"status": fault, "message": "Service unavailable"}})
+
+                parsed = urlparse(self.path)
+                route = routes.get(parsed.path)
+                if route is None:
+                    return self._send(404, {"error": {"status": 404, "message": "Not found"}})
+                payload = route(parse_qs(parsed.query))
+                if isinstance(payload, tuple):
+                    return self._send(*payload)
+                self._send(200, payload)
+
+            def do_GET(self):
+                self._dispatch({
+                    "/v1/me": lambda q: {"id": "mock_user"},
+                    "/v1/me/player/recently-played": server.recently_played,
+                    "/v1/tracks": server.catalog("tracks", 50),
+                    "/v1/artists": server.catalog("artists", 50),
+                    "/v1/albums": server.catalog("albums", 20),
+                })
+
+            def do_POST(self):
+                self._dispatch({
+                    "/api/token": lambda q: {
+                        "access_token": f"mock-token-{time.time_ns()}",
+                        "token_type": "Bearer",
+                        "expires_in": 3600,
+                    },
+                })
+
+        return Handler
+
+
+def _played_at_ms(item):
+    dt = datetime.strptime(item["played_at"], "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
@@ -0,0 +1,270 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    """
+    Register fn(context, frame) -> list of (benchmark name, seconds per repeat)
+    """
+
+    def register(fn):
+        BENCHMARKS.append((name, fn))
+        return fn
+    return register
+
+
+def _repeat(context, run, setup=None):
+    seconds = []
+    for _ in range(context["repeat"]):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        run()
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+@benchmark("extract")
+def bench_extract(context, frame):
+    """
+    Paginate the whole history from the mock recently-played endpoint
+    """
+
+    from spotify_pipeline.benchmarks.mock_spotify import MockSpotifyServer
+    from spotify_pipeline.benchmarks.synthetic import to_api_items
+    from spotify_pipeline.resources.spotify_auth import SpotifyAuth
+    from spotify_pipeline.resources.spotify_data import SpotifyData
+
+    # one timeline: the played_at cursors cannot page through plays sharing a timestamp
+    frame = frame.drop_duplicates("played_at")
+    history = to_api_items(frame)
+    expected = {item["played_at"] for item in history}
+    with MockSpotifyServer(history=history, rate_limit=context["mock_rate_limit"]) as server:
+        SpotifyAuth.AUTH_URL = server.url + "/api/token"
+        SpotifyData.BASE_URL = server.url + "/v1/me/player/recently-played"
+        spotify_data = SpotifyData(auth=SpotifyAuth(user_id="bench", refresh_token="mock"))
+
+        def run():
+            pages = spotify_data.iter_recently_played_pages(max_tracks=len(frame), incremental=False)
+            played_at = [item["played_at"] for page in pages for item in page]
+            # every play exactly once: a broken cursor would serve pages again and still reach the count
+            assert len(set(played_at)) == len(played_at) and set(played_at) == expected
+        return [("extract", _repeat(context, run))]
+
+
+@benchmark("store")
+def bench_store(context, frame):
+    """
+    store_tracks_in_dataframe, save_track_data into an empty database, then load_data
+    """
+
+    from spotify_pipeline.benchmarks.synthetic import to_api_items
+    from spotify_pipeline.models.spotify_models import Base, init_db
+    from spotify_pipeline.resources.spotify_auth import SpotifyAuth
+    from spotify_pipeline.resources.spotify_data import SpotifyData
+    from spotify_pipeline.visualization.data_loader import load_data
+
+    engine = init_db()
+    items = to_api_items(frame)
+    spotify_data = SpotifyData(auth=SpotifyAuth(user_id="bench", refresh_token="mock"))
+    df = spotify_data.store_tracks_in_dataframe(items)
+
+    def empty_database():
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+
+    return [
+        ("store_tracks_in_dataframe", _repeat(context, lambda: spotify_data.store_tracks_in_dataframe(items))),
+        ("save_track_data", _repeat(context, lambda: spotify_data.save_track_data(df), setup=empty_database)),
+        ("load_data", _repeat(context, lambda: load_data())),
+    ]
+
+
+@benchmark("charts")
+def bench_charts(context, frame):
+    """
+    Every charts.py *_chart function over one feature frame of the history
+    """
+
+    from spotify_pipeline.benchmarks.synthetic import to_records
+    from spotify_pipeline.models.spotify_models import Base, init_db
+    from spotify_pipeline.resources.bulk_loader import upsert_plays
+    from spotify_pipeline.visualization import charts
+    from spotify_pipeline.visualization.data_loader import load_feature_frame
+
+    engine = init_db()
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    upsert_plays(to_records(frame), engine, chunk_size=10_000)
+    features = load_feature_frame()
+    functions = [charts.top_artists_chart, charts.top_songs_chart, charts.listening_trends_chart,
+                 charts.listening_heatmap, charts.listening_by_hour_chart, charts.weekly_listening_trends,
+                 charts.track_repeat_frequency, charts.session_length_distribution]
+    return [(f"chart.{fn.__name__}", _repeat(context, lambda fn=fn: fn(features))) for fn in functions]
+
+
+@benchmark("sketches")
+def bench_sketches(context, frame):
+    """
+    Dashboard summary + top lists over the whole history, exact (date filtered, so read
+    from plays) against the fast approximate mode's sketch merge
+    """
+
+    from spotify_pipeline.benchmarks.synthetic import to_records
+    from spotify_pipeline.models.spotify_models import Base, init_db
+    from spotify_pipeline.resources.bulk_loader import upsert_plays
+    from spotify_pipeline.visualization import data_loader
+
+    engine = init_db()
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    upsert_plays(to_records(frame), engine, chunk_size=10_000)
+    window = dict(start=data_loader.pd.Timestamp(int(frame["played_at"].min()), unit="ms").date(),
+                  end=data_loader.pd.Timestamp(int(frame["played_at"].max()), unit="ms").date())
+
+    def exact():
+        data_loader.load_summary(**window)
+        data_loader.load_top_artists(10, **window)
+        data_loader.load_top_tracks(10, **window)
+
+    return [
+        ("sketches.exact", _repeat(context, exact)),
+        ("sketches.approximate", _repeat(context, lambda: data_loader.load_approximate(10, **window))),
+    ]
+
+
+@benchmark("dashboard")
+def bench_dashboard(context, frame):
+    """
+    The unfiltered dashboard page: built from scratch, served from the in-process tier,
+    and served from the disk tier by a fresh cache (a new server process)
+    """
+
+    from spotify_pipeline.benchmarks.synthetic import to_records
+    from spotify_pipeline.models.spotify_models import Base, init_db
+    from spotify_pipeline.resources.bulk_loader import upsert_plays
+    from spotify_pipeline.visualization.cache import DashboardCache
+    from spotify_pipeline.visualization.dashboard import build_page, cached_page
+
+    engine = init_db()
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    upsert_plays(to_records(frame), engine, chunk_size=10_000)
+    directory = tempfile.mkdtemp(prefix="dashboard_cache_", dir=".")
+    cache = DashboardCache(directory)
+    cached_page(cache)
+
+    return [
+        ("dashboard.build", _repeat(context, build_page)),
+        ("dashboard.memory_hit", _repeat(context, lambda: cached_page(cache))),
+        ("dashboard.disk_hit", _repeat(context, lambda: cached_page(DashboardCache(directory)))),
+    ]
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """
+    Print new/old median ratios against a previous results file.
+    :return: number of benchmarks slower than 1 + threshold
+    """
+
+    with open(baseline_path) as f:
+        baseline = {(r["benchmark"], r["plays"]): r for r in json.load(f)["results"]}
+
+    regressions = 0
+    print(f"\nvs {baseline_path}")
+    for r in results:
+        old = baseline.get((r["benchmark"], r["plays"]))
+        if not old or not old.get("median_s") or r.get("median_s") is None:
+            continue
+        ratio = r["median_s"] / old["median_s"]
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        regressions += bool(flag)
+        print(f"{r['benchmark']:<40} {r['plays']:>9} {old['median_s']:>9.3f}s {r['median_s']:>9.3f}s {ratio:6.2f}x {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suite over synthetic histories; writes JSON results")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="plays per run")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", choices=[name for name, _ in BENCHMARKS])
+    parser.add_argument("--mock-rate-limit", type=float, help="requests/s the mock API allows (default unlimited)")
+    parser.add_argument("--output", help="results file (default bench_results/<commit>.json)")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="slowdown flagged as a regression")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # everything the pipeline writes goes to a scratch directory, never the real database
+    workdir = tempfile.mkdtemp(prefix="spotify_bench_")
+    os.environ["SPOTIFY_DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ.setdefault("SPOTIFY_RATE_LIMIT", "0")
+    output = os.path.abspath(args.output or os.path.join("bench_results", f"{_commit() or 'local'}.json"))
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    os.chdir(workdir)
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    from spotify_pipeline.benchmarks.synthetic import generate_n_plays
+
+    selected = [(name, fn) for name, fn in BENCHMARKS if not args.only or name in args.only]
+    context = {"repeat": args.repeat, "mock_rate_limit": args.mock_rate_limit}
+    results = []
+
+    print(f"{'benchmark':<40} {'plays':>9} {'median':>10} {'min':>10} {'plays/s':>12}")
+    for n in args.scales:
+        frame = generate_n_plays(n, users=args.users, seed=args.seed)
+        for name, fn in selected:
+            try:
+                timings = fn(context, frame)
+            except ImportError as e:
+                # optional dashboard dependencies (streamlit, plotly) may be missing
+                print(f"{name:<40} {len(frame):>9} skipped: {e}")
+                results.append({"benchmark": name, "plays": len(frame), "skipped": str(e)})
+                continue
+            for label, seconds in timings:
+                median = statistics.median(seconds)
+                results.append({"benchmark": label, "plays": len(frame), "median_s": median,
+                                "min_s": min(seconds), "runs_s": seconds})
+                print(f"{label:<40} {len(frame):>9} {median:>9.3f}s {min(seconds):>9.3f}s {len(frame) / median:>12,.0f}")
+
+    report = {
+        "meta": {
+            "commit": _commit(), "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0], "platform": platform.platform(), "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if baseline and compare(results, baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+
+# relative chance of a session starting in each UTC hour: quiet nights, commute and evening peaks
+HOUR_WEIGHTS = np.array([1, 0.5, 0.3, 0.2, 0.2, 0.4, 1.5, 4, 5, 3, 2.5, 2.5,
+                         3, 2.5, 2.5, 3, 3.5, 5, 5.5, 5, 4.5, 4, 3, 2])
+END_MS = 1_704_067_200_000  # 2024-01-01 UTC, fixed so runs are reproducible
+
+
+def _zipf_weights(n, s):
+    weights = 1.0 / np.arange(1, n + 1) ** s
+    return weights / weights.sum()
+
+
+def generate_plays(users=10, years=1.0, artists=2000, tracks_per_artist=10, tracks_per_album=8,
+                   zipf_s=1.1, sessions_per_day=2.0, mean_session_tracks=12, skip_rate=0.15,
+                   end_ms=END_MS, seed=0):
+    """
+    Synthetic listening history, generated with vectorized NumPy (millions of plays in seconds).
+
+    Artists and, within each artist, tracks are drawn from Zipf distributions, so a few
+    artists dominate as in real histories. Each user has a Poisson number of sessions per
+    day starting at diurnally weighted hours; a session plays a geometric number of tracks
+    back to back, some of them skipped part way.
+
+    :param users: Number of users.
+    :param years: Length of the history, ending at end_ms.
+    :param artists: Catalog size in artists; tracks are artist * tracks_per_artist + n.
+    :param zipf_s: Zipf exponent for artist and track popularity.
+    :param sessions_per_day: Mean sessions per user and day.
+    :param mean_session_tracks: Mean tracks per session.
+    :param skip_rate: Share of tracks skipped after 10-50% of their duration.
+    :return: DataFrame (user_id, played_at epoch ms, track_no, artist_no, album_no, duration_ms),
+             ordered by user and time
+    """
+
+    rng = np.random.default_rng(seed)
+    days = max(1, int(years * 365))
+    n_tracks = artists * tracks_per_artist
+    track_durations = rng.integers(120_000, 360_000, n_tracks)
+
+    # sessions: per (user, day) count, then a start time within the day
+    counts = rng.poisson(sessions_per_day, users * days)
+    session_user = np.repeat(np.repeat(np.arange(users), days), counts)
+    session_day = np.repeat(np.tile(np.arange(days), users), counts)
+    n_sessions = len(session_user)
+    hours = rng.choice(24, n_sessions, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+    start_ms = (end_ms - (days - session_day) * 86_400_000 + hours * 3_600_000
+                + rng.integers(0, 3_600_000, n_sessions))
+
+    # plays: back to back within each session
+    lengths = rng.geometric(1 / mean_session_tracks, n_sessions)
+    session = np.repeat(np.arange(n_sessions), lengths)
+    artist = rng.choice(artists, len(session), p=_zipf_weights(artists, zipf_s))
+    track = artist * tracks_per_artist + rng.choice(tracks_per_artist, len(session),
+                                                    p=_zipf_weights(tracks_per_artist, zipf_s))
+    duration = track_durations[track]
+    listened = np.where(rng.random(len(session)) < skip_rate,
+                        duration * rng.uniform(0.1, 0.5, len(session)), duration).astype("int64")
+    elapsed = np.cumsum(listened) - listened
+    session_first = np.append(0, np.cumsum(lengths)[:-1])
+    played_at = start_ms[session] + elapsed - elapsed[session_first][session]
+
+    frame = pd.DataFrame({
+        "user_id": np.char.add("user", session_user[session].astype(str)),
+        "played_at": played_at,
+        "track_no": track,
+        "artist_no": artist,
+        "album_no": track // tracks_per_album,
+        "duration_ms": duration,
+    })
+    frame = frame[frame["played_at"] < end_ms]
+    return frame.drop_duplicates(["user_id", "played_at"]).sort_values(["user_id", "played_at"], ignore_index=True)
+
+
+def generate_n_plays(n, users=10, seed=0, **kwargs):
+    """
+    About n plays (the most recent ones), spread over as many years as that takes
+    """
+
+    per_year = users * 365 * kwargs.get("sessions_per_day", 2.0) * kwargs.get("mean_session_tracks", 12)
+    frame = generate_plays(users=users, years=n / per_year * 1.2 + 1 / 365, seed=seed, **kwargs)
+    return frame.nlargest(n, "played_at").sort_values(["user_id", "played_at"], ignore_index=True)
+
+
+def _iso(ms):
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.") + f"{ms % 1000:03d}Z"
+
+
+def to_api_items(frame):
+    """
+    Plays as recently-played items, newest first across all users (the order the API and
+    MockSpotifyServer(history=...) serve them in). Ids follow the mock catalog's
+    track/artist/album<n> scheme.
+    """
+
+    frame = frame.sort_values("played_at", ascending=False, kind="stable")
+    return [
+        {
+            "played_at": _iso(int(ms)),
+            "track": {
+                "id": f"track{t:06d}",
+                "name": f"Song {t}",
+                "duration_ms": int(d),
+                "artists": [{"id": f"artist{a:05d}", "name": f"Artist {a}"}],
+                "album": {"id": f"album{b:05d}", "name": f"Album {b}"},
+            },
+        }
+        for ms, t, a, b, d in zip(frame["played_at"].to_numpy(), frame["track_no"].to_numpy(),
+                                  frame["artist_no"].to_numpy(), frame["album_no"].to_numpy(),
+                                  frame["duration_ms"].to_numpy())
+    ]
+
+
+def to_records(frame):
+    """
+    Plays as flattened records (transform.flatten_play shape), ready for upsert_plays
+    """
+
+    return [
+        {
+            "user_id": u, "track_id": f"track{t:06d}", "track_name": f"Song {t}", "duration_ms": int(d),
+            "album_id": f"album{b:05d}", "album_name": f"Album {b}",
+            "artists": [(f"artist{a:05d}", f"Artist {a}")], "played_at": _iso(int(ms)),
+        }
+        for u, ms, t, a, b, d in zip(frame["user_id"], frame["played_at"], frame["track_no"],
+                                     frame["artist_no"], frame["album_no"], frame["duration_ms"])
+    ]
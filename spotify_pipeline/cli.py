@@ -0,0 +1,150 @@
+import argparse
+import logging
+import os
+import sys
+
+
+# Only the standard library is imported up here; each command imports what it needs,
+# so `auth` never loads SQLAlchemy and a fetch with nothing new never loads pandas.
+
+
+def cmd_auth(args):
+    """
+    Authorise a user once (browser + pasted code), or check/refresh the cached token
+    """
+
+    from spotify_pipeline.resources.spotify_auth import SpotifyAuth
+
+    auth = SpotifyAuth(user_id=args.user)
+    code = args.code
+    if not code and not auth.refresh_token:
+        print(f"Open this URL, approve access and paste the `code` parameter of the redirect:\n{auth.get_auth_url()}")
+        code = input("code: ").strip()
+
+    token = auth.request_user_token(code) if code else auth.get_access_token()
+    if not token:
+        logging.error(f"Could not obtain an access token for user '{auth.user_id}'.")
+        return 1
+    logging.info(f"Access token for user '{auth.user_id}' valid until {auth.expires_at and int(auth.expires_at)}.")
+    return 0
+
+
+def cmd_fetch(args):
+    """
+    Incremental fetch for one user, or for every user in the registry
+    """
+
+    from spotify_pipeline.resources.metrics import export_metrics
+    from spotify_pipeline.visualization.dashboard import warm_dashboard_cache
+
+    if args.all_users:
+        from spotify_pipeline.pipelines.fetch_all_users import load_registry, run_all
+
+        results = run_all(load_registry(args.users_file), max_workers=args.workers, max_tracks=args.max_tracks)
+        ok = all(r.ok for r in results)
+        changed = [r.user_id for r in results if r.inserted]
+    else:
+        from spotify_pipeline.resources.spotify_data import SpotifyData
+
+        spotify_data = SpotifyData(user_id=args.user)
+        result = spotify_data.stream_to_db(limit=50, max_tracks=args.max_tracks, incremental=not args.full)
+        logging.info(f"Load finished: {result.inserted} inserted, {result.updated} updated, {result.skipped} skipped.")
+        ok = spotify_data.fetch_complete
+        changed = [spotify_data.user_id] if result.inserted else []
+    if changed:
+        warm_dashboard_cache(changed)
+    export_metrics()
+    return 0 if ok else 1
+
+
+def cmd_replay(args):
+    """
+    Re-run transform + load over the raw landing zone
+    """
+
+    from spotify_pipeline.models.spotify_models import init_db
+    from spotify_pipeline.resources.landing import REPLAY_CHUNK_SIZE, LandingZone
+    from spotify_pipeline.resources.metrics import export_metrics
+    from spotify_pipeline.resources.transform import to_epoch_ms
+    from spotify_pipeline.visualization.dashboard import warm_dashboard_cache
+
+    result = LandingZone(args.landing_dir).replay(
+        init_db(), user_id=args.user, since_ms=to_epoch_ms(args.since) if args.since else None,
+        workers=args.workers, chunk_size=args.chunk_size or REPLAY_CHUNK_SIZE, on_conflict=args.on_conflict,
+    )
+    if result.inserted:
+        warm_dashboard_cache([args.user] if args.user else [])
+    export_metrics()
+    return 0
+
+
+def cmd_serve(args):
+    """
+    Start the Streamlit dashboard
+    """
+
+    import subprocess
+
+    app = os.path.join(os.path.dirname(os.path.abspath(__file__)), "visualization", "streamlit_app.py")
+    command = [sys.executable, "-m", "streamlit", "run", app, "--server.port", str(args.port), *args.streamlit_args]
+    return subprocess.call(command)
+
+
+def cmd_init_db(args):
+    """
+    Create or migrate the database schema
+    """
+
+    from spotify_pipeline import config
+    from spotify_pipeline.models.spotify_models import init_db
+
+    init_db()
+    logging.info(f"Database ready at {config.DATABASE_URL}")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m spotify_pipeline", description="Spotify ETL pipeline")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    auth = commands.add_parser("auth", help="authorise a user or refresh their token")
+    auth.add_argument("--user", help="user id (default SPOTIFY_USER_ID)")
+    auth.add_argument("--code", help="authorization code from the redirect URL")
+    auth.set_defaults(handler=cmd_auth)
+
+    fetch = commands.add_parser("fetch", help="fetch new plays into the database")
+    fetch.add_argument("--user", help="user id (default SPOTIFY_USER_ID)")
+    fetch.add_argument("--all-users", action="store_true", help="every user in the registry")
+    fetch.add_argument("--users-file", default=os.getenv("SPOTIFY_USERS_FILE", "users.json"))
+    fetch.add_argument("--workers", type=int, default=int(os.getenv("SPOTIFY_FETCH_WORKERS", "8")))
+    fetch.add_argument("--max-tracks", type=int, default=10000)
+    fetch.add_argument("--full", action="store_true", help="ignore the watermark and page through everything")
+    fetch.set_defaults(handler=cmd_fetch)
+
+    replay = commands.add_parser("replay", help="re-run transform and load from the landing zone")
+    replay.add_argument("--landing-dir", default=os.getenv("SPOTIFY_LANDING_DIR"))
+    replay.add_argument("--user", help="only this user's segments")
+    replay.add_argument("--since", help="only segments with plays on or after this date (YYYY-MM-DD)")
+    replay.add_argument("--workers", type=int, help="parse/transform processes (default: CPU count)")
+    replay.add_argument("--chunk-size", type=int)
+    replay.add_argument("--on-conflict", choices=("nothing", "update"), default="nothing")
+    replay.set_defaults(handler=cmd_replay)
+
+    serve = commands.add_parser("serve", help="start the Streamlit dashboard")
+    serve.add_argument("--port", type=int, default=8501)
+    serve.add_argument("streamlit_args", nargs=argparse.REMAINDER, help="passed on to streamlit run")
+    serve.set_defaults(handler=cmd_serve)
+
+    init_db = commands.add_parser("init-db", help="create or migrate the database schema")
+    init_db.set_defaults(handler=cmd_init_db)
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s  - %(message)s")
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+import os
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+
+# Storage: one place for the database location, shared by the ETL and the dashboard.
+# DATABASE_URL wins when set, otherwise SPOTIFY_DB_PATH (a SQLite file) is used.
+DB_PATH = os.path.abspath(os.getenv("SPOTIFY_DB_PATH", "spotify_data.db"))
+DATABASE_URL = os.getenv("DATABASE_URL") or f"sqlite:///{DB_PATH}"
+
+# SQLite tuning applied to every connection. WAL lets the dashboard read while the ETL writes.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SPOTIFY_SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SPOTIFY_SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.getenv("SPOTIFY_SQLITE_CACHE_KB", "65536")) * -1,  # negative = KiB
+    "mmap_size": int(os.getenv("SPOTIFY_SQLITE_MMAP_MB", "256")) * 1024 * 1024,
+    # MEMORY measured slower for the dashboard's GROUP BY/ORDER BY sorts, so leave SQLite's default
+    "temp_store": os.getenv("SPOTIFY_SQLITE_TEMP_STORE", "DEFAULT"),
+    "busy_timeout": int(os.getenv("SPOTIFY_SQLITE_BUSY_TIMEOUT_MS", "5000")),
+}
+
+# Read-only connections kept open for the dashboard
+READ_POOL_SIZE = int(os.getenv("SPOTIFY_READ_POOL_SIZE", "4"))
+
+# Postgres (or other server databases): one pool per process, shared by the ETL writers and the dashboard readers
+DB_POOL_SIZE = int(os.getenv("SPOTIFY_DB_POOL_SIZE", "10"))
+
+# Longest silence (minutes) that still continues a listening session
+SESSION_GAP_MINUTES = int(os.getenv("SPOTIFY_SESSION_GAP_MINUTES", "30"))
+
+# Keep per user day tallies and month sketches (distinct counts, top artists/tracks) for the dashboard's approximate mode
+PLAY_SKETCHES = os.getenv("SPOTIFY_PLAY_SKETCHES", "1").lower() in ("1", "true", "yes")
+
+# Dashboard pages (summary frames and figure JSON) cached per data version: DASHBOARD_CACHE_ENTRIES
+# in memory per process, plus a disk tier shared by every process when DASHBOARD_CACHE_DIR is set,
+# which the ETL pre-warms after each load that adds plays
+DASHBOARD_CACHE_DIR = os.getenv("SPOTIFY_DASHBOARD_CACHE_DIR")
+DASHBOARD_CACHE_ENTRIES = int(os.getenv("SPOTIFY_DASHBOARD_CACHE_ENTRIES", "128"))
+DASHBOARD_CACHE_MB = int(os.getenv("SPOTIFY_DASHBOARD_CACHE_MB", "256"))
+
+# Parquet archive of the full play history (unset = no archive). With HOT_WINDOW_DAYS set,
+# plays older than the window are moved out of the database into the archive.
+ARCHIVE_DIR = os.getenv("SPOTIFY_ARCHIVE_DIR")
+HOT_WINDOW_DAYS = int(os.getenv("SPOTIFY_HOT_WINDOW_DAYS", "0")) or None
+
+# Landing zone for raw API pages (unset = pages are not kept), replayable with pipelines/replay_landing.py
+LANDING_DIR = os.getenv("SPOTIFY_LANDING_DIR")
+
+# Resolve track/artist/album metadata of new plays into the metadata_cache table
+ENRICH_METADATA = os.getenv("SPOTIFY_ENRICH_METADATA", "0").lower() in ("1", "true", "yes")
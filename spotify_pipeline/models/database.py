@@ -0,0 +1,100 @@
+import threading
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+from spotify_pipeline import config
+
+
+# journal_mode is a property of the database file, readers must not try to change it
+READ_ONLY_SKIP = ("journal_mode",)
+
+
+def _apply_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    return on_connect
+
+
+def create_writer_engine(url=None, pragmas=None):
+    """
+    Engine used by the ETL. SQLite connections get the configured pragmas
+    (WAL, synchronous, cache_size, mmap_size, temp_store, busy_timeout).
+    :param pragmas: Override config.SQLITE_PRAGMAS ({} keeps SQLite's defaults).
+    """
+
+    url = url or config.DATABASE_URL
+    if make_url(url).get_backend_name() != "sqlite":
+        return create_engine(url, pool_size=config.DB_POOL_SIZE, pool_pre_ping=True)
+
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", _apply_pragmas(config.SQLITE_PRAGMAS if pragmas is None else pragmas))
+    return engine
+
+
+def create_reader_engine(url=None, pragmas=None, pool_size=None):
+    """
+    Pooled read-only engine for the dashboard. SQLite files are opened with
+    mode=ro and query_only, so readers can never take the write lock.
+    """
+
+    url = make_url(url or config.DATABASE_URL)
+    pool_size = pool_size or config.READ_POOL_SIZE
+    if url.get_backend_name() != "sqlite":
+        return create_engine(url, pool_size=pool_size, pool_pre_ping=True)
+
+    pragmas = dict(config.SQLITE_PRAGMAS if pragmas is None else pragmas)
+    for name in READ_ONLY_SKIP:
+        pragmas.pop(name, None)
+    pragmas["query_only"] = "ON"
+
+    engine = create_engine(
+        f"sqlite:///file:{url.database}?mode=ro&uri=true",
+        connect_args={"check_same_thread": False},
+        pool_size=pool_size,
+        max_overflow=0,
+    )
+    event.listen(engine, "connect", _apply_pragmas(pragmas))
+    return engine
+
+
+_writers = {}
+_readers = {}
+_engines_lock = threading.Lock()
+
+
+def get_writer_engine(url=None):
+    """
+    Process-wide writer engine per database URL
+    """
+
+    url = url or config.DATABASE_URL
+    with _engines_lock:
+        if url not in _writers:
+            _writers[url] = create_writer_engine(url)
+        return _writers[url]
+
+
+def get_reader_engine(url=None):
+    """
+    Process-wide read-only engine per database URL, so every dashboard rerun reuses the pool.
+    SQLite readers get their own read-only pool; on a server database they share the
+    writer's pool (one set of connections per process) and run read-only transactions.
+    """
+
+    url = url or config.DATABASE_URL
+    if make_url(url).get_backend_name() != "sqlite":
+        writer = get_writer_engine(url)
+        with _engines_lock:
+            if url not in _readers:
+                readonly = {"postgresql_readonly": True} if writer.dialect.name == "postgresql" else {}
+                _readers[url] = writer.execution_options(**readonly)
+            return _readers[url]
+
+    with _engines_lock:
+        if url not in _readers:
+            _readers[url] = create_reader_engine(url)
+        return _readers[url]
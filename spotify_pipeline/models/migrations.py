@@ -0,0 +1,131 @@
+import logging
+import os
+
+from sqlalchemy import inspect, text
+
+
+LEGACY_TABLE = "tracks_legacy"
+MIGRATION_CHUNK_SIZE = 5000
+
+
+def _legacy_records(engine, has_user_id):
+    """
+    Read the old text-only tracks table as flattened play records, in primary key
+    order and one short read per batch, so no read lock is held while the
+    loader writes.
+    """
+
+    default_user = os.getenv("SPOTIFY_USER_ID", "default")
+    key = ["user_id", "id", "played_at"] if has_user_id else ["id", "played_at"]
+    select_user = "user_id" if has_user_id else ":default_user AS user_id"
+    columns = f"{select_user}, id, name, artist, album, played_at"
+    order = ", ".join(key)
+
+    first = text(f"SELECT {columns} FROM {LEGACY_TABLE} ORDER BY {order} LIMIT :n")
+    after = text(
+        f"SELECT {columns} FROM {LEGACY_TABLE} "
+        f"WHERE ({order}) > ({', '.join(':k_' + c for c in key)}) ORDER BY {order} LIMIT :n"
+    )
+
+    params = {"n": MIGRATION_CHUNK_SIZE, "default_user": default_user}
+    query = first
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+        if not rows:
+            return
+
+        for row in rows:
+            yield {
+                "user_id": row.user_id,
+                "track_id": row.id,
+                "track_name": row.name,
+                "duration_ms": None,
+                "album_id": None,
+                "album_name": row.album,
+                "artists": [(None, row.artist)],
+                "played_at": row.played_at,
+            }
+
+        last = rows[-1]._mapping
+        params.update({f"k_{c}": last[c] for c in key})
+        query = after
+
+
+def _migrate_tracks_to_star_schema(engine, metadata, has_user_id, resume=False):
+    """
+    Move plays from the old tracks table (free-text name/artist/album per play,
+    string played_at) into the artists/albums/tracks dimensions and the plays
+    fact table, then drop the old table and reclaim its space.
+    :param resume: The old table was already renamed by a migration that died part way;
+        the load is idempotent, so it simply runs again.
+    """
+
+    from spotify_pipeline.resources.bulk_loader import upsert_plays
+
+    if resume:
+        logging.info(f"Resuming the interrupted migration of {LEGACY_TABLE} to the star schema...")
+    else:
+        logging.info("Migrating tracks table to the artists/albums/tracks/plays schema...")
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE tracks RENAME TO {LEGACY_TABLE}"))
+    metadata.create_all(engine)
+
+    result = upsert_plays(_legacy_records(engine, has_user_id), engine, chunk_size=MIGRATION_CHUNK_SIZE)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+
+    logging.info(f"Migration complete: {result.inserted} plays moved, {result.skipped} duplicates dropped.")
+
+
+def migrate(engine):
+    """
+    Bring an existing database up to the current schema before create_all runs
+    """
+
+    from spotify_pipeline.models.spotify_models import Base
+
+    inspector = inspect(engine)
+    tables = inspector.get_table_names()
+
+    # a migration that died after renaming tracks, e.g. during the long load
+    if LEGACY_TABLE in tables:
+        columns = {c["name"] for c in inspector.get_columns(LEGACY_TABLE)}
+        _migrate_tracks_to_star_schema(engine, Base.metadata, has_user_id="user_id" in columns, resume=True)
+        return
+
+    if "tracks" in tables:
+        columns = {c["name"] for c in inspector.get_columns("tracks")}
+        # the old tracks table stored one text row per play, keyed on (user_id?, id, played_at)
+        if "played_at" in columns:
+            _migrate_tracks_to_star_schema(engine, Base.metadata, has_user_id="user_id" in columns)
+            return
+
+    # Postgres plays created before the table was partitioned by month
+    if engine.dialect.name == "postgresql" and "plays" in tables:
+        from spotify_pipeline.models.partitions import is_partitioned, partition_plays
+
+        if not is_partitioned(engine):
+            partition_plays(engine, Base.metadata.tables["plays"])
+
+    # plays loaded before the rollup tables existed
+    if "plays" in tables and "daily_plays" not in tables:
+        from spotify_pipeline.resources.rollups import rebuild_rollups
+
+        logging.info("Building rollup tables from existing plays...")
+        Base.metadata.create_all(engine)
+        rebuild_rollups(engine)
+
+    # rollups built before the play sketches existed
+    elif "plays" in tables and "play_sketches" not in tables:
+        from spotify_pipeline import config
+        from spotify_pipeline.resources.rollups import rebuild_sketches
+
+        if config.PLAY_SKETCHES:
+            logging.info("Building play sketches from existing plays...")
+            Base.metadata.create_all(engine)
+            rebuild_sketches(engine)
@@ -0,0 +1,105 @@
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect, text
+
+
+# On Postgres the plays fact table is range partitioned on played_at, one partition per UTC
+# month, so date filtered dashboard queries and rollup refreshes only scan the months they
+# cover. The loader creates the partitions its plays need; SQLite keeps one plain table.
+
+PARTITIONED_TABLE = "plays"
+UNPARTITIONED_TABLE = "plays_unpartitioned"
+# tables the plays foreign keys point to, in the order the loader writes them
+REFERENCED_TABLES = ("artists", "tracks")
+
+
+def _month(played_at_ms):
+    moment = datetime.fromtimestamp(played_at_ms / 1000, tz=timezone.utc)
+    return moment.year, moment.month
+
+
+def _month_bounds(year, month):
+    start = datetime(year, month, 1, tzinfo=timezone.utc)
+    end = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+
+
+def partition_name(year, month):
+    return f"{PARTITIONED_TABLE}_{year:04d}_{month:02d}"
+
+
+def ensure_play_partitions(conn, played_at):
+    """
+    Create the monthly plays partitions that the given epoch ms values fall into,
+    inside the caller's transaction. No-op on databases without partitioning.
+    """
+
+    if conn.dialect.name != "postgresql" or not played_at:
+        return
+
+    months = {_month(ms) for ms in played_at}
+    existing = set(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:parent AS regclass)"
+    ), {"parent": PARTITIONED_TABLE}).scalars())
+    missing = sorted(m for m in months if partition_name(*m) not in existing)
+    if not missing:
+        return
+
+    # concurrent loads (one thread per user) would otherwise race to create the same month
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:parent))"), {"parent": PARTITIONED_TABLE})
+    # Creating a partition locks plays, then the tables its foreign keys reference. Loads
+    # write those tables before plays, so take their locks first, in the same order:
+    # loads still in flight finish, and later ones wait until the partition exists.
+    conn.execute(text(f"LOCK TABLE {', '.join(REFERENCED_TABLES)} IN SHARE ROW EXCLUSIVE MODE"))
+    for year, month in missing:
+        start, end = _month_bounds(year, month)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(year, month)} "
+            f"PARTITION OF {PARTITIONED_TABLE} FOR VALUES FROM ({start}) TO ({end})"
+        ))
+    logging.info(f"Created {len(missing)} monthly {PARTITIONED_TABLE} partitions.")
+
+
+def is_partitioned(engine):
+    with engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT relkind = 'p' FROM pg_class WHERE oid = CAST(:table AS regclass)"
+        ), {"table": PARTITIONED_TABLE}).scalar()
+
+
+def partition_plays(engine, play_table):
+    """
+    Move an unpartitioned Postgres plays table (created before partitioning) into
+    monthly partitions, in one transaction: the old table is renamed, its indexes
+    dropped so their names are free, and its rows copied into the new table.
+    """
+
+    logging.info("Moving plays into monthly partitions...")
+    inspector = inspect(engine)
+    indexes = [index["name"] for index in inspector.get_indexes(PARTITIONED_TABLE)]
+    primary_key = inspector.get_pk_constraint(PARTITIONED_TABLE)["name"]
+    columns = ", ".join(c.name for c in play_table.columns)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {PARTITIONED_TABLE} RENAME TO {UNPARTITIONED_TABLE}"))
+        for name in indexes:
+            conn.execute(text(f"DROP INDEX {name}"))
+        if primary_key:
+            conn.execute(text(f"ALTER TABLE {UNPARTITIONED_TABLE} DROP CONSTRAINT {primary_key}"))
+        play_table.create(conn)
+
+        lo, hi = conn.execute(text(f"SELECT MIN(played_at), MAX(played_at) FROM {UNPARTITIONED_TABLE}")).one()
+        if lo is not None:
+            months, month = [], _month(lo)
+            while month <= _month(hi):
+                months.append(month)
+                month = (month[0] + month[1] // 12, month[1] % 12 + 1)
+            ensure_play_partitions(conn, [_month_bounds(*m)[0] for m in months])
+        moved = conn.execute(text(
+            f"INSERT INTO {PARTITIONED_TABLE} ({columns}) SELECT {columns} FROM {UNPARTITIONED_TABLE}"
+        )).rowcount
+        conn.execute(text(f"DROP TABLE {UNPARTITIONED_TABLE}"))
+
+    logging.info(f"Partitioned {moved} plays.")
@@ -1,20 +1,232 @@
-from sqlalchemy import create_engine, Column, String, Integer, Float
+import threading
+import weakref
+
+from sqlalchemy import Column, String, Integer, Float, BigInteger, Date, ForeignKey, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from spotify_pipeline import config
+from spotify_pipeline.models.database import get_writer_engine
+from spotify_pipeline.models.migrations import migrate
 
 Base = declarative_base()
 
+
+# Dimensions: one row per Spotify entity with an integer surrogate key.
+# spotify_id is NULL only for rows migrated from the old text-only tracks table.
+
+class Artist(Base):
+    __tablename__ = "artists"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    spotify_id = Column(String, unique=True)
+    name = Column(String)
+
+
+class Album(Base):
+    __tablename__ = "albums"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    spotify_id = Column(String, unique=True)
+    name = Column(String)
+
+
 class Track(Base):
     __tablename__ = "tracks"
-    id = Column(String, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    spotify_id = Column(String, unique=True, nullable=False)
     name = Column(String)
-    artist = Column(String)
-    album = Column(String)
-    played_at = Column(String, primary_key=True)
+    album_id = Column(Integer, ForeignKey("albums.id"))
+    duration_ms = Column(Integer)
+
+
+class TrackArtist(Base):
+    """
+    Every artist credited on a track, in Spotify's order (position 0 is the main artist)
+    """
+    __tablename__ = "track_artists"
+    track_id = Column(Integer, ForeignKey("tracks.id"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    artist_id = Column(Integer, ForeignKey("artists.id"), nullable=False)
+
+
+class Play(Base):
+    """
+    Fact table: one row per play. played_at is epoch milliseconds (UTC) and
+    artist_id repeats the track's main artist so artist/time queries hit an index.
+    """
+    __tablename__ = "plays"
+    user_id = Column(String, primary_key=True)
+    played_at = Column(BigInteger, primary_key=True)
+    track_id = Column(Integer, ForeignKey("tracks.id"), primary_key=True)
+    artist_id = Column(Integer, ForeignKey("artists.id"))
+
+    __table_args__ = (
+        Index("ix_plays_played_at", "played_at"),
+        Index("ix_plays_artist_id_played_at", "artist_id", "played_at"),
+        Index("ix_plays_track_id", "track_id"),
+        # monthly partitions on Postgres, created by the loader (models/partitions.py)
+        {"postgresql_partition_by": "RANGE (played_at)"},
+    )
+
+
+# Rollups: small aggregate tables maintained incrementally by the loader (resources/rollups.py).
+# Buckets are in UTC, like played_at.
+
+class DailyPlays(Base):
+    __tablename__ = "daily_plays"
+    user_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    play_count = Column(Integer, nullable=False)
+
+
+class HourlyPlays(Base):
+    """
+    Plays per weekday (0 = Monday) and hour of day
+    """
+    __tablename__ = "hourly_plays"
+    user_id = Column(String, primary_key=True)
+    weekday = Column(Integer, primary_key=True)
+    hour = Column(Integer, primary_key=True)
+    play_count = Column(Integer, nullable=False)
+
+
+class ArtistPlays(Base):
+    __tablename__ = "artist_plays"
+    user_id = Column(String, primary_key=True)
+    artist_id = Column(Integer, ForeignKey("artists.id"), primary_key=True)
+    play_count = Column(Integer, nullable=False)
+
+
+class TrackPlays(Base):
+    __tablename__ = "track_plays"
+    user_id = Column(String, primary_key=True)
+    track_id = Column(Integer, ForeignKey("tracks.id"), primary_key=True)
+    play_count = Column(Integer, nullable=False)
+
+
+class ListeningSession(Base):
+    """
+    Continuous listening with gaps shorter than the session gap; times in epoch ms
+    """
+    __tablename__ = "listening_sessions"
+    user_id = Column(String, primary_key=True)
+    started_at = Column(BigInteger, primary_key=True)
+    ended_at = Column(BigInteger, nullable=False)
+    track_count = Column(Integer, nullable=False)
+    distinct_artists = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_listening_sessions_user_id_ended_at", "user_id", "ended_at"),
+    )
+
+
+class PlaySketchBucket(Base):
+    """
+    Mergeable summary (resources/sketches.py) of one user's plays in one UTC day or calendar
+    month, starting at day: exact per-id tallies for days, HyperLogLog / Count-Min /
+    Space-Saving sketches for months; behind the dashboard's approximate mode
+    """
+    __tablename__ = "play_sketches"
+    user_id = Column(String, primary_key=True)
+    grain = Column(String, primary_key=True)  # "day" or "month"
+    day = Column(Date, primary_key=True)
+    play_count = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+
+class DataVersion(Base):
+    """
+    Load counter per user, bumped in the transaction of every change to what the dashboard
+    shows; the row with an empty user_id counts changes that affect every user (renames,
+    rebuilds). Keys the dashboard cache.
+    """
+    __tablename__ = "data_versions"
+    user_id = Column(String, primary_key=True)
+    loads = Column(Integer, nullable=False)
+
+
+class Watermark(Base):
+    """
+    High-water mark per user: the latest play loaded into the plays table
+    """
+    __tablename__ = "watermarks"
+    user_id = Column(String, primary_key=True)
+    played_at = Column(String)
+    played_at_ms = Column(BigInteger)
+
+
+class DataQualityRun(Base):
+    """
+    One data-quality check result per transform run
+    """
+    __tablename__ = "data_quality_runs"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String)
+    run_at = Column(BigInteger)
+    level = Column(String)
+    rows = Column(Integer)
+    missing_values = Column(Integer)
+    duplicate_rows = Column(Integer)
+    sampled_rows = Column(Integer)
+    unique_tracks = Column(Integer)
+    top_artists = Column(String)
+
+
+
+class MetadataCache(Base):
+    """
+    Spotify catalog objects (track, artist, album, ...) fetched by the enrichment stage,
+    one row per id. data is the JSON payload ("null" for ids Spotify does not know).
+    """
+    __tablename__ = "metadata_cache"
+    kind = Column(String, primary_key=True)
+    spotify_id = Column(String, primary_key=True)
+    data = Column(String)
+    fetched_at = Column(BigInteger)
+
+
+# Database connection (location and SQLite tuning come from spotify_pipeline.config).
+# Nothing connects at import time: entry points call init_db() once before touching the schema.
+DATABASE_URL = config.DATABASE_URL
+
+# engines whose schema is set up, held weakly: a collected engine's id could otherwise match a new one
+_initialized = weakref.WeakSet()
+_lock = threading.Lock()
+_session_local = None
+
+
+def get_engine():
+    """
+    Process-wide writer engine for the configured database, created on first use.
+    Creating it does not connect or touch the schema.
+    """
+
+    return get_writer_engine(DATABASE_URL)
+
+
+def init_db(engine=None):
+    """
+    Migrate and create the schema. Idempotent and cheap after the first call per engine.
+    :param engine: Engine to initialise, the configured writer engine by default.
+    :return: the engine
+    """
+
+    engine = engine or get_engine()
+    with _lock:
+        if engine not in _initialized:
+            migrate(engine)
+            Base.metadata.create_all(engine)
+            _initialized.add(engine)
+    return engine
 
 
-# Database connection
-DATABASE_URL = "sqlite:///spotify_data.db"
-engine = create_engine(DATABASE_URL)
-Base.metadata.create_all(engine)
-SessionLocal = sessionmaker(bind=engine)
\ No newline at end of file
+def __getattr__(name):
+    # `from spotify_models import engine` keeps working: it initialises the schema on first access
+    if name == "engine":
+        return init_db()
+    if name == "SessionLocal":
+        global _session_local
+        engine = init_db()
+        with _lock:
+            if _session_local is None:
+                _session_local = sessionmaker(bind=engine)
+        return _session_local
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,186 @@
+import logging
+import os
+from datetime import datetime, timezone
+
+from dagster import (
+    AssetExecutionContext,
+    Backoff,
+    Definitions,
+    Failure,
+    FilesystemIOManager,
+    HourlyPartitionsDefinition,
+    MaterializeResult,
+    RetryPolicy,
+    asset,
+    build_schedule_from_partitioned_job,
+    define_asset_job,
+)
+from sqlalchemy import func, select
+
+from spotify_pipeline import config
+from spotify_pipeline.models.spotify_models import DailyPlays, Play, init_db
+from spotify_pipeline.pipelines.fetch_all_users import load_registry
+from spotify_pipeline.resources.archive import PlayArchive
+from spotify_pipeline.resources.bulk_loader import upsert_plays
+from spotify_pipeline.resources.enrichment import MetadataEnricher
+from spotify_pipeline.resources.play_store import PlayBatch
+from spotify_pipeline.resources.spotify_auth import SpotifyAuth
+from spotify_pipeline.resources.spotify_data import SpotifyData
+from spotify_pipeline.resources.transform import MS_PER_DAY
+from spotify_pipeline.visualization.dashboard import warm_dashboard_cache
+
+
+# Spotify only returns the last ~50 plays, so windows are hourly and the schedule keeps up with them
+PARTITIONS = HourlyPartitionsDefinition(start_date=os.getenv("SPOTIFY_DAGSTER_START", "2025-01-01-00:00"))
+STORAGE_DIR = os.getenv("SPOTIFY_DAGSTER_STORAGE", "dagster_storage")
+
+# every Spotify request shares one pool, capped in dagster.yaml
+API_POOL = "spotify_api"
+
+
+def _registry():
+    """
+    Users to extract: the SPOTIFY_USERS_FILE registry when present, else the .env account
+    """
+
+    path = os.getenv("SPOTIFY_USERS_FILE", "users.json")
+    if os.path.exists(path):
+        return load_registry(path)
+    return [{"user_id": os.getenv("SPOTIFY_USER_ID", "default")}]
+
+
+def _auth(entry):
+    return SpotifyAuth(
+        user_id=entry["user_id"],
+        client_id=entry.get("client_id"),
+        client_secret=entry.get("client_secret"),
+        refresh_token=entry.get("refresh_token"),
+    )
+
+
+def _on_inserted():
+    """
+    The same post-commit steps SpotifyData runs: archive and metadata enrichment when configured
+    """
+
+    steps = []
+    if config.ARCHIVE_DIR:
+        steps.append(PlayArchive().write)
+    if config.ENRICH_METADATA:
+        # catalog endpoints accept any user's token
+        steps.append(MetadataEnricher(init_db(), _auth(_registry()[0])).enrich)
+
+    def on_inserted(records):
+        for step in steps:
+            step(records)
+    return on_inserted if steps else None
+
+
+def _window_ms(context):
+    window = context.partition_time_window
+    return int(window.start.timestamp() * 1000), int(window.end.timestamp() * 1000)
+
+
+@asset(
+    partitions_def=PARTITIONS,
+    pool=API_POOL,
+    retry_policy=RetryPolicy(max_retries=3, delay=30, backoff=Backoff.EXPONENTIAL),
+    group_name="spotify_etl",
+    kinds={"python"},
+)
+def raw_play_pages(context: AssetExecutionContext):
+    """
+    Raw recently-played items of every registered user for one hour.
+    Stored by the IO manager, so downstream partitions re-run without calling the API again.
+    """
+
+    start_ms, end_ms = _window_ms(context)
+    pages, incomplete = {}, []
+    for entry in _registry():
+        spotify_data = SpotifyData(auth=_auth(entry))
+        pages[entry["user_id"]] = spotify_data.fetch_window(start_ms, end_ms)
+        if not spotify_data.fetch_complete:
+            incomplete.append(entry["user_id"])
+
+    # fail the partition rather than store a partial window; the retry policy re-runs it
+    if incomplete:
+        raise Failure(f"Fetch incomplete for users: {', '.join(incomplete)}")
+
+    context.add_output_metadata({"plays": sum(len(items) for items in pages.values()), "users": len(pages)})
+    return pages
+
+
+@asset(partitions_def=PARTITIONS, group_name="spotify_etl", kinds={"python"})
+def flattened_plays(context: AssetExecutionContext, raw_play_pages):
+    """
+    Compact, validated plays of every user for one hour, as one PlayBatch
+    (iterates as transform.flatten_play shaped records)
+    """
+
+    batch = PlayBatch()
+    for user_id, items in raw_play_pages.items():
+        batch.extend(items, user_id)
+
+    context.add_output_metadata({"records": len(batch)})
+    return batch
+
+
+@asset(partitions_def=PARTITIONS, group_name="spotify_etl", kinds={"sqlite"})
+def loaded_plays(context: AssetExecutionContext, flattened_plays):
+    """
+    The hour's plays upserted into the plays fact table. The load is idempotent on
+    (user_id, played_at, track_id), so re-running a partition never duplicates rows.
+    """
+
+    result = upsert_plays(flattened_plays, init_db(), on_inserted=_on_inserted())
+    if result.inserted:
+        warm_dashboard_cache(flattened_plays.pools["user_id"].values)
+    return MaterializeResult(metadata={
+        "inserted": result.inserted, "updated": result.updated, "skipped": result.skipped,
+    })
+
+
+@asset(partitions_def=PARTITIONS, deps=[loaded_plays], group_name="spotify_etl", kinds={"sqlite"})
+def play_rollups(context: AssetExecutionContext):
+    """
+    Dashboard rollups for the hour's day. They are folded in by the load transaction,
+    so this asset only checks them: daily_plays must match the plays in the database
+    (offloads to the archive take plays out of both).
+    """
+
+    start_ms, _ = _window_ms(context)
+    day_start = start_ms - start_ms % MS_PER_DAY
+    day = datetime.fromtimestamp(day_start / 1000, tz=timezone.utc).date()
+
+    with init_db().connect() as conn:
+        plays = dict(conn.execute(
+            select(Play.user_id, func.count())
+            .where(Play.played_at >= day_start, Play.played_at < day_start + MS_PER_DAY)
+            .group_by(Play.user_id)
+        ).all())
+        rolled = dict(conn.execute(select(DailyPlays.user_id, DailyPlays.play_count).where(DailyPlays.day == day)).all())
+
+    drifted = sorted(user_id for user_id in plays.keys() | rolled.keys()
+                     if rolled.get(user_id, 0) != plays.get(user_id, 0))
+    if drifted:
+        logging.warning(f"daily_plays out of sync with the plays table on {day} for {drifted}; run rebuild_rollups.")
+    return MaterializeResult(metadata={
+        "day": str(day), "plays": sum(plays.values()), "rolled_up": sum(rolled.values()), "in_sync": not drifted,
+    })
+
+
+spotify_etl_job = define_asset_job(
+    "spotify_etl_job",
+    selection=[raw_play_pages, flattened_plays, loaded_plays, play_rollups],
+    partitions_def=PARTITIONS,
+)
+
+# runs once per finished hour, for that hour's partition only
+spotify_etl_schedule = build_schedule_from_partitioned_job(spotify_etl_job, minute_of_hour=5)
+
+defs = Definitions(
+    assets=[raw_play_pages, flattened_plays, loaded_plays, play_rollups],
+    jobs=[spotify_etl_job],
+    schedules=[spotify_etl_schedule],
+    resources={"io_manager": FilesystemIOManager(base_dir=STORAGE_DIR)},
+)
@@ -0,0 +1,116 @@
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+from spotify_pipeline.resources.metrics import export_metrics
+from spotify_pipeline.resources.spotify_auth import SpotifyAuth
+from spotify_pipeline.resources.spotify_data import SpotifyData
+from spotify_pipeline.visualization.dashboard import warm_dashboard_cache
+
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s  - %(message)s")
+
+
+@dataclass
+class UserRunResult:
+    """
+    Outcome of one user's extraction within a multi-user run
+    """
+
+    user_id: str
+    ok: bool
+    fetched: int = 0
+    inserted: int = 0
+    seconds: float = 0.0
+    error: str = None
+
+
+def load_registry(path):
+    """
+    Read the user registry: a JSON list of objects with user_id and refresh_token,
+    and optionally client_id/client_secret (defaults come from .env).
+    """
+
+    with open(path) as f:
+        registry = json.load(f)
+
+    for entry in registry:
+        if not entry.get("user_id"):
+            raise ValueError(f"Registry entry without user_id in {path}: {entry}")
+    return registry
+
+
+def fetch_user(entry, limit=50, max_tracks=10000):
+    """
+    Extract and load one user's plays. Exceptions are returned as a failed result
+    so one bad account never aborts the rest of the run.
+    """
+
+    user_id = entry["user_id"]
+    start = time.perf_counter()
+    try:
+        auth = SpotifyAuth(
+            user_id=user_id,
+            client_id=entry.get("client_id"),
+            client_secret=entry.get("client_secret"),
+            refresh_token=entry.get("refresh_token"),
+        )
+        spotify_data = SpotifyData(auth=auth)
+        result = spotify_data.stream_to_db(limit=limit, max_tracks=max_tracks)
+
+        ok = spotify_data.fetch_complete
+        error = None if ok else "fetch stopped before reaching the watermark"
+        return UserRunResult(user_id, ok, result.plays, result.inserted, time.perf_counter() - start, error)
+
+    except Exception as e:
+        logging.error(f"Extraction failed for user '{user_id}': {e}")
+        return UserRunResult(user_id, False, seconds=time.perf_counter() - start, error=str(e))
+
+
+def run_all(registry, max_workers=8, limit=50, max_tracks=10000):
+    """
+    Fetch every registered user concurrently on a bounded thread pool.
+    The shared HTTP client's token bucket keeps the whole run under the app's rate limit,
+    and each user's rows are written (tagged with user_id) as soon as that user finishes.
+    :return: list of UserRunResult
+    """
+
+    results = []
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(fetch_user, entry, limit, max_tracks) for entry in registry]
+        for future in as_completed(futures):
+            results.append(future.result())
+
+    elapsed = time.perf_counter() - start
+    failed = [r.user_id for r in results if not r.ok]
+    logging.info(
+        f"Processed {len(results)} users in {elapsed:.1f}s: "
+        f"{sum(r.inserted for r in results)} new tracks, {len(failed)} failed."
+    )
+    if failed:
+        logging.warning(f"Failed users: {', '.join(failed)}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch recently played tracks for every registered user")
+    parser.add_argument("--users-file", default=os.getenv("SPOTIFY_USERS_FILE", "users.json"))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SPOTIFY_FETCH_WORKERS", "8")))
+    parser.add_argument("--max-tracks", type=int, default=10000)
+    args = parser.parse_args()
+
+    results = run_all(load_registry(args.users_file), max_workers=args.workers, max_tracks=args.max_tracks)
+    changed = [r.user_id for r in results if r.inserted]
+    if changed:
+        warm_dashboard_cache(changed)
+    export_metrics()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import logging
+from spotify_pipeline.resources.metrics import export_metrics
 from spotify_pipeline.resources.spotify_data import SpotifyData
-import pandas as pd
+from spotify_pipeline.visualization.dashboard import warm_dashboard_cache
 
 
 # set up logging config
@@ -9,26 +10,28 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s  - %
 
 def main():
     spotify_data = SpotifyData()
-    df = spotify_data.get_recently_played(limit=50)
 
-    if not df.empty:
-        logging.info(f"Storing {len(df)} tracks in database...")
-        spotify_data.save_track_data(df)
+    # page by page: each page is flattened, validated and written before the next is fetched
+    result = spotify_data.stream_to_db(limit=50)
+    logging.info(f"Load finished: {result.inserted} inserted, {result.updated} updated, {result.skipped} skipped.")
+    if result.inserted:
+        warm_dashboard_cache([spotify_data.user_id])
+    export_metrics()
 
 
-        # logging.info("Fetching and storing audio features for tracks...")
+    # logging.info("Fetching and storing audio features for tracks...")
 
-        # for _, row in df.iterrows():
-        #     track_id = row["track_id"]
-        #     features = spotify_data.get_audio_features(track_id)
+    # for _, row in df.iterrows():
+    #     track_id = row["track_id"]
+    #     features = spotify_data.get_audio_features(track_id)
 
 
-        #     if features:
-        #         spotify_data.save_audio_features(track_id, features)
-        #         logging.info (f"🎵 Audio features saved for {track_id}.")
+    #     if features:
+    #         spotify_data.save_audio_features(track_id, features)
+    #         logging.info (f"🎵 Audio features saved for {track_id}.")
 
-        #     else:
-        #         logging.warning(f" No audio features found for {track_id}.")
+    #     else:
+    #         logging.warning(f" No audio features found for {track_id}.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,27 @@
+import argparse
+import logging
+
+from spotify_pipeline import config
+from spotify_pipeline.models.spotify_models import init_db
+from spotify_pipeline.resources.archive import PlayArchive
+
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s  - %(message)s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact the Parquet play archive and trim the database to the hot window")
+    parser.add_argument("--archive-dir", default=config.ARCHIVE_DIR)
+    parser.add_argument("--hot-days", type=int, default=config.HOT_WINDOW_DAYS,
+                        help="move plays older than this many days out of the database")
+    parser.add_argument("--min-files", type=int, default=2, help="compact partitions with at least this many files")
+    args = parser.parse_args()
+
+    archive = PlayArchive(args.archive_dir)
+    if args.hot_days:
+        archive.offload(init_db(), args.hot_days)
+    archive.compact(min_files=args.min_files)
+
+
+if __name__ == "__main__":
+    main()
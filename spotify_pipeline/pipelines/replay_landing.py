@@ -0,0 +1,37 @@
+import argparse
+import logging
+
+from spotify_pipeline import config
+from spotify_pipeline.models.spotify_models import init_db
+from spotify_pipeline.resources.bulk_loader import ON_CONFLICT_MODES
+from spotify_pipeline.resources.landing import REPLAY_CHUNK_SIZE, LandingZone
+from spotify_pipeline.resources.metrics import export_metrics
+from spotify_pipeline.resources.transform import to_epoch_ms
+from spotify_pipeline.visualization.dashboard import warm_dashboard_cache
+
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s  - %(message)s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run transform and load over the raw landing zone")
+    parser.add_argument("--landing-dir", default=config.LANDING_DIR)
+    parser.add_argument("--user", help="only this user's segments")
+    parser.add_argument("--since", help="only segments with plays on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--workers", type=int, help="parse/transform processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=REPLAY_CHUNK_SIZE)
+    parser.add_argument("--on-conflict", choices=ON_CONFLICT_MODES, default="nothing",
+                        help="'update' refreshes track/artist/album attributes after a transform change")
+    args = parser.parse_args()
+
+    result = LandingZone(args.landing_dir).replay(
+        init_db(), user_id=args.user, since_ms=to_epoch_ms(args.since) if args.since else None,
+        workers=args.workers, chunk_size=args.chunk_size, on_conflict=args.on_conflict,
+    )
+    if result.inserted:
+        warm_dashboard_cache([args.user] if args.user else [])
+    export_metrics()
+
+
+if __name__ == "__main__":
+    main()
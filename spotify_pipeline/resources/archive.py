@@ -0,0 +1,234 @@
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+from sqlalchemy import delete, select, tuple_
+
+from spotify_pipeline import config
+from spotify_pipeline.resources.transform import EPOCH, played_at_to_ms, to_epoch_ms
+
+
+STRING = pa.dictionary(pa.int32(), pa.string())
+
+# played_at is epoch milliseconds (UTC); repeated strings are dictionary encoded
+PLAY_SCHEMA = pa.schema([
+    ("played_at", pa.int64()),
+    ("track_id", STRING),
+    ("track_name", STRING),
+    ("artist_id", STRING),
+    ("artist_name", STRING),
+    ("album_id", STRING),
+    ("album_name", STRING),
+    ("duration_ms", pa.int32()),
+])
+PARTITION_SCHEMA = pa.schema([("user_id", pa.string()), ("year", pa.int16()), ("month", pa.int8())])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+DATASET_SCHEMA = pa.schema(list(PLAY_SCHEMA) + list(PARTITION_SCHEMA))
+
+
+class PlayArchive:
+    """
+    Columnar archive of plays: Parquet files under user_id=/year=/month= directories.
+
+    SQLite stays the hot store for recent plays; the archive holds the full history in a
+    form that scans fast, prunes by partition and memory-maps on read.
+    """
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root or config.ARCHIVE_DIR or "archive")
+        self.filesystem = fs.LocalFileSystem(use_mmap=True)
+
+    def _to_table(self, records):
+        """
+        Flattened play records (transform.flatten_play shape, played_at as an ISO
+        string or epoch ms) -> Arrow table with partition columns
+        """
+
+        def main_artist(record, index):
+            artists = record.get("artists") or []
+            return artists[0][index] if artists else None
+
+        played_at = [r["played_at"] if isinstance(r["played_at"], int) else played_at_to_ms(r["played_at"])
+                     for r in records]
+        table = pa.table({
+            "played_at": pa.array(played_at, pa.int64()),
+            "track_id": [r.get("track_id") for r in records],
+            "track_name": [r.get("track_name") for r in records],
+            "artist_id": [main_artist(r, 0) for r in records],
+            "artist_name": [main_artist(r, 1) for r in records],
+            "album_id": [r.get("album_id") for r in records],
+            "album_name": [r.get("album_name") for r in records],
+            "duration_ms": pa.array([r.get("duration_ms") for r in records], pa.int32()),
+        }).cast(PLAY_SCHEMA)
+
+        timestamps = table["played_at"].cast(pa.timestamp("ms", tz="UTC"))
+        return table.append_column("user_id", pa.array([r["user_id"] for r in records], pa.string())) \
+            .append_column("year", pc.year(timestamps).cast(pa.int16())) \
+            .append_column("month", pc.month(timestamps).cast(pa.int8()))
+
+    def write(self, records):
+        """
+        Append plays to the archive; every call adds one new file per touched partition.
+        Duplicates are removed by compact().
+        """
+
+        if not records:
+            return
+        ds.write_dataset(
+            self._to_table(records), self.root, format="parquet", partitioning=PARTITIONING,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_options=ds.ParquetFileFormat().make_write_options(compression="zstd", use_dictionary=True),
+        )
+        logging.info(f"Archived {len(records)} plays to {self.root}.")
+
+    def _partitions(self):
+        for directory, _, files in os.walk(self.root):
+            parts = sorted(f for f in files if f.endswith(".parquet") and not f.startswith("."))
+            if parts:
+                yield directory, parts
+
+    def version(self):
+        """
+        (number of files, newest modification time in ns): changes with every write,
+        compaction and offload, so it can key caches of archive reads
+        """
+
+        files, newest = 0, 0
+        for directory, parts in self._partitions():
+            files += len(parts)
+            newest = max(newest, *(os.stat(os.path.join(directory, p)).st_mtime_ns for p in parts))
+        return files, newest
+
+    def compact(self, min_files=2):
+        """
+        Rewrite every partition holding at least min_files files as one file,
+        deduplicated on (played_at, track_id) and sorted by played_at so row group
+        statistics can skip time ranges.
+        :return: number of partitions compacted
+        """
+
+        compacted = 0
+        for directory, parts in self._partitions():
+            if len(parts) < min_files:
+                continue
+
+            paths = [os.path.join(directory, p) for p in parts]
+            table = pa.concat_tables(pq.read_table(p, schema=PLAY_SCHEMA) for p in paths)
+            frame = table.to_pandas().drop_duplicates(["played_at", "track_id"], keep="last")
+            table = pa.Table.from_pandas(frame.sort_values("played_at"), schema=PLAY_SCHEMA, preserve_index=False)
+
+            # dot-prefixed files are ignored by readers until the rename makes them visible
+            name = f"part-{uuid.uuid4().hex}-0.parquet"
+            temp = os.path.join(directory, f".{name}")
+            pq.write_table(table, temp, compression="zstd", use_dictionary=True)
+            os.replace(temp, os.path.join(directory, name))
+            for path in paths:
+                os.remove(path)
+            compacted += 1
+
+        logging.info(f"Compacted {compacted} archive partitions.")
+        return compacted
+
+    def dataset(self):
+        return ds.dataset(self.root, schema=DATASET_SCHEMA, format="parquet",
+                          partitioning=PARTITIONING, filesystem=self.filesystem)
+
+    def read(self, columns=None, user_id=None, start=None, end=None, artists=None):
+        """
+        Read plays with partition pruning and column projection.
+        Directories outside the user/month range are never opened and only the
+        requested columns are decoded; files are memory-mapped.
+
+        :param columns: Columns to return (any of PLAY_SCHEMA plus user_id/year/month), all by default.
+        :param user_id: Restrict to one user.
+        :param start: Earliest play (date, datetime, ISO string or epoch ms).
+        :param end: Latest play, inclusive.
+        :param artists: Iterable of main artist names to keep.
+        :return: pyarrow.Table
+        """
+
+        if not os.path.isdir(self.root):
+            empty = DATASET_SCHEMA.empty_table()
+            return empty.select(columns) if columns else empty
+
+        year, month, played_at = ds.field("year"), ds.field("month"), ds.field("played_at")
+        conditions = []
+        if user_id:
+            conditions.append(ds.field("user_id") == user_id)
+        if start is not None:
+            start = start if isinstance(start, int) else to_epoch_ms(start)
+            first = EPOCH + timedelta(milliseconds=start)
+            conditions += [(year > first.year) | ((year == first.year) & (month >= first.month)), played_at >= start]
+        if end is not None:
+            end = end if isinstance(end, int) else to_epoch_ms(end, end=True)
+            last = EPOCH + timedelta(milliseconds=end)
+            conditions += [(year < last.year) | ((year == last.year) & (month <= last.month)), played_at <= end]
+        if artists:
+            conditions.append(ds.field("artist_name").isin(list(artists)))
+
+        condition = None
+        for c in conditions:
+            condition = c if condition is None else condition & c
+        return self.dataset().to_table(columns=columns, filter=condition)
+
+    def offload(self, engine, older_than_days):
+        """
+        Move plays older than the hot window from the database into the archive.
+        The moved plays are taken back out of the rollup tables in the same transaction,
+        so the database (plays and rollups alike) covers the hot window and the archive
+        the full history.
+        :return: number of plays moved
+        """
+
+        from spotify_pipeline.models.spotify_models import Album, Artist, Play, Track
+        from spotify_pipeline.resources.bulk_loader import dialect_insert
+        from spotify_pipeline.resources.rollups import retract_rollups
+
+        cutoff = (datetime.now(timezone.utc) - EPOCH) // timedelta(milliseconds=1) - older_than_days * 86_400_000
+        query = (
+            select(Play.user_id, Play.played_at, Track.spotify_id.label("track_id"), Track.name.label("track_name"),
+                   Track.duration_ms, Artist.spotify_id.label("artist_id"), Artist.name.label("artist_name"),
+                   Album.spotify_id.label("album_id"), Album.name.label("album_name"), Play.track_id.label("track_key"))
+            .join(Track, Track.id == Play.track_id)
+            .outerjoin(Artist, Artist.id == Play.artist_id)
+            .outerjoin(Album, Album.id == Track.album_id)
+            .where(Play.played_at < cutoff)
+            .limit(50_000)
+        )
+
+        moved = 0
+        while True:
+            with engine.connect() as conn:
+                rows = conn.execute(query).all()
+            if not rows:
+                break
+
+            # plays archived at load time are already there; only write the missing ones
+            archived = self.read(columns=["user_id", "played_at", "track_id"],
+                                 start=min(r.played_at for r in rows), end=max(r.played_at for r in rows))
+            archived = set(zip(*(archived[c].to_pylist() for c in archived.column_names)))
+            self.write([
+                {"user_id": r.user_id, "played_at": r.played_at,
+                 "track_id": r.track_id, "track_name": r.track_name, "duration_ms": r.duration_ms,
+                 "album_id": r.album_id, "album_name": r.album_name, "artists": [(r.artist_id, r.artist_name)]}
+                for r in rows if (r.user_id, r.played_at, r.track_id) not in archived
+            ])
+            keys = [(r.user_id, r.played_at, r.track_key) for r in rows]
+            with engine.begin() as conn:
+                # only the plays this transaction removed leave the rollups
+                removed = conn.execute(
+                    delete(Play).where(tuple_(Play.user_id, Play.played_at, Play.track_id).in_(keys))
+                    .returning(Play.user_id, Play.played_at, Play.track_id, Play.artist_id)
+                ).all()
+                retract_rollups(conn, dialect_insert(engine), [dict(row._mapping) for row in removed])
+            moved += len(removed)
+
+        logging.info(f"Offloaded {moved} plays older than {older_than_days} days to the archive.")
+        return moved
@@ -0,0 +1,340 @@
+import logging
+from dataclasses import dataclass
+
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from spotify_pipeline.models.partitions import ensure_play_partitions
+from spotify_pipeline.models.spotify_models import Album, Artist, Play, Track, TrackArtist
+from spotify_pipeline.resources.metrics import increment, timed
+from spotify_pipeline.resources.rollups import ALL_USERS, apply_rollups, bump_data_versions
+from spotify_pipeline.resources.staging import write_rows
+from spotify_pipeline.resources.transform import played_at_to_ms
+
+
+DEFAULT_CHUNK_SIZE = 1000
+ON_CONFLICT_MODES = ("nothing", "update")
+
+
+@dataclass
+class LoadResult:
+    """
+    Row counts reported by a bulk load. inserted/skipped count plays;
+    updated counts dimension rows refreshed in "update" mode.
+    """
+
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+    @property
+    def total(self):
+        return self.inserted + self.updated + self.skipped
+
+    @property
+    def plays(self):
+        # plays the load saw, new or already stored; dimension updates are not plays
+        return self.inserted + self.skipped
+
+    def __iadd__(self, other):
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.skipped += other.skipped
+        return self
+
+
+def dialect_insert(engine):
+    """
+    Pick the dialect specific insert construct that supports ON CONFLICT
+    """
+
+    if engine.dialect.name == "sqlite":
+        return sqlite.insert
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert
+    raise ValueError(f"Bulk upsert is not supported for dialect '{engine.dialect.name}'")
+
+
+def _chunks(rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _update_rows(conn, table, rows):
+    """
+    executemany UPDATE by surrogate id; rows are dicts with "_id" plus the new column values
+    """
+
+    if rows:
+        columns = [c for c in rows[0] if c != "_id"]
+        conn.execute(
+            update(table).where(table.c.id == bindparam("_id")).values({c: bindparam(c) for c in columns}),
+            rows,
+        )
+
+
+def _resolve_named(conn, insert, model, entries, refresh):
+    """
+    Map (spotify_id, name) pairs of a named dimension (artists, albums) to surrogate ids,
+    inserting the unseen ones. Rows migrated without a spotify id are adopted by name.
+    :return: (dict of (spotify_id, name) -> id, number of rows whose name was refreshed)
+    """
+
+    table = model.__table__
+    by_spotify_id = {sid: name for sid, name in entries if sid}
+    names_only = {name for sid, name in entries if not sid and name}
+    sid_to_id, name_to_id = {}, {}
+    refreshed = 0
+
+    if by_spotify_id:
+        found = {
+            row.spotify_id: row
+            for row in conn.execute(
+                select(table.c.id, table.c.spotify_id, table.c.name)
+                .where(table.c.spotify_id.in_(list(by_spotify_id)))
+            )
+        }
+        sid_to_id.update({sid: row.id for sid, row in found.items()})
+
+        if refresh:
+            changed = [
+                {"_id": row.id, "name": by_spotify_id[sid]}
+                for sid, row in found.items() if row.name != by_spotify_id[sid]
+            ]
+            _update_rows(conn, table, changed)
+            refreshed += len(changed)
+
+        missing = {sid: name for sid, name in by_spotify_id.items() if sid not in found}
+        if missing:
+            legacy = {
+                row.name: row.id
+                for row in conn.execute(
+                    select(table.c.id, table.c.name)
+                    .where(table.c.spotify_id.is_(None), table.c.name.in_(set(missing.values())))
+                )
+            }
+            adopted = []
+            for sid, name in list(missing.items()):
+                if name in legacy:
+                    adopted.append({"_id": legacy.pop(name), "spotify_id": sid})
+                    sid_to_id[sid] = adopted[-1]["_id"]
+                    del missing[sid]
+            _update_rows(conn, table, adopted)
+
+        if missing:
+            write_rows(
+                conn,
+                insert(model).on_conflict_do_nothing(index_elements=["spotify_id"]),
+                [{"spotify_id": sid, "name": name} for sid, name in sorted(missing.items())],
+                key=["spotify_id"],
+            )
+            sid_to_id.update({
+                row.spotify_id: row.id
+                for row in conn.execute(
+                    select(table.c.id, table.c.spotify_id).where(table.c.spotify_id.in_(list(missing)))
+                )
+            })
+
+    if names_only:
+        name_query = select(table.c.id, table.c.name).where(
+            table.c.spotify_id.is_(None), table.c.name.in_(names_only)
+        )
+        name_to_id = {row.name: row.id for row in conn.execute(name_query)}
+        unseen = names_only - set(name_to_id)
+        if unseen:
+            conn.execute(insert(model), [{"spotify_id": None, "name": name} for name in unseen])
+            name_to_id = {row.name: row.id for row in conn.execute(name_query)}
+
+    ids = {}
+    for sid, name in entries:
+        ids[(sid, name)] = sid_to_id.get(sid) if sid else name_to_id.get(name)
+    return ids, refreshed
+
+
+def _resolve_tracks(conn, insert, tracks, refresh):
+    """
+    Map track spotify ids to surrogate ids, inserting unseen tracks and their artist credits.
+    :param tracks: dict spotify_id -> {"name", "album_id", "duration_ms", "artist_ids"}
+    :return: (dict spotify_id -> id, number of rows refreshed)
+    """
+
+    table = Track.__table__
+    found = {
+        row.spotify_id: row
+        for row in conn.execute(
+            select(table.c.id, table.c.spotify_id, table.c.name, table.c.album_id, table.c.duration_ms)
+            .where(table.c.spotify_id.in_(list(tracks)))
+        )
+    }
+    ids = {sid: row.id for sid, row in found.items()}
+    refreshed = 0
+    credit_tracks = []
+
+    if refresh:
+        changed = []
+        for sid, row in found.items():
+            new = tracks[sid]
+            if (row.name, row.album_id, row.duration_ms) != (new["name"], new["album_id"], new["duration_ms"]):
+                changed.append({"_id": row.id, "name": new["name"], "album_id": new["album_id"],
+                                "duration_ms": new["duration_ms"]})
+        _update_rows(conn, table, changed)
+        refreshed += len(changed)
+        credit_tracks.extend(found)
+
+    missing = sorted(sid for sid in tracks if sid not in found)
+    if missing:
+        write_rows(
+            conn,
+            insert(Track).on_conflict_do_nothing(index_elements=["spotify_id"]),
+            [
+                {"spotify_id": sid, "name": tracks[sid]["name"], "album_id": tracks[sid]["album_id"],
+                 "duration_ms": tracks[sid]["duration_ms"]}
+                for sid in missing
+            ],
+            key=["spotify_id"],
+        )
+        ids.update({
+            row.spotify_id: row.id
+            for row in conn.execute(select(table.c.id, table.c.spotify_id).where(table.c.spotify_id.in_(missing)))
+        })
+        credit_tracks.extend(missing)
+
+    credits = sorted((
+        {"track_id": ids[sid], "position": position, "artist_id": artist_id}
+        for sid in credit_tracks
+        for position, artist_id in enumerate(tracks[sid]["artist_ids"])
+        if artist_id is not None
+    ), key=lambda credit: (credit["track_id"], credit["position"]))
+    if credits:
+        stmt = insert(TrackArtist)
+        if refresh:
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["track_id", "position"], set_={"artist_id": stmt.excluded.artist_id}
+            )
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=["track_id", "position"])
+        write_rows(conn, stmt, credits, key=["track_id", "position"])
+
+    return ids, refreshed
+
+
+def _load_chunk(conn, insert, chunk, on_conflict):
+    """
+    Load one chunk of flattened play records inside the caller's transaction.
+    New dimension rows are written in key order, so concurrent loads (one per user)
+    lock the artists, albums and tracks they share in the same order.
+    :return: (LoadResult, list of the records whose plays were newly inserted)
+    """
+
+    result = LoadResult()
+    refresh = on_conflict == "update"
+
+    # last occurrence of a play wins, earlier ones count as skipped
+    unique = {}
+    for record in chunk:
+        unique[(record["user_id"], played_at_to_ms(record["played_at"]), record["track_id"])] = record
+    result.skipped += len(chunk) - len(unique)
+    # before any row is written: creating a partition locks the tables plays references
+    ensure_play_partitions(conn, {played_at for _, played_at, _ in unique})
+
+    artist_ids, refreshed = _resolve_named(
+        conn, insert, Artist, {tuple(a) for r in unique.values() for a in r["artists"]}, refresh
+    )
+    result.updated += refreshed
+    album_ids, refreshed = _resolve_named(
+        conn, insert, Album, {(r["album_id"], r["album_name"]) for r in unique.values()}, refresh
+    )
+    result.updated += refreshed
+
+    tracks = {}
+    for r in unique.values():
+        tracks[r["track_id"]] = {
+            "name": r["track_name"],
+            "album_id": album_ids.get((r["album_id"], r["album_name"])),
+            "duration_ms": r["duration_ms"],
+            "artist_ids": [artist_ids.get(tuple(a)) for a in r["artists"]],
+        }
+    track_ids, refreshed = _resolve_tracks(conn, insert, tracks, refresh)
+    result.updated += refreshed
+
+    plays = {
+        (user_id, played_at, track_ids[track_sid]): tracks[track_sid]["artist_ids"][0] if tracks[track_sid]["artist_ids"] else None
+        for user_id, played_at, track_sid in unique
+    }
+    rows = [
+        {"user_id": user_id, "played_at": played_at, "track_id": track_id, "artist_id": artist_id}
+        for (user_id, played_at, track_id), artist_id in plays.items()
+    ]
+    # RETURNING reports the plays this insert wrote: a check before the insert is not atomic
+    # with it, and overlapping loads (cron and Dagster on one user) would count a play twice
+    key = ["user_id", "played_at", "track_id"]
+    stmt = insert(Play).on_conflict_do_nothing(index_elements=key).returning(Play.user_id, Play.played_at, Play.track_id)
+    inserted = set(map(tuple, write_rows(conn, stmt, rows, key=key)))
+
+    new_plays = [row for row in rows if (row["user_id"], row["played_at"], row["track_id"]) in inserted]
+    new_records = [
+        record for (user_id, played_at, track_sid), record in unique.items()
+        if (user_id, played_at, track_ids[track_sid]) in inserted
+    ]
+    if new_plays:
+        # keep the dashboard rollups in step, inside the same transaction
+        apply_rollups(conn, insert, new_plays)
+    if result.updated:
+        # refreshed names show up in every user's views
+        bump_data_versions(conn, insert, [ALL_USERS])
+
+    result.inserted += len(new_plays)
+    result.skipped += len(plays) - len(new_plays)
+    return result, new_records
+
+
+def upsert_plays(records, engine, chunk_size=DEFAULT_CHUNK_SIZE, on_conflict="nothing", on_inserted=None):
+    """
+    Set based load of flattened play records into the star schema.
+
+    Each chunk resolves its artists, albums and tracks to surrogate keys
+    (inserting unseen ones), writes the plays and folds the new plays into
+    the rollup tables, all with batched INSERT ... ON CONFLICT statements in
+    one transaction per chunk, so a failure only rolls back the chunk in flight.
+    On Postgres each batch is COPYed into a staging table and merged from there
+    (staging.write_rows), and plays go to their monthly partitions.
+
+    :param records: Iterable of records shaped like transform.flatten_play output.
+    :param engine: SQLAlchemy engine (SQLite or Postgres).
+    :param chunk_size: Number of records written per transaction.
+    :param on_conflict: "nothing" keeps existing rows, "update" also refreshes changed
+                        track/artist/album attributes.
+    :param on_inserted: Optional callable, given each committed chunk's newly inserted
+                        records (e.g. to append them to the Parquet archive).
+    :return: LoadResult with inserted/updated/skipped counts.
+    """
+
+    if on_conflict not in ON_CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be one of {ON_CONFLICT_MODES}, got '{on_conflict}'")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer")
+
+    insert = dialect_insert(engine)
+    result = LoadResult()
+
+    for chunk in _chunks(records, chunk_size):
+        with timed("load_chunk"), engine.begin() as conn:
+            chunk_result, new_records = _load_chunk(conn, insert, chunk, on_conflict)
+        result += chunk_result
+        if on_inserted and new_records:
+            on_inserted(new_records)
+
+    increment("rows", result.inserted, outcome="inserted")
+    increment("rows", result.updated, outcome="updated")
+    increment("rows", result.skipped, outcome="skipped")
+    logging.info(
+        f"Bulk load complete: {result.inserted} inserted, {result.updated} updated, "
+        f"{result.skipped} skipped."
+    )
+    return result
@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import time
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+
+from spotify_pipeline.models.spotify_models import DataQualityRun
+
+
+DQ_LEVELS = ("off", "counts", "full")
+DEFAULT_LEVEL = os.getenv("SPOTIFY_DQ_LEVEL", "counts")
+DEFAULT_SAMPLE_SIZE = int(os.getenv("SPOTIFY_DQ_SAMPLE_SIZE", "100000"))
+
+
+@dataclass
+class DataQualityMetrics:
+    """
+    Structured result of a data-quality check on a batch of plays.
+    unique_tracks and top_artists are only filled at level "full" and are
+    computed on at most sampled_rows rows.
+    """
+
+    level: str
+    rows: int
+    missing_values: int
+    duplicate_rows: int
+    sampled_rows: int = 0
+    unique_tracks: int = None
+    top_artists: list = field(default_factory=list)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def _count_duplicate_keys(df, key_columns):
+    """
+    Count rows repeating an earlier key. Plays come back ordered by played_at (the
+    last key column), so duplicates can only sit in runs of equal timestamps: one
+    vectorised neighbour comparison replaces hashing every key, and only rows in
+    such runs go through duplicated(). Unordered frames take the full hash scan.
+    """
+
+    played = df[key_columns[-1]].to_numpy(dtype=object)
+    if len(played) > 1:
+        try:
+            ordered = (played[1:] <= played[:-1]).all() or (played[1:] >= played[:-1]).all()
+        except TypeError:
+            ordered = False
+
+        if ordered:
+            same = played[1:] == played[:-1]
+            if not same.any():
+                return 0
+            in_run = np.zeros(len(played), dtype=bool)
+            in_run[1:] |= same
+            in_run[:-1] |= same
+            return int(df.loc[in_run].duplicated(subset=list(key_columns)).sum())
+
+    return int(df.duplicated(subset=list(key_columns)).sum())
+
+
+def profile_tracks(df, level=None, sample_size=None, key_columns=("track_id", "played_at"), artist_column="artist_name"):
+    """
+    Run the data-quality checks for a track DataFrame.
+    :param level: "off", "counts" (missing values + duplicate keys) or "full" (adds unique tracks and top artists)
+    :param sample_size: Row cap for the "full" statistics on large frames
+    :param key_columns: Columns identifying a play, the last one being the timestamp
+    :return: DataQualityMetrics, or None when level is "off"
+    """
+
+    level = _check_level(level)
+    if level == "off" or df.empty:
+        return None
+
+    metrics = DataQualityMetrics(
+        level=level,
+        rows=len(df),
+        missing_values=int(df.isna().to_numpy().sum()),
+        duplicate_rows=_count_duplicate_keys(df, key_columns),
+    )
+
+    if level == "full":
+        sample_size = sample_size or DEFAULT_SAMPLE_SIZE
+        sample = df.sample(n=sample_size, random_state=0) if len(df) > sample_size else df
+        metrics.sampled_rows = len(sample)
+        metrics.unique_tracks = int(sample[key_columns[0]].nunique())
+        # categorical columns also count the categories absent from the sample, as zeros
+        counts = sample[artist_column].value_counts()
+        metrics.top_artists = [[name, int(count)] for name, count in counts[counts > 0].head(5).items()]
+
+    _report(metrics)
+    return metrics
+
+
+def _check_level(level):
+    level = level or DEFAULT_LEVEL
+    if level not in DQ_LEVELS:
+        raise ValueError(f"Data quality level must be one of {DQ_LEVELS}, got '{level}'")
+    return level
+
+
+def _report(metrics):
+    if metrics.missing_values:
+        logging.warning("Missing value found: %s", metrics.missing_values)
+    if metrics.duplicate_rows:
+        logging.warning("Duplicate records found: %s", metrics.duplicate_rows)
+    logging.info("Data quality (%s): %s", metrics.level, metrics)
+
+
+class StreamProfile:
+    """
+    The profile_tracks checks accumulated over the PlayBatches of a streamed load, so
+    stream_to_db keeps one metrics row per run without building a DataFrame. Missing
+    values and duplicate keys cover every play of the run; the "full" statistics cover
+    its first sample_size plays.
+    """
+
+    def __init__(self, level=None, sample_size=None):
+        self.level = _check_level(level)
+        self.sample_size = sample_size or DEFAULT_SAMPLE_SIZE
+        self.rows = self.missing_values = self.duplicate_rows = self.sampled_rows = 0
+        self._keys = set()
+        self._tracks = set()
+        self._artists = Counter()
+
+    def update(self, batch):
+        """
+        Add one PlayBatch to the run's checks
+        """
+
+        if self.level == "off" or not len(batch):
+            return
+        from spotify_pipeline.resources.play_store import MISSING_DURATION, STRING_COLUMNS
+
+        # the cells a DataFrame of the batch would hold as NaN: code -1 strings, missing
+        # durations and plays whose credits have no main artist name
+        self.rows += len(batch)
+        self.missing_values += sum(batch.columns[column].count(-1) for column in STRING_COLUMNS)
+        self.missing_values += batch.duration_ms.count(MISSING_DURATION)
+        unnamed = {code for code, main in enumerate(batch.credit_main) if main < 0}
+        if unnamed:
+            self.missing_values += sum(code in unnamed for code in batch.credits)
+
+        track_ids = batch.pools["track_id"].values
+        for code, played_at in zip(batch.columns["track_id"], batch.played_at):
+            key = (track_ids[code], played_at)
+            if key in self._keys:
+                self.duplicate_rows += 1
+            else:
+                self._keys.add(key)
+
+        if self.level == "full" and self.sampled_rows < self.sample_size:
+            n = min(len(batch), self.sample_size - self.sampled_rows)
+            self._tracks.update(track_ids[code] for code in batch.columns["track_id"][:n])
+            artist_names, main = batch.pools["artist_name"], batch.credit_main
+            self._artists.update(artist_names[main[code]] for code in batch.credits[:n] if main[code] >= 0)
+            self.sampled_rows += n
+
+    def metrics(self):
+        """
+        :return: DataQualityMetrics of the run, or None when level is "off" or no plays arrived
+        """
+
+        if self.level == "off" or not self.rows:
+            return None
+        metrics = DataQualityMetrics(level=self.level, rows=self.rows, missing_values=self.missing_values,
+                                     duplicate_rows=self.duplicate_rows)
+        if self.level == "full":
+            metrics.sampled_rows = self.sampled_rows
+            metrics.unique_tracks = len(self._tracks)
+            metrics.top_artists = [[name, count] for name, count in self._artists.most_common(5)]
+        _report(metrics)
+        return metrics
+
+
+def save_metrics(metrics, engine, user_id):
+    """
+    Persist a metrics object to the data_quality_runs table
+    """
+
+    with engine.begin() as conn:
+        conn.execute(
+            DataQualityRun.__table__.insert().values(
+                user_id=user_id,
+                run_at=int(time.time()),
+                level=metrics.level,
+                rows=metrics.rows,
+                missing_values=metrics.missing_values,
+                duplicate_rows=metrics.duplicate_rows,
+                sampled_rows=metrics.sampled_rows,
+                unique_tracks=metrics.unique_tracks,
+                top_artists=json.dumps(metrics.top_artists),
+            )
+        )
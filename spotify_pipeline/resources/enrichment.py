@@ -0,0 +1,194 @@
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+
+import requests
+from sqlalchemy import select, tuple_
+
+from spotify_pipeline.models.spotify_models import MetadataCache
+from spotify_pipeline.resources.bulk_loader import dialect_insert
+from spotify_pipeline.resources.http_client import get_client
+
+
+# kind -> (batch endpoint, key of the list in its response, max ids per call)
+ENDPOINTS = {
+    "track": ("tracks", "tracks", 50),
+    "artist": ("artists", "artists", 50),
+    "album": ("albums", "albums", 20),
+}
+DEFAULT_KINDS = tuple(os.getenv("SPOTIFY_METADATA_KINDS", "track,artist,album").split(","))
+DEFAULT_TTL_DAYS = float(os.getenv("SPOTIFY_METADATA_TTL_DAYS", "30"))
+
+# large and of no use to the dashboard
+DROPPED_FIELDS = ("available_markets",)
+
+
+@dataclass
+class EnrichmentStats:
+    """
+    Running totals of an enricher; calls_per_10k_plays is the figure to watch
+    """
+
+    plays: int = 0
+    ids_seen: int = 0
+    cache_hits: int = 0
+    fetched: int = 0
+    api_calls: int = 0
+    failed_calls: int = 0
+
+    @property
+    def calls_per_10k_plays(self):
+        return self.api_calls * 10_000 / self.plays if self.plays else 0.0
+
+
+def _compact(obj):
+    if isinstance(obj, dict):
+        return {k: _compact(v) for k, v in obj.items() if k not in DROPPED_FIELDS}
+    if isinstance(obj, list):
+        return [_compact(v) for v in obj]
+    return obj
+
+
+class MetadataEnricher:
+    """
+    Resolve the track/artist/album ids of loaded plays through Spotify's batch
+    endpoints and keep the results in the metadata_cache table. An id is only
+    fetched again once its cached copy is older than the TTL.
+    """
+
+    API_BASE = "https://api.spotify.com/v1"
+
+    def __init__(self, engine, auth, kinds=DEFAULT_KINDS, ttl_days=DEFAULT_TTL_DAYS):
+        """
+        :param engine: Database engine holding metadata_cache.
+        :param auth: SpotifyAuth used for the access token.
+        :param kinds: Which of ENDPOINTS to resolve.
+        :param ttl_days: Age after which a cached object is fetched again.
+        """
+
+        unknown = set(kinds) - set(ENDPOINTS)
+        if unknown:
+            raise ValueError(f"Unknown metadata kinds {sorted(unknown)}, expected some of {sorted(ENDPOINTS)}")
+        self.engine = engine
+        self.auth = auth
+        self.kinds = tuple(kinds)
+        self.ttl_ms = int(ttl_days * 86_400_000)
+        self.stats = EnrichmentStats()
+
+    def collect_ids(self, records):
+        """
+        Distinct ids per kind referenced by flattened play records
+        """
+
+        ids = {kind: set() for kind in self.kinds}
+        for record in records:
+            if "track" in ids and record.get("track_id"):
+                ids["track"].add(record["track_id"])
+            if "album" in ids and record.get("album_id"):
+                ids["album"].add(record["album_id"])
+            if "artist" in ids:
+                ids["artist"].update(a[0] for a in record.get("artists") or [] if a[0])
+        return ids
+
+    def _cached(self, kind, ids, now_ms):
+        """
+        ids of this kind whose cached copy is still fresh
+        """
+
+        with self.engine.connect() as conn:
+            return {
+                row.spotify_id for row in conn.execute(
+                    select(MetadataCache.spotify_id).where(
+                        MetadataCache.kind == kind,
+                        MetadataCache.spotify_id.in_(list(ids)),
+                        MetadataCache.fetched_at >= now_ms - self.ttl_ms,
+                    )
+                )
+            }
+
+    def _fetch(self, kind, ids):
+        """
+        Call the batch endpoint in slices of its maximum size.
+        :return: dict id -> object (None for ids Spotify returned null for)
+        """
+
+        path, key, batch_size = ENDPOINTS[kind]
+        ids = sorted(ids)
+        objects = {}
+        for i in range(0, len(ids), batch_size):
+            batch = ids[i:i + batch_size]
+            headers = {"Authorization": f"Bearer {self.auth.get_access_token()}"}
+            self.stats.api_calls += 1
+            try:
+                response = get_client().get(f"{self.API_BASE}/{path}", headers=headers,
+                                            params={"ids": ",".join(batch)})
+            except requests.exceptions.RequestException as e:
+                response = None
+                logging.warning(f"Metadata request for {len(batch)} {kind} ids failed: {e}")
+
+            if response is None or response.status_code != 200:
+                # not cached, so the ids are tried again with the next load
+                self.stats.failed_calls += 1
+                if response is not None:
+                    logging.warning(f"Metadata request for {len(batch)} {kind} ids failed: {response.status_code}")
+                continue
+            for spotify_id, obj in zip(batch, response.json().get(key) or []):
+                objects[spotify_id] = _compact(obj) if obj else None
+        return objects
+
+    def _store(self, kind, objects, now_ms):
+        insert = dialect_insert(self.engine)
+        stmt = insert(MetadataCache)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["kind", "spotify_id"],
+            set_={"data": stmt.excluded.data, "fetched_at": stmt.excluded.fetched_at},
+        )
+        rows = [
+            {"kind": kind, "spotify_id": spotify_id, "data": json.dumps(obj), "fetched_at": now_ms}
+            for spotify_id, obj in objects.items()
+        ]
+        with self.engine.begin() as conn:
+            conn.execute(stmt, rows)
+
+    def enrich(self, records):
+        """
+        Fetch and cache metadata for every id in records that is missing or stale.
+        Failures are logged, never raised, so enrichment cannot break a load.
+        :return: number of objects fetched
+        """
+
+        self.stats.plays += len(records)
+        fetched = 0
+        try:
+            now_ms = int(time.time() * 1000)
+            for kind, ids in self.collect_ids(records).items():
+                if not ids:
+                    continue
+                fresh = self._cached(kind, ids, now_ms)
+                self.stats.ids_seen += len(ids)
+                self.stats.cache_hits += len(fresh)
+
+                objects = self._fetch(kind, ids - fresh) if ids - fresh else {}
+                if objects:
+                    self._store(kind, objects, now_ms)
+                fetched += len(objects)
+        except Exception as e:
+            logging.warning(f"Metadata enrichment failed: {e}")
+
+        self.stats.fetched += fetched
+        return fetched
+
+    def get(self, kind, spotify_ids):
+        """
+        Read cached objects.
+        :return: dict id -> object for the ids present in the cache
+        """
+
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(MetadataCache.spotify_id, MetadataCache.data)
+                .where(tuple_(MetadataCache.kind, MetadataCache.spotify_id).in_([(kind, i) for i in spotify_ids]))
+            )
+            return {row.spotify_id: json.loads(row.data) for row in rows}
@@ -0,0 +1,204 @@
+import logging
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from spotify_pipeline.resources.metrics import increment, timed
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting the request rate across every job
+    sharing the client. A 429 with Retry-After pauses the whole bucket.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        :param rate: Tokens added per second (sustained requests per second).
+        :param capacity: Maximum burst size, defaults to one second worth of tokens.
+        """
+
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def pause(self, seconds):
+        """
+        Stop handing out tokens for `seconds` (used when the server asks us to back off)
+        """
+
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def acquire(self, tokens=1):
+        """
+        Block until `tokens` are available
+        """
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now >= self.paused_until:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= tokens:
+                        self.tokens -= tokens
+                        return
+                    wait = (tokens - self.tokens) / self.rate
+                else:
+                    self.updated = self.paused_until
+                    wait = self.paused_until - now
+            time.sleep(wait)
+
+
+class SpotifyHttpClient:
+    """
+    Pooled keep-alive HTTP client with timeouts, exponential backoff with
+    jitter, Retry-After support and an optional shared rate limiter.
+    """
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    def __init__(self, timeout=(5, 30), max_retries=5, backoff_base=0.5, backoff_max=30.0,
+                 max_retry_after=120.0, rate_limiter=None, pool_maxsize=10):
+        """
+        :param timeout: (connect, read) timeout in seconds passed to every request.
+        :param max_retries: Retries after the first attempt for retryable failures.
+        :param backoff_base: Base delay in seconds for exponential backoff.
+        :param backoff_max: Upper bound on a single backoff delay.
+        :param max_retry_after: Longest Retry-After waited out; a response asking for more is
+                                returned straight away instead of retried.
+        :param rate_limiter: Optional TokenBucket shared with other clients/threads.
+        :param pool_maxsize: Keep-alive connections kept per host.
+        """
+
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.rate_limiter = rate_limiter
+        self.retry_count = 0
+        self._lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _backoff(self, attempt):
+        """
+        Full jitter: a random delay up to base * 2^attempt, capped at backoff_max
+        """
+
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _retry_after(self, response):
+        """
+        Seconds requested by the Retry-After header (delta-seconds or HTTP date), or None
+        """
+
+        value = response.headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request, retrying connection errors, timeouts, 429 and 5xx.
+        After the last retry the final response is returned (or the error re-raised).
+        """
+
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+
+            try:
+                with timed("http_request", method=method):
+                    response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                increment("http_requests", method=method, status="error")
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logging.warning(f"{method} {url} failed ({e}). Retrying in {delay:.2f}s...")
+            else:
+                increment("http_requests", method=method, status=response.status_code)
+                if response.status_code not in self.RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+
+                retry_after = self._retry_after(response)
+                if retry_after is not None and retry_after > self.max_retry_after:
+                    logging.warning(f"{method} {url} returned {response.status_code} with Retry-After "
+                                    f"{retry_after:.0f}s, over the {self.max_retry_after:.0f}s limit. Not retrying.")
+                    return response
+                # the server's Retry-After is waited out in full: retrying sooner only earns another 429
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                if response.status_code == 429 and self.rate_limiter:
+                    self.rate_limiter.pause(delay)
+                logging.warning(f"{method} {url} returned {response.status_code}. Retrying in {delay:.2f}s...")
+                response.close()
+
+            attempt += 1
+            with self._lock:
+                self.retry_count += 1
+            increment("http_retries", method=method)
+            time.sleep(delay)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Process-wide client shared by SpotifyAuth and SpotifyData, configured from the environment:
+    SPOTIFY_HTTP_CONNECT_TIMEOUT, SPOTIFY_HTTP_READ_TIMEOUT, SPOTIFY_HTTP_MAX_RETRIES,
+    SPOTIFY_HTTP_MAX_RETRY_AFTER, SPOTIFY_HTTP_POOL_SIZE and SPOTIFY_RATE_LIMIT
+    (requests per second, 0 disables).
+    """
+
+    global _client
+    with _client_lock:
+        if _client is None:
+            rate = float(os.getenv("SPOTIFY_RATE_LIMIT", "10"))
+            _client = SpotifyHttpClient(
+                timeout=(
+                    float(os.getenv("SPOTIFY_HTTP_CONNECT_TIMEOUT", "5")),
+                    float(os.getenv("SPOTIFY_HTTP_READ_TIMEOUT", "30")),
+                ),
+                max_retries=int(os.getenv("SPOTIFY_HTTP_MAX_RETRIES", "5")),
+                max_retry_after=float(os.getenv("SPOTIFY_HTTP_MAX_RETRY_AFTER", "120")),
+                rate_limiter=TokenBucket(rate) if rate > 0 else None,
+                pool_maxsize=int(os.getenv("SPOTIFY_HTTP_POOL_SIZE", "10")),
+            )
+        return _client
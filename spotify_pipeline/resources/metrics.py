@@ -0,0 +1,208 @@
+import cProfile
+import contextlib
+import logging
+import os
+import threading
+import time
+
+
+# On by default: a timer is two perf_counter calls and a dict update under a lock
+ENABLED = os.getenv("SPOTIFY_METRICS", "1").lower() not in ("0", "false", "no")
+# Prometheus text file written by export_metrics (e.g. for node_exporter's textfile collector)
+METRICS_FILE = os.getenv("SPOTIFY_METRICS_FILE")
+# The dashboard server's own file (chart builds, queries, cache hits), rewritten after every render
+DASHBOARD_METRICS_FILE = os.getenv("SPOTIFY_DASHBOARD_METRICS_FILE")
+# Comma separated stage names to run under cProfile, one .prof file per call
+PROFILE_STAGES = frozenset(s for s in os.getenv("SPOTIFY_PROFILE_STAGES", "").split(",") if s)
+PROFILE_DIR = os.getenv("SPOTIFY_PROFILE_DIR", "profiles")
+
+PREFIX = "spotify_etl"
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters and stage timers, keyed by name and labels. Thread safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            # (stage, labels) -> [count, total seconds, max seconds]
+            self.timers = {}
+
+    def increment(self, name, value=1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, stage, seconds, **labels):
+        key = (stage, _labels(labels))
+        with self._lock:
+            timer = self.timers.get(key)
+            if timer is None:
+                self.timers[key] = [1, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+
+    def to_prometheus(self):
+        """
+        Prometheus text exposition: counters as <prefix>_<name>_total, stage timers as
+        the <prefix>_stage_seconds summary (count and sum) plus a _max gauge
+        """
+
+        with self._lock:
+            counters = sorted(self.counters.items())
+            timers = sorted(self.timers.items())
+
+        lines = []
+        for name in sorted({name for (name, _), _ in counters}):
+            lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+            lines += [f"{PREFIX}_{name}_total{_format_labels(labels)} {value}"
+                      for (n, labels), value in counters if n == name]
+
+        if timers:
+            lines.append(f"# TYPE {PREFIX}_stage_seconds summary")
+            for (stage, labels), (count, total, _) in timers:
+                stage_labels = _format_labels(labels, [("stage", stage)])
+                lines.append(f"{PREFIX}_stage_seconds_count{stage_labels} {count}")
+                lines.append(f"{PREFIX}_stage_seconds_sum{stage_labels} {total:.6f}")
+            lines.append(f"# TYPE {PREFIX}_stage_seconds_max gauge")
+            lines += [f"{PREFIX}_stage_seconds_max{_format_labels(labels, [('stage', stage)])} {longest:.6f}"
+                      for (stage, labels), (_, _, longest) in timers]
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        One line per stage and counter, for the end-of-run log
+        """
+
+        with self._lock:
+            timers = sorted(self.timers.items())
+            counters = sorted(self.counters.items())
+        lines = [f"{stage}{dict(labels) or ''}: {count} x, {total:.3f}s total, {longest:.3f}s max"
+                 for (stage, labels), (count, total, longest) in timers]
+        lines += [f"{name}{dict(labels) or ''}: {value}" for (name, labels), value in counters]
+        return "\n".join(lines)
+
+
+REGISTRY = MetricsRegistry()
+
+
+def increment(name, value=1, **labels):
+    """
+    Add to a counter, e.g. increment("rows", 50, outcome="inserted")
+    """
+
+    if ENABLED:
+        REGISTRY.increment(name, value, **labels)
+
+
+class timed(contextlib.ContextDecorator):
+    """
+    Time a stage, as a context manager or a decorator:
+
+        with timed("fetch_page"):
+            ...
+
+        @timed("transform")
+        def store_tracks_in_dataframe(...): ...
+
+    Exceptions leaving the stage are counted as errors{stage=...}. Stages listed in
+    SPOTIFY_PROFILE_STAGES also run under cProfile and dump a .prof file to SPOTIFY_PROFILE_DIR.
+    """
+
+    def __init__(self, stage, **labels):
+        self.stage = stage
+        self.labels = labels
+        self._start = None
+        self._paused = 0.0
+        self._profiler = None
+
+    def _recreate_cm(self):
+        # a fresh instance per decorated call, so concurrent calls don't share state
+        return type(self)(self.stage, **self.labels)
+
+    def __enter__(self):
+        if self.stage in PROFILE_STAGES:
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+            except ValueError:
+                # another profiler is already active (nested profiled stages)
+                self._profiler = None
+        self._start = time.perf_counter()
+        return self
+
+    @contextlib.contextmanager
+    def paused(self):
+        """
+        Leave a nested step out of this stage's time, e.g. a callback timed as its own stage:
+
+            with timed("db_write") as timer:
+                ...
+                with timer.paused():
+                    callback()
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._paused += time.perf_counter() - start
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self._start - self._paused
+        if self._profiler:
+            self._profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            path = os.path.join(PROFILE_DIR, f"{self.stage}-{int(time.time() * 1000)}-{threading.get_ident()}.prof")
+            self._profiler.dump_stats(path)
+            logging.info(f"Profile of stage '{self.stage}' written to {path}")
+
+        if ENABLED:
+            REGISTRY.observe(self.stage, elapsed, **self.labels)
+            if exc_type is not None:
+                REGISTRY.increment("errors", stage=self.stage)
+        return False
+
+
+def export_metrics(path=None, log=True):
+    """
+    Log the run's stage timings and counters and, when a path (or SPOTIFY_METRICS_FILE)
+    is given, write them as a Prometheus text file (atomically, so scrapers never
+    read a partial file).
+    :param log: Log the summary; the dashboard exports after every render and skips it.
+    """
+
+    if not ENABLED:
+        return
+    if log:
+        logging.info(f"Pipeline metrics:\n{REGISTRY.summary()}")
+
+    path = path or METRICS_FILE
+    if path:
+        # one temporary file per writer: dashboard sessions export from several threads
+        temp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp, "w") as f:
+            f.write(REGISTRY.to_prometheus())
+        os.replace(temp, path)
+        if log:
+            logging.info(f"Metrics written to {path}")
@@ -0,0 +1,200 @@
+import logging
+from array import array
+
+from spotify_pipeline.resources.transform import played_at_to_ms
+
+
+# Only the standard library is needed to fill a batch; NumPy, pandas and pyarrow are
+# imported by the conversions that use them.
+
+STRING_COLUMNS = ("user_id", "track_id", "track_name", "album_id", "album_name")
+# duration_ms of plays the API returned without one
+MISSING_DURATION = -1
+
+
+class StringPool:
+    """
+    Interns strings to dense codes: every distinct value is stored once and rows keep
+    an int32 code into values (-1 for None), like the dictionary of a Categorical.
+    """
+
+    __slots__ = ("codes", "values")
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def code(self, value):
+        if value is None:
+            return -1
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __getitem__(self, code):
+        return self.values[code] if code >= 0 else None
+
+    def __getstate__(self):
+        # the codes are rebuilt from values, so a pickled pool holds each string once
+        return self.values
+
+    def __setstate__(self, values):
+        self.values = values
+        self.codes = {value: code for code, value in enumerate(values)}
+
+
+class PlayBatch:
+    """
+    Column store of validated plays: one int32 code per string column, epoch ms in an
+    int64 array, and each play's artist credits interned as a shared tuple of
+    (spotify_id, name) pairs. About 40 bytes per play plus one copy of each distinct
+    string, where a flattened record dict costs several hundred.
+
+    Iterating yields transform.flatten_play shaped records (played_at as epoch ms,
+    artists as a tuple), so a batch can be handed straight to upsert_plays.
+    """
+
+    __slots__ = ("pools", "columns", "played_at", "duration_ms", "credits", "credit_pool", "credit_main")
+
+    def __init__(self):
+        self.pools = {column: StringPool() for column in STRING_COLUMNS}
+        self.columns = {column: array("i") for column in STRING_COLUMNS}
+        self.played_at = array("q")
+        self.duration_ms = array("q")
+        # code of each play's credits in credit_pool (interned tuples rather than strings),
+        # and each credit's main artist name in pools["artist_name"]
+        self.credits = array("i")
+        self.credit_pool = StringPool()
+        self.credit_main = array("i")
+        self.pools["artist_name"] = StringPool()
+
+    @classmethod
+    def from_items(cls, items, user_id):
+        batch = cls()
+        batch.extend(items, user_id)
+        return batch
+
+    def __len__(self):
+        return len(self.played_at)
+
+    def extend(self, items, user_id):
+        """
+        Flatten recently-played items straight into the columns. Items that cannot be
+        keyed (local files and podcasts come back without a track id) are dropped.
+        :return: number of plays added
+        """
+
+        # bound methods hoisted out of the per-play loop, which is this module's hot path
+        targets = [(self.columns[column].append, self.pools[column].codes.get, self.pools[column].code)
+                   for column in STRING_COLUMNS]
+        played_at, duration_ms, credits = self.played_at.append, self.duration_ms.append, self.credits.append
+        added = 0
+        for item in items:
+            track = item.get("track") or {}
+            album = track.get("album") or {}
+            if not track.get("id") or not item.get("played_at"):
+                continue
+            values = (user_id, track["id"], track.get("name"), album.get("id"), album.get("name"))
+            for (append, known, intern), value in zip(targets, values):
+                code = known(value)
+                append(intern(value) if code is None else code)
+            played_at(played_at_to_ms(item["played_at"]))
+            duration = track.get("duration_ms")
+            duration_ms(MISSING_DURATION if duration is None else duration)
+            credits(self._credit(track.get("artists")))
+            added += 1
+
+        if added < len(items):
+            logging.warning(f"Dropped {len(items) - added} records without track id or played_at.")
+        return added
+
+    def _credit(self, artists):
+        credit = tuple((artist.get("id"), artist.get("name")) for artist in artists or [])
+        code = self.credit_pool.code(credit)
+        if code == len(self.credit_main):
+            self.credit_main.append(self.pools["artist_name"].code(credit[0][1] if credit else None))
+        return code
+
+    def record(self, i):
+        """
+        Play i as a transform.flatten_play shaped record
+        """
+
+        record = {column: self.pools[column][self.columns[column][i]] for column in STRING_COLUMNS}
+        duration = self.duration_ms[i]
+        record["duration_ms"] = None if duration == MISSING_DURATION else duration
+        record["artists"] = self.credit_pool.values[self.credits[i]]
+        record["played_at"] = self.played_at[i]
+        return record
+
+    def __iter__(self):
+        return (self.record(i) for i in range(len(self)))
+
+    def _codes(self, column):
+        import numpy as np
+
+        if column == "artist_name":
+            return np.frombuffer(self.credit_main, np.int32)[np.frombuffer(self.credits, np.int32)]
+        return np.frombuffer(self.columns[column], np.int32)
+
+    def to_pandas(self, columns=None):
+        """
+        DataFrame over the batch. String columns become Categoricals on the interned
+        codes, played_at stays int64 epoch ms and duration_ms is int64 (float with NaN
+        when some are missing); numeric columns share the batch's memory where pandas allows.
+        :param columns: Subset/order of columns, default all plus artist_name and artists.
+        """
+
+        import numpy as np
+        import pandas as pd
+
+        columns = columns or [*STRING_COLUMNS, "artist_name", "played_at", "duration_ms", "artists"]
+        data = {}
+        for column in columns:
+            if column == "played_at":
+                data[column] = np.frombuffer(self.played_at, np.int64)
+            elif column == "duration_ms":
+                duration = np.frombuffer(self.duration_ms, np.int64)
+                missing = duration == MISSING_DURATION
+                data[column] = np.where(missing, np.nan, duration) if missing.any() else duration
+            elif column == "artists":
+                # one shared tuple per distinct credit: the column only holds references
+                credits = np.empty(len(self.credit_pool), object)
+                for code, credit in enumerate(self.credit_pool.values):
+                    credits[code] = credit
+                data[column] = credits[np.frombuffer(self.credits, np.int32)]
+            else:
+                dtype = pd.CategoricalDtype(self.pools[column].values)
+                data[column] = pd.Categorical.from_codes(self._codes(column), dtype=dtype, validate=False)
+        return pd.DataFrame(data, columns=columns, copy=False)
+
+    def to_arrow(self, columns=None):
+        """
+        Arrow table over the batch: string columns as dictionary arrays whose indices
+        buffer is the batch's own int32 codes, played_at/duration_ms as int64 (nulls for
+        missing durations). Artist credits are not included.
+        """
+
+        import numpy as np
+        import pyarrow as pa
+
+        columns = columns or [*STRING_COLUMNS, "artist_name", "played_at", "duration_ms"]
+        data = {}
+        for column in columns:
+            if column == "played_at":
+                data[column] = pa.array(np.frombuffer(self.played_at, np.int64))
+            elif column == "duration_ms":
+                duration = np.frombuffer(self.duration_ms, np.int64)
+                data[column] = pa.array(duration, mask=duration == MISSING_DURATION)
+            else:
+                codes = self._codes(column)
+                valid = codes >= 0
+                validity = None if valid.all() else pa.py_buffer(np.packbits(valid, bitorder="little"))
+                indices = pa.Array.from_buffers(pa.int32(), len(codes), [validity, pa.py_buffer(codes)])
+                data[column] = pa.DictionaryArray.from_arrays(indices, pa.array(self.pools[column].values, pa.string()))
+        return pa.table(data)
@@ -0,0 +1,288 @@
+import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from sqlalchemy import and_, func, select, tuple_
+
+from spotify_pipeline import config
+from spotify_pipeline.models.spotify_models import (
+    ArtistPlays, DailyPlays, DataVersion, HourlyPlays, ListeningSession, Play, PlaySketchBucket, Track, TrackPlays,
+)
+from spotify_pipeline.resources.staging import write_rows
+from spotify_pipeline.resources.transform import EPOCH, MS_PER_DAY
+
+
+SESSION_GAP_MS = config.SESSION_GAP_MINUTES * 60_000
+ROLLUP_MODELS = (DailyPlays, HourlyPlays, ArtistPlays, TrackPlays, ListeningSession, PlaySketchBucket)
+# data_versions row of the changes every user's views depend on
+ALL_USERS = ""
+
+
+def _increment(conn, insert, model, key_columns, counts):
+    """
+    Add counts to existing buckets (or create them) with one batched upsert
+    """
+
+    if not counts:
+        return
+    rows = [dict(zip(key_columns, key), play_count=n) for key, n in counts.items()]
+    stmt = insert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={"play_count": model.play_count + stmt.excluded.play_count},
+    )
+    write_rows(conn, stmt, rows, key=key_columns)
+
+
+def bump_data_versions(conn, insert, user_ids):
+    """
+    Count one more change for each user (ALL_USERS for changes visible to everyone),
+    invalidating their cached dashboard views once the transaction commits
+    """
+
+    if not user_ids:
+        return
+    stmt = insert(DataVersion)
+    stmt = stmt.on_conflict_do_update(index_elements=["user_id"], set_={"loads": DataVersion.loads + 1})
+    conn.execute(stmt, [{"user_id": user_id, "loads": 1} for user_id in sorted(set(user_ids))])
+
+
+def _refresh_sessions(conn, user_id, lo, hi, gap_ms):
+    """
+    Recompute the sessions touched by new plays in [lo, hi]: every stored session
+    within one gap of that window is merged into it, deleted and rebuilt from plays.
+    Stored sessions end when their last track finishes, so widening the window can
+    reach further sessions; it is widened until no new one overlaps.
+    """
+
+    def near(lo, hi):
+        return and_(
+            ListeningSession.user_id == user_id,
+            ListeningSession.ended_at >= lo - gap_ms,
+            ListeningSession.started_at <= hi + gap_ms,
+        )
+
+    while True:
+        bounds = conn.execute(
+            select(func.min(ListeningSession.started_at), func.max(ListeningSession.ended_at)).where(near(lo, hi))
+        ).one()
+        if bounds[0] is None or (bounds[0] >= lo and bounds[1] <= hi):
+            break
+        lo, hi = min(lo, bounds[0]), max(hi, bounds[1])
+    conn.execute(ListeningSession.__table__.delete().where(near(lo, hi)))
+
+    plays = conn.execute(
+        select(Play.played_at, Play.artist_id, Track.duration_ms)
+        .join(Track, Track.id == Play.track_id)
+        .where(Play.user_id == user_id, Play.played_at.between(lo, hi))
+    ).all()
+    if plays:
+        # NumPy/pandas only load once a load actually has new plays
+        from spotify_pipeline.resources.sessionize import sessionize
+
+        played_at, artist_ids, durations = zip(*plays)
+        sessions = sessionize(played_at, artists=artist_ids, durations=durations, gap_minutes=gap_ms / 60_000)
+        conn.execute(ListeningSession.__table__.insert(), sessions.assign(user_id=user_id).to_dict("records"))
+
+
+def _update_sketches(conn, insert, new_plays):
+    """
+    Fold new plays into the daily tallies and monthly sketches they fall into:
+    each touched sketch is read, updated and written back
+    """
+
+    # NumPy only loads once a load actually has new plays
+    from spotify_pipeline.resources.sketches import PlaySketch, PlayTally
+
+    albums = dict(conn.execute(
+        select(Track.id, Track.album_id).where(Track.id.in_({play["track_id"] for play in new_plays}))
+    ).all())
+    buckets = defaultdict(list)
+    for play in new_plays:
+        day = (EPOCH + timedelta(milliseconds=play["played_at"])).date()
+        play = {**play, "album_id": albums.get(play["track_id"])}
+        buckets[(play["user_id"], "day", day)].append(play)
+        buckets[(play["user_id"], "month", day.replace(day=1))].append(play)
+
+    key = tuple_(PlaySketchBucket.user_id, PlaySketchBucket.grain, PlaySketchBucket.day)
+    stored = {
+        (row.user_id, row.grain, row.day): row.data
+        for row in conn.execute(
+            select(PlaySketchBucket.user_id, PlaySketchBucket.grain, PlaySketchBucket.day, PlaySketchBucket.data)
+            .where(key.in_(list(buckets)))
+        )
+    }
+    rows = []
+    for bucket, plays in buckets.items():
+        user_id, grain, day = bucket
+        # a day holds few distinct ids, so exact counts are both smaller and cheaper to update
+        cls = PlayTally if grain == "day" else PlaySketch
+        sketch = cls.from_bytes(stored[bucket]) if bucket in stored else cls()
+        sketch.update(plays)
+        rows.append({"user_id": user_id, "grain": grain, "day": day, "play_count": sketch.plays,
+                     "data": sketch.to_bytes()})
+
+    key = ["user_id", "grain", "day"]
+    stmt = insert(PlaySketchBucket)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=key, set_={"play_count": stmt.excluded.play_count, "data": stmt.excluded.data},
+    )
+    write_rows(conn, stmt, rows, key=key)
+
+
+def apply_rollups(conn, insert, new_plays, gap_ms=SESSION_GAP_MS):
+    """
+    Fold newly inserted plays into the rollup tables inside the loader's transaction.
+    Only the buckets (and sessions) the batch falls into are touched.
+    :param new_plays: dicts with user_id, played_at (epoch ms), track_id and artist_id
+    """
+
+    daily, hourly, artists, tracks = Counter(), Counter(), Counter(), Counter()
+    windows = defaultdict(lambda: [None, None])
+
+    for play in new_plays:
+        user_id, played_at = play["user_id"], play["played_at"]
+        dt = EPOCH + timedelta(milliseconds=played_at)
+        daily[(user_id, dt.date())] += 1
+        hourly[(user_id, dt.weekday(), dt.hour)] += 1
+        tracks[(user_id, play["track_id"])] += 1
+        if play["artist_id"] is not None:
+            artists[(user_id, play["artist_id"])] += 1
+
+        window = windows[user_id]
+        window[0] = played_at if window[0] is None else min(window[0], played_at)
+        window[1] = played_at if window[1] is None else max(window[1], played_at)
+
+    _increment(conn, insert, DailyPlays, ("user_id", "day"), daily)
+    _increment(conn, insert, HourlyPlays, ("user_id", "weekday", "hour"), hourly)
+    _increment(conn, insert, ArtistPlays, ("user_id", "artist_id"), artists)
+    _increment(conn, insert, TrackPlays, ("user_id", "track_id"), tracks)
+
+    for user_id, (lo, hi) in windows.items():
+        _refresh_sessions(conn, user_id, lo, hi, gap_ms)
+
+    if config.PLAY_SKETCHES:
+        _update_sketches(conn, insert, new_plays)
+    bump_data_versions(conn, insert, windows)
+
+
+def _rebuild_sketch_months(conn, insert, removed):
+    """
+    Month sketches cannot subtract plays: drop the sketches and day tallies of every month
+    the removed plays fell into, and fold those months' remaining plays back in
+    """
+
+    months = {(play["user_id"], (EPOCH + timedelta(milliseconds=play["played_at"])).date().replace(day=1))
+              for play in removed}
+    remaining = []
+    for user_id, first in sorted(months):
+        last = (first + timedelta(days=31)).replace(day=1) - timedelta(days=1)
+        conn.execute(PlaySketchBucket.__table__.delete().where(
+            PlaySketchBucket.user_id == user_id, PlaySketchBucket.day.between(first, last)
+        ))
+        lo = (first - EPOCH.date()).days * MS_PER_DAY
+        hi = ((last - EPOCH.date()).days + 1) * MS_PER_DAY - 1
+        remaining += [dict(row._mapping) for row in conn.execute(
+            select(Play.user_id, Play.played_at, Play.track_id, Play.artist_id)
+            .where(Play.user_id == user_id, Play.played_at.between(lo, hi))
+        )]
+    if remaining:
+        _update_sketches(conn, insert, remaining)
+
+
+def retract_rollups(conn, insert, removed_plays, gap_ms=SESSION_GAP_MS):
+    """
+    Take plays already deleted from the plays table back out of the rollup tables, in the
+    same transaction (the archive offload), so rollups and plays keep describing the same
+    plays. Counters are decremented and emptied buckets removed; sessions and sketches
+    around the removed plays are rebuilt from the plays that remain.
+    :param removed_plays: dicts with user_id, played_at (epoch ms), track_id and artist_id
+    """
+
+    if not removed_plays:
+        return
+    daily, hourly, artists, tracks = Counter(), Counter(), Counter(), Counter()
+    windows = defaultdict(lambda: [None, None])
+
+    for play in removed_plays:
+        user_id, played_at = play["user_id"], play["played_at"]
+        dt = EPOCH + timedelta(milliseconds=played_at)
+        daily[(user_id, dt.date())] -= 1
+        hourly[(user_id, dt.weekday(), dt.hour)] -= 1
+        tracks[(user_id, play["track_id"])] -= 1
+        if play["artist_id"] is not None:
+            artists[(user_id, play["artist_id"])] -= 1
+
+        window = windows[user_id]
+        window[0] = played_at if window[0] is None else min(window[0], played_at)
+        window[1] = played_at if window[1] is None else max(window[1], played_at)
+
+    for model, key_columns, counts in ((DailyPlays, ("user_id", "day"), daily),
+                                       (HourlyPlays, ("user_id", "weekday", "hour"), hourly),
+                                       (ArtistPlays, ("user_id", "artist_id"), artists),
+                                       (TrackPlays, ("user_id", "track_id"), tracks)):
+        _increment(conn, insert, model, key_columns, counts)
+        conn.execute(model.__table__.delete().where(model.user_id.in_(list(windows)), model.play_count <= 0))
+
+    for user_id, (lo, hi) in windows.items():
+        _refresh_sessions(conn, user_id, lo, hi, gap_ms)
+
+    if config.PLAY_SKETCHES:
+        _rebuild_sketch_months(conn, insert, removed_plays)
+    bump_data_versions(conn, insert, windows)
+
+
+def _replay_plays(engine, apply, chunk_size):
+    """
+    Feed every stored play to apply(conn, plays) in keyset ordered chunks, one transaction each
+    :return: number of plays
+    """
+
+    key = tuple_(Play.user_id, Play.played_at, Play.track_id)
+    last, total = None, 0
+    while True:
+        query = select(Play.user_id, Play.played_at, Play.track_id, Play.artist_id).order_by(
+            Play.user_id, Play.played_at, Play.track_id
+        ).limit(chunk_size)
+        if last is not None:
+            query = query.where(key > tuple_(*last))
+
+        with engine.begin() as conn:
+            plays = [dict(row._mapping) for row in conn.execute(query)]
+            if not plays:
+                return total
+            apply(conn, plays)
+
+        last = (plays[-1]["user_id"], plays[-1]["played_at"], plays[-1]["track_id"])
+        total += len(plays)
+
+
+def rebuild_rollups(engine, chunk_size=50_000):
+    """
+    Recompute every rollup from the plays table (used after migrations or gap changes)
+    """
+
+    from spotify_pipeline.resources.bulk_loader import dialect_insert
+
+    insert = dialect_insert(engine)
+    with engine.begin() as conn:
+        for model in ROLLUP_MODELS:
+            conn.execute(model.__table__.delete())
+
+    total = _replay_plays(engine, lambda conn, plays: apply_rollups(conn, insert, plays), chunk_size)
+    logging.info(f"Rebuilt rollups from {total} plays.")
+
+
+def rebuild_sketches(engine, chunk_size=50_000):
+    """
+    Recompute only the play sketches from the plays table; the other rollups are left alone
+    """
+
+    from spotify_pipeline.resources.bulk_loader import dialect_insert
+
+    insert = dialect_insert(engine)
+    with engine.begin() as conn:
+        conn.execute(PlaySketchBucket.__table__.delete())
+        bump_data_versions(conn, insert, [ALL_USERS])
+    total = _replay_plays(engine, lambda conn, plays: _update_sketches(conn, insert, plays), chunk_size)
+    logging.info(f"Rebuilt play sketches from {total} plays.")
@@ -0,0 +1,364 @@
+import math
+import struct
+import zlib
+from collections import Counter
+
+import numpy as np
+
+
+# HyperLogLog: 2^12 one-byte registers, relative standard error 1.04 / sqrt(4096) ~ 1.6%
+HLL_PRECISION = 12
+# Count-Min: estimates exceed the true count by at most e / width of all plays (~0.13%),
+# except with probability e^-depth (~2%)
+CMS_WIDTH = 2048
+CMS_DEPTH = 4
+# Space-Saving: heavy hitter candidates kept per kind; any id with more than 1/TOP_K of the plays is among them
+TOP_K = 64
+KINDS = ("artist", "track", "album")
+# sketch keys pack the kind above the id
+ID_BITS = 40
+
+FORMAT_VERSION = 1
+# version, HLL precision, Count-Min depth and width, Space-Saving capacity, plays,
+# non-zero registers, non-zero Count-Min cells, then Space-Saving counters per kind
+HEADER = "<BBHHHQII" + "I" * len(KINDS)
+HEADER_SIZE = struct.calcsize(HEADER)
+
+
+def hash64(keys):
+    """
+    splitmix64 finalizer over integer ids; unlike hash() it is stable across processes and machines
+    """
+
+    # uint64 array arithmetic wraps around silently, as the mixer expects
+    x = np.asarray(keys, dtype=np.int64).astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _registers(hashes):
+    """
+    HyperLogLog: the register each hash falls into (its top HLL_PRECISION bits) and the
+    rank to keep there, one more than the leading zeros of the remaining bits
+    """
+
+    rest_bits = 64 - HLL_PRECISION
+    rest = hashes & np.uint64((1 << rest_bits) - 1)
+    # frexp's exponent is the bit length, exact here because rest < 2^53 fits a float64 mantissa
+    rank = rest_bits + 1 - np.frexp(rest.astype(np.float64))[1]
+    return (hashes >> np.uint64(rest_bits)).astype(np.int64), rank.astype(np.uint8)
+
+
+def _hll_estimate(registers):
+    m = len(registers)
+    estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        # linear counting is more accurate while many registers are still empty
+        estimate = m * math.log(m / zeros)
+    return estimate
+
+
+def _columns(hashes):
+    """
+    Count-Min: the column of each hash in every row, shape (CMS_DEPTH, len(hashes)).
+    One 64 bit hash split in two gives every row its own column (Kirsch-Mitzenmacher).
+    """
+
+    low = hashes & np.uint64(0xFFFFFFFF)
+    high = (hashes >> np.uint64(32)) | np.uint64(1)
+    rows = np.arange(CMS_DEPTH, dtype=np.uint64)[:, None]
+    return ((low[None, :] + rows * high[None, :]) % np.uint64(CMS_WIDTH)).astype(np.int64)
+
+
+class SpaceSaving:
+    """
+    Top-k heavy hitter candidates. Each counter holds [count, error]: the count may
+    overestimate the id's true frequency by at most error.
+    """
+
+    def __init__(self, capacity=TOP_K, counters=None):
+        self.capacity = capacity
+        self.counters = counters if counters is not None else {}
+
+    def _floor(self):
+        # what an id missing from a full summary may have been seen up to
+        return min(c[0] for c in self.counters.values()) if len(self.counters) >= self.capacity else 0
+
+    def update(self, counts):
+        """
+        Add a batch in one step: new ids start from the current floor, as if the batch were
+        a second, exact summary being merged in, then only the largest counters are kept.
+        :param counts: dict id -> occurrences in the batch
+        """
+
+        floor = self._floor()
+        for item, n in counts.items():
+            counter = self.counters.get(item)
+            if counter is not None:
+                counter[0] += n
+            else:
+                self.counters[item] = [floor + n, floor]
+        self._truncate()
+
+    def merge(self, other):
+        floor, other_floor = self._floor(), other._floor()
+        merged = {}
+        for item in self.counters.keys() | other.counters.keys():
+            a = self.counters.get(item, [floor, floor])
+            b = other.counters.get(item, [other_floor, other_floor])
+            merged[item] = [a[0] + b[0], a[1] + b[1]]
+        self.counters = merged
+        self._truncate()
+
+    def _truncate(self):
+        # every dropped id counts no more than the smallest kept one, so the floor still bounds it
+        if len(self.counters) > self.capacity:
+            keep = sorted(self.counters, key=lambda k: self.counters[k][0], reverse=True)[:self.capacity]
+            self.counters = {item: self.counters[item] for item in keep}
+
+
+class PlaySketch:
+    """
+    Mergeable summary of a set of plays: the exact play count and, for each kind
+    (artist, track, album), a HyperLogLog of distinct ids, a Count-Min sketch of
+    play counts (never below the true count) and Space-Saving heavy hitters.
+
+    The sketches of several users or days merge into the sketch of all their plays.
+    Ids are the database's surrogate keys, so only sketches of one database merge.
+    """
+
+    def __init__(self):
+        self.plays = 0
+        # one row per kind, in KINDS order, so every kind is updated in the same NumPy calls
+        self.registers = np.zeros((len(KINDS), 1 << HLL_PRECISION), np.uint8)
+        self.cells = np.zeros((len(KINDS), CMS_DEPTH, CMS_WIDTH), np.int64)
+        self.top = {kind: SpaceSaving() for kind in KINDS}
+
+    def update(self, plays):
+        """
+        Add plays to the sketch.
+        :param plays: dicts with track_id, artist_id and album_id (the latter two may be None)
+        :return: self
+        """
+
+        plays = list(plays)
+        self.plays += len(plays)
+        keys = [k << ID_BITS | play[column]
+                for k, column in enumerate(f"{kind}_id" for kind in KINDS)
+                for play in plays if play.get(column) is not None]
+        if not keys:
+            return self
+
+        keys, counts = np.unique(np.array(keys, np.int64), return_counts=True)
+        kinds, ids = keys >> ID_BITS, keys & ((1 << ID_BITS) - 1)
+        self._add(kinds, ids, counts)
+
+        # keys are sorted, so each kind's ids are one contiguous run
+        bounds = np.searchsorted(kinds, np.arange(1, len(KINDS)))
+        for kind, kind_ids, kind_counts in zip(KINDS, np.split(ids, bounds), np.split(counts, bounds)):
+            if len(kind_ids):
+                self.top[kind].update(dict(zip(kind_ids.tolist(), kind_counts.tolist())))
+        return self
+
+    def _add(self, kinds, ids, counts):
+        # HyperLogLog and Count-Min part of an update; each (kind, id) appears once
+        hashes = hash64(ids)
+        index, rank = _registers(hashes)
+        np.maximum.at(self.registers, (kinds, index), rank)
+        np.add.at(self.cells, (kinds, np.arange(CMS_DEPTH)[:, None], _columns(hashes)), counts)
+
+    def merge(self, other):
+        """
+        Fold another sketch into this one
+        :return: self
+        """
+
+        self.plays += other.plays
+        np.maximum(self.registers, other.registers, out=self.registers)
+        self.cells += other.cells
+        for kind in KINDS:
+            self.top[kind].merge(other.top[kind])
+        return self
+
+    def distinct_count(self, kind):
+        return int(round(_hll_estimate(self.registers[KINDS.index(kind)])))
+
+    def top_items(self, kind, n=10):
+        """
+        Most played ids of a kind, ranked by the lower of their Count-Min and Space-Saving counts
+        :return: list of (id, estimated plays), most played first
+        """
+
+        counters = self.top[kind].counters
+        if not counters:
+            return []
+        items = list(counters)
+        cells = self.cells[KINDS.index(kind)]
+        estimates = cells[np.arange(CMS_DEPTH)[:, None], _columns(hash64(items))].min(axis=0)
+        ranked = [(item, int(min(estimate, counters[item][0]))) for item, estimate in zip(items, estimates)]
+        return sorted(ranked, key=lambda pair: pair[1], reverse=True)[:n]
+
+    def error_bounds(self):
+        """
+        distinct_error: relative standard error of distinct counts;
+        count_error: plays a top-list count may overstate, with probability count_confidence
+        """
+
+        return {
+            "distinct_error": 1.04 / math.sqrt(1 << HLL_PRECISION),
+            "count_error": math.ceil(math.e / CMS_WIDTH * self.plays),
+            "count_confidence": 1 - math.exp(-CMS_DEPTH),
+        }
+
+    def to_bytes(self):
+        """
+        Compact binary form: only the non-zero registers and cells are stored,
+        so a day's sketch takes a few hundred bytes
+        """
+
+        registers, cells = self.registers.ravel(), self.cells.ravel()
+        register_index, cell_index = np.flatnonzero(registers), np.flatnonzero(cells)
+        top = [[item, *counter] for kind in KINDS for item, counter in self.top[kind].counters.items()]
+        return zlib.compress(b"".join([
+            struct.pack(HEADER, FORMAT_VERSION, HLL_PRECISION, CMS_DEPTH, CMS_WIDTH, TOP_K, self.plays,
+                        len(register_index), len(cell_index), *(len(self.top[kind].counters) for kind in KINDS)),
+            register_index.astype("<u2").tobytes(), registers[register_index].tobytes(),
+            cell_index.astype("<u4").tobytes(), cells[cell_index].astype("<u4").tobytes(),
+            np.array(top, "<i8").reshape(-1, 3).tobytes(),
+        ]), 1)
+
+    @classmethod
+    def from_bytes(cls, data):
+        plays, capacity, counters, register_index, register_values, cell_index, cell_values, top = _decode(data)
+        if not capacity:
+            return merge_sketches([data])
+        sketch = cls()
+        sketch.plays = plays
+        sketch.registers.ravel()[register_index] = register_values
+        sketch.cells.ravel()[cell_index] = cell_values
+        for kind, rows in zip(KINDS, np.split(top, np.cumsum(counters)[:-1])):
+            sketch.top[kind].counters = {item: [count, error] for item, count, error in rows.tolist()}
+        return sketch
+
+
+class PlayTally:
+    """
+    Exact per-id play counts of a small set of plays, e.g. one user's day. Stored in the
+    sketch format (as a top list without a capacity), so merge_sketches folds tallies and
+    sketches together. Much cheaper to keep up to date than a sketch, but its size grows
+    with the distinct ids, which a day of one user's listening keeps small.
+    """
+
+    def __init__(self):
+        self.plays = 0
+        self.counts = {kind: Counter() for kind in KINDS}
+
+    def update(self, plays):
+        """
+        :param plays: dicts with track_id, artist_id and album_id (the latter two may be None)
+        :return: self
+        """
+
+        plays = list(plays)
+        self.plays += len(plays)
+        for kind in KINDS:
+            column = f"{kind}_id"
+            self.counts[kind].update(play[column] for play in plays if play.get(column) is not None)
+        return self
+
+    def to_bytes(self):
+        rows = [[item, n, 0] for kind in KINDS for item, n in self.counts[kind].items()]
+        return zlib.compress(
+            struct.pack(HEADER, FORMAT_VERSION, HLL_PRECISION, CMS_DEPTH, CMS_WIDTH, 0, self.plays, 0, 0,
+                        *(len(self.counts[kind]) for kind in KINDS))
+            + np.array(rows, "<i8").reshape(-1, 3).tobytes(),
+            1,
+        )
+
+    @classmethod
+    def from_bytes(cls, data):
+        plays, capacity, counters, *_, top = _decode(data)
+        if capacity:
+            raise ValueError("Not a tally: sketches cannot be turned back into exact counts")
+        tally = cls()
+        tally.plays = plays
+        for kind, rows in zip(KINDS, np.split(top, np.cumsum(counters)[:-1])):
+            tally.counts[kind] = Counter(dict(rows[:, :2].tolist()))
+        return tally
+
+
+def _decode(data):
+    """
+    Serialized sketch or tally -> (plays, capacity (0 for a tally), per kind counter counts,
+    register index, register values, cell index, cell values, (id, count, error) rows),
+    indexes running over all kinds
+    """
+
+    raw = zlib.decompress(data)
+    version, precision, depth, width, capacity, plays, registers, cells, *counters = struct.unpack_from(HEADER, raw)
+    if (version, precision, depth, width) != (FORMAT_VERSION, HLL_PRECISION, CMS_DEPTH, CMS_WIDTH) \
+            or capacity not in (0, TOP_K):
+        raise ValueError(f"Unsupported sketch format (version {version}, precision {precision}, "
+                         f"{depth}x{width} Count-Min, top {capacity})")
+
+    offset = HEADER_SIZE
+    arrays = []
+    for dtype, n in (("<u2", registers), ("u1", registers), ("<u4", cells), ("<u4", cells),
+                     ("<i8", 3 * sum(counters))):
+        arrays.append(np.frombuffer(raw, dtype, n, offset))
+        offset += np.dtype(dtype).itemsize * n
+    return (plays, capacity, counters, *arrays[:4], arrays[4].reshape(-1, 3))
+
+
+def merge_sketches(blobs):
+    """
+    One PlaySketch from serialized sketches and tallies, e.g. the play_sketches rows covering a date range.
+
+    All inputs are merged in one vectorized pass, which is also a little more accurate for
+    the heavy hitters than merging pairwise: the candidate lists are only cut to TOP_K once.
+    """
+
+    merged = PlaySketch()
+    decoded = [_decode(blob) for blob in blobs]
+    if not decoded:
+        return merged
+
+    plays, capacities, counters, register_index, register_values, cell_index, cell_values, top = zip(*decoded)
+    merged.plays = sum(plays)
+
+    np.maximum.at(merged.registers.reshape(-1), np.concatenate(register_index).astype(np.int64),
+                  np.concatenate(register_values))
+    merged.cells += np.bincount(
+        np.concatenate(cell_index).astype(np.int64), np.concatenate(cell_values).astype(np.float64), merged.cells.size
+    ).astype(np.int64).reshape(merged.cells.shape)
+
+    # Space-Saving merge: an id missing from a full summary may have had up to that
+    # summary's smallest count, so each id is charged the floor of every summary it is missing from
+    sizes = np.array(counters, np.int64).ravel()  # one group per (input, kind)
+    group = np.repeat(np.arange(len(sizes)), sizes)
+    top = np.concatenate(top)
+    exact = np.repeat(np.array(capacities) == 0, len(KINDS))
+    floors = np.full(len(sizes), np.iinfo(np.int64).max)
+    np.minimum.at(floors, group, top[:, 1])
+    floors = np.where((sizes >= TOP_K) & ~exact, floors, 0)
+
+    # tallies only hold ids and counts: hash them into the HyperLogLog and Count-Min tables here
+    tallied = exact[group]
+    if tallied.any():
+        keys, inverse = np.unique((group[tallied] % len(KINDS)) << ID_BITS | top[tallied, 0], return_inverse=True)
+        counts = np.bincount(inverse, top[tallied, 1].astype(np.float64), len(keys)).astype(np.int64)
+        merged._add(keys >> ID_BITS, keys & ((1 << ID_BITS) - 1), counts)
+    for k, kind in enumerate(KINDS):
+        rows = group % len(KINDS) == k
+        ids, inverse = np.unique(top[rows, 0], return_inverse=True)
+        row_floors = floors[group[rows]]
+        excess = np.bincount(inverse, (top[rows, 1] - row_floors).astype(np.float64), len(ids))
+        error_excess = np.bincount(inverse, (top[rows, 2] - row_floors).astype(np.float64), len(ids))
+        total_floor = int(floors[k::len(KINDS)].sum())
+        merged.top[kind].counters = {
+            int(ids[i]): [total_floor + int(excess[i]), total_floor + int(error_excess[i])]
+            for i in np.argsort(-excess, kind="stable")[:TOP_K]
+        }
+    return merged
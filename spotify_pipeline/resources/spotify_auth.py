@@ -1,8 +1,11 @@
 import os
-import requests
+import time
 import webbrowser
 import logging
-from dotenv import load_dotenv, set_key
+from dotenv import load_dotenv
+from spotify_pipeline.resources.http_client import get_client
+from spotify_pipeline.resources.metrics import timed
+from spotify_pipeline.resources.token_store import TokenStore
 
 
 load_dotenv()
@@ -13,34 +16,96 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s  - %
 class SpotifyAuth:
     AUTH_URL = "https://accounts.spotify.com/api/token"
     AUTH_REDIRECT_URI = "http://localhost:8888/callback"
-    ENV_FILE = ".env"
 
-    def __init__(self):
-        self.client_id = os.getenv("SPOTIFY_CLIENT_ID")
-        self.client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
-        self.access_token = os.getenv("SPOTIFY_ACCESS_TOKEN")
-        self.refresh_token = os.getenv("SPOTIFY_REFRESH_TOKEN")
+    # refresh this many seconds before the token actually expires
+    EXPIRY_MARGIN = int(os.getenv("SPOTIFY_TOKEN_EXPIRY_MARGIN", "120"))
 
-        #check if token has expired (returns None)
-        if not self.access_token or not self.is_token_valid():
-            logging.info("Access token expired. Refreshing token...")
-            self.access_token = self.refresh_access_token()
+    def __init__(self, user_id=None, token_store=None, client_id=None, client_secret=None, refresh_token=None):
+        """
+        Credentials default to the .env values; pass them explicitly to authenticate
+        another user (e.g. from the multi-user registry).
+        """
+        self.client_id = client_id or os.getenv("SPOTIFY_CLIENT_ID")
+        self.client_secret = client_secret or os.getenv("SPOTIFY_CLIENT_SECRET")
+        self.user_id = user_id or os.getenv("SPOTIFY_USER_ID", "default")
+        self.token_store = token_store or TokenStore()
+
+        # no network call here: token state comes from the cache, or .env on first run
+        self.access_token = None if refresh_token else os.getenv("SPOTIFY_ACCESS_TOKEN")
+        self.refresh_token = refresh_token or os.getenv("SPOTIFY_REFRESH_TOKEN")
+        # an explicit token (registry, Dagster) is the grant the cached entry must descend from
+        self.granted_refresh_token = refresh_token
+        self.expires_at = None
+        self._load_cached_token()
+
+
+    def _load_cached_token(self):
+        """
+        Take the token state from the cache, unless it was issued under another grant than
+        the refresh token passed in: after the user re-authorizes and the registry is updated,
+        the cached (possibly revoked) tokens are ignored and the next save replaces them.
+        """
+        state = self.token_store.load(self.user_id)
+        if state and self.granted_refresh_token:
+            granted = state.get("granted_refresh_token", state.get("refresh_token"))
+            if granted != self.granted_refresh_token:
+                logging.info(f"Ignoring cached token of user '{self.user_id}': issued for another refresh token.")
+                state = None
+        if state:
+            self.access_token = state["access_token"]
+            self.refresh_token = state.get("refresh_token") or self.refresh_token
+            self.expires_at = state.get("expires_at")
 
     
     def is_token_valid(self):
 
         """
-        checks if the current access token is valid 
+        checks locally if the current access token is still valid for at least EXPIRY_MARGIN seconds.
+        A token with unknown expiry (e.g. only seeded from .env) is treated as expired.
         """
 
-        test_url = "https://api.spotify.com/v1/me"
-        headers = {"Authorization": f"Bearer {self.access_token}"}
-        response = requests.get(test_url, headers= headers)
-
-        if response.status_code == 401:
-            logging.warning("Access token is expired.")
+        if not self.access_token or self.expires_at is None:
             return False
-        return True
+        return time.time() < self.expires_at - self.EXPIRY_MARGIN
+
+
+    def get_access_token(self):
+
+        """
+        Return a valid access token, refreshing it proactively shortly before expiry.
+        Concurrent callers for the same user share one refresh.
+        """
+
+        if self.is_token_valid():
+            return self.access_token
+
+        with self.token_store.lock(self.user_id):
+            # another thread/instance may have refreshed while we waited
+            self._load_cached_token()
+            if not self.is_token_valid():
+                logging.info("Access token expired or about to expire. Refreshing token...")
+                return self.refresh_access_token()
+        return self.access_token
+
+
+    def _store_token(self, response_data):
+
+        """
+        Record the token response with its issue time and expiry in the token cache
+        """
+
+        issued_at = time.time()
+        self.access_token = response_data["access_token"]
+        self.refresh_token = response_data.get("refresh_token") or self.refresh_token
+        self.expires_at = issued_at + int(response_data.get("expires_in", 3600))
+        self.token_store.save(self.user_id, {
+            "access_token": self.access_token,
+            "refresh_token": self.refresh_token,
+            # kept when Spotify rotates the refresh token, so the entry still matches its grant
+            "granted_refresh_token": self.granted_refresh_token or self.refresh_token,
+            "issued_at": issued_at,
+            "expires_at": self.expires_at,
+        })
 
         
 
@@ -59,13 +124,14 @@ class SpotifyAuth:
         )
         return auth_url
     
+    @timed("auth_code_exchange")
     def request_user_token(self, auth_code):
 
         """
         Exchange auth code for access token
         """
 
-        response = requests.post(
+        response = get_client().post(
             self.AUTH_URL,
             data={
                 "grant_type": "authorization_code",
@@ -77,12 +143,9 @@ class SpotifyAuth:
         )
         response_data = response.json()
         if response.status_code == 200:
-            self.access_token = response_data["access_token"]
-            self.refresh_token = response_data["refresh_token"]
-
-            #store token in .env file
-            set_key(self.ENV_FILE, "SPOTIFY_ACCESS_TOKEN", self.access_token)
-            set_key(self.ENV_FILE, "SPOTIFY_REFRESH_TOKEN", self.refresh_token)
+            # a new authorization starts a new grant; store token in the token cache
+            self.granted_refresh_token = response_data.get("refresh_token")
+            self._store_token(response_data)
 
 
             return self.access_token
@@ -93,6 +156,7 @@ class SpotifyAuth:
         
 
 
+    @timed("auth_refresh")
     def refresh_access_token(self):
         """
         Refresh the access token once expired
@@ -104,7 +168,7 @@ class SpotifyAuth:
         
 
 
-        response = requests.post(
+        response = get_client().post(
             self.AUTH_URL,
             data={
                 "grant_type": "refresh_token",
@@ -120,8 +184,7 @@ class SpotifyAuth:
         response_data = response.json()
 
         if response.status_code == 200:
-            self.access_token = response_data["access_token"]
-            set_key(self.ENV_FILE, "SPOTIFY_ACCESS_TOKEN", self.access_token)
+            self._store_token(response_data)
             logging.info("Spotify access token refreshed successfully")
             return self.access_token
         
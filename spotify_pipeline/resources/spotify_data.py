@@ -1,9 +1,18 @@
 import requests
 import os
 from spotify_pipeline.resources.spotify_auth import SpotifyAuth
-from spotify_pipeline.models.spotify_models import SessionLocal, Track
+from spotify_pipeline.resources.http_client import get_client
+from spotify_pipeline.models.spotify_models import init_db
+from spotify_pipeline.resources.bulk_loader import DEFAULT_CHUNK_SIZE, LoadResult, upsert_plays
+from spotify_pipeline.resources.watermark import WatermarkStore
+from spotify_pipeline.resources.play_store import PlayBatch
+from spotify_pipeline.resources.transform import played_at_to_ms
+from spotify_pipeline.resources.metrics import increment, timed
+from spotify_pipeline import config
 import logging
-import pandas as pd
+
+# pandas, NumPy and pyarrow are imported where they are used, so a fetch with nothing new
+# (the usual cron run) never loads them
 
 
 # set up logging config
@@ -13,55 +22,146 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s  - %
 class SpotifyData:
     BASE_URL = "https://api.spotify.com/v1/me/player/recently-played"
 
-    def __init__(self):
+    DATAFRAME_COLUMNS = [
+        "track_id", "track_name", "artist_name", "album_name", "played_at",
+        "user_id", "album_id", "duration_ms", "artists",
+    ]
+
+    def __init__(self, user_id=None, auth=None):
         """initialise with authentication"""
-        self.auth = SpotifyAuth()
+        self.user_id = user_id or (auth.user_id if auth else os.getenv("SPOTIFY_USER_ID", "default"))
+        self.auth = auth or SpotifyAuth(user_id=self.user_id)
         self.access_token = self.auth.access_token
+        self.engine = init_db()
+        self.watermarks = WatermarkStore(self.engine)
+        # False while the last fetch left a gap above the watermark (error or max_tracks)
+        self.fetch_complete = True
+        self.quality_metrics = None
+        # every fetched page is kept as-is so the transform can be replayed without the API
+        self.landing = None
+        if config.LANDING_DIR:
+            from spotify_pipeline.resources.landing import LandingZone
+            self.landing = LandingZone()
+        # newly inserted plays are also appended to the Parquet archive when one is configured
+        self.archive = None
+        if config.ARCHIVE_DIR:
+            from spotify_pipeline.resources.archive import PlayArchive
+            self.archive = PlayArchive()
+        # track/artist/album metadata for newly inserted plays, resolved through the batch endpoints
+        self.enricher = None
+        if config.ENRICH_METADATA:
+            from spotify_pipeline.resources.enrichment import MetadataEnricher
+            self.enricher = MetadataEnricher(self.engine, self.auth)
+
+
+    def _on_inserted(self, records):
+        """
+        Runs after every committed load chunk with the plays it inserted
+        """
+
+        if self.archive:
+            with timed("archive_write"):
+                self.archive.write(records)
+        if self.enricher:
+            with timed("enrich"):
+                self.enricher.enrich(records)
+
+
+    def _upsert(self, records, chunk_size, on_conflict):
+        """
+        upsert_plays with the db_write stage timing the database work only: the archive
+        and enrichment steps run after each chunk commits and are timed as their own stages
+        """
+
+        with timed("db_write") as timer:
+            def on_inserted(new_records):
+                with timer.paused():
+                    self._on_inserted(new_records)
+
+            return upsert_plays(records, self.engine, chunk_size=chunk_size, on_conflict=on_conflict,
+                                on_inserted=on_inserted)
 
 
-    def get_recently_played(self, limit=50, max_tracks=10000):
+    def iter_recently_played_pages(self, limit=50, max_tracks=10000, incremental=True):
         """
-        :param limit: Number of tracks to fetch
-        :return: JSON response containing track data
+        Walk the recently played history backwards with the `before` cursor,
+        yielding one page of raw items at a time (newest first).
+        In incremental mode only plays newer than the stored watermark are
+        yielded and pagination stops at the first page that overlaps it.
+        self.fetch_complete tells whether the walk reached the watermark or the end.
+        :param limit: Number of tracks to fetch per page
+        :param max_tracks: Upper bound on tracks fetched in one run
+        :param incremental: Stop at the user's watermark instead of re-pulling everything
         """
-        
-        all_tracks = []
 
-        if not self.auth.is_token_valid():
-            logging.info("Refreshing expired token before fetching tracks....")
-            self.access_token = self.auth.refresh_access_token
+        fetched = 0
+        self.fetch_complete = False
 
+        # decided locally from the cached expiry, refreshes only when needed
+        self.access_token = self.auth.get_access_token()
+        if not self.access_token:
+            logging.error("No valid access token available. Please re-authenticate")
+            return
+
+        watermark_ms = self.watermarks.get(self.user_id) if incremental else None
+        if watermark_ms is not None:
+            logging.info(f"Fetching plays newer than watermark {watermark_ms} for user '{self.user_id}'.")
 
-        headers = {"Authorization": f"Bearer {self.access_token}"}
         params = {"limit": limit}
-        next_url = self.BASE_URL
 
         logging.info("Fetching recently played tracks with pagination....")
 
-        while next_url and len(all_tracks) < max_tracks:
+        while fetched < max_tracks:
             try:
-                response = requests.get(self.BASE_URL, headers=headers, params=params)
+                # cheap local check, so long backfills refresh proactively mid-run
+                self.access_token = self.auth.get_access_token() or self.access_token
+                headers = {"Authorization": f"Bearer {self.access_token}"}
+                with timed("fetch_page"):
+                    response = get_client().get(self.BASE_URL, headers=headers, params=params)
+                    data = response.json() if response.status_code == 200 else None
 
                 if response.status_code == 200:
-                    data = response.json()
                     fetched_tracks = data["items"]
-                    all_tracks.extend(fetched_tracks)
-
-
-                    logging.info(f"Fetched {len(fetched_tracks)} tracks. Total so far: {len(all_tracks)}.")
-
-                    next_url = data.get("next")
+                    increment("pages_fetched")
+                    increment("plays_fetched", len(fetched_tracks))
+                    new_tracks = [
+                        track for track in fetched_tracks
+                        if watermark_ms is None or played_at_to_ms(track["played_at"]) > watermark_ms
+                    ]
+                    reached_watermark = len(new_tracks) < len(fetched_tracks)
+                    if len(new_tracks) > max_tracks - fetched:
+                        new_tracks = new_tracks[:max_tracks - fetched]
+                        reached_watermark = False
+                    fetched += len(new_tracks)
+                    # land only what this run loads: the page overlapping the watermark was landed before
+                    if self.landing:
+                        self.landing.write_page(self.user_id, new_tracks)
+
+                    logging.info(f"Fetched {len(new_tracks)} new tracks. Total so far: {fetched}.")
+
+                    if new_tracks:
+                        yield new_tracks
+
+                    if reached_watermark:
+                        logging.info("Reached the stored watermark. Stopping Pagination")
+                        self.fetch_complete = True
+                        break
 
-                    #stop fetching after 10000 tracks
+                    #stop fetching after max_tracks tracks
 
-                    if len(all_tracks) >= max_tracks:
+                    if fetched >= max_tracks:
                         logging.info("Reached track limit. Stopping Pagination")
                         break
 
-                    #next_url = data.get("next")
+                    # page backwards from the oldest play of this page
+                    before = (data.get("cursors") or {}).get("before")
 
-                    if not next_url:
+                    if not data.get("next") or not before:
                         logging.info("No more pages to fetch. Pagination complete")
+                        self.fetch_complete = True
+                        break
+
+                    params = {"limit": limit, "before": before}
 
                 else:
                     logging.error(f"Error fetching data: {response.status_code} - {response.text}")
@@ -72,116 +172,189 @@ class SpotifyData:
                 logging.error(f"Request failed: {e}")
                 break
 
-        logging.info(f"Finished fetching tracks. Total retrieved: {len(all_tracks)}.")
+        logging.info(f"Finished fetching tracks. Total retrieved: {fetched}.")
+
+
+    def fetch_window(self, start_ms, end_ms, limit=50):
+        """
+        Fetch the raw play items with start_ms <= played_at < end_ms, paging backwards
+        from end_ms with the `before` cursor. Spotify only keeps the most recent plays,
+        so windows further back come back partial or empty.
+        self.fetch_complete is False when a request failed part way.
+        :return: list of raw items, newest first
+        """
+
+        items = []
+        self.fetch_complete = False
+        params = {"limit": limit, "before": end_ms}
+
+        while True:
+            self.access_token = self.auth.get_access_token() or self.access_token
+            if not self.access_token:
+                logging.error("No valid access token available. Please re-authenticate")
+                return items
+
+            headers = {"Authorization": f"Bearer {self.access_token}"}
+            try:
+                with timed("fetch_page"):
+                    response = get_client().get(self.BASE_URL, headers=headers, params=params)
+                    data = response.json() if response.status_code == 200 else None
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Request failed: {e}")
+                return items
+            if response.status_code != 200:
+                logging.error(f"Error fetching data: {response.status_code} - {response.text}")
+                return items
+
+            page = data["items"]
+            increment("pages_fetched")
+            increment("plays_fetched", len(page))
+            in_window = [item for item in page if played_at_to_ms(item["played_at"]) >= start_ms]
+            # the last page reaches into the previous window, whose run lands those plays
+            if self.landing:
+                self.landing.write_page(self.user_id, in_window)
+            items += in_window
+
+            before = (data.get("cursors") or {}).get("before")
+            if not page or not data.get("next") or not before or int(before) < start_ms:
+                break
+            params = {"limit": limit, "before": before}
+
+        self.fetch_complete = True
+        logging.info(f"Fetched {len(items)} plays between {start_ms} and {end_ms} for user '{self.user_id}'.")
+        return items
+
+
+    def get_recently_played(self, limit=50, max_tracks=10000, incremental=True):
+        """
+        Fetch the whole history in memory and return it as a DataFrame.
+        Kept for compatibility; stream_to_db loads page by page instead.
+        :return: DataFrame containing track data
+        """
+
+        # each page is interned into the batch as it arrives, so raw pages never pile up
+        batch = PlayBatch()
+        for page in self.iter_recently_played_pages(limit, max_tracks, incremental):
+            batch.extend(page, self.user_id)
 
         # convert to data_frame
 
-        df = self.store_tracks_in_dataframe(all_tracks)
+        df = self.store_tracks_in_dataframe(batch)
         return df
 
 
-
-    def store_tracks_in_dataframe(self, tracks):
+    def stream_to_db(self, limit=50, max_tracks=10000, incremental=True,
+                     chunk_size=DEFAULT_CHUNK_SIZE, on_conflict="nothing", dq_level=None):
         """
-        convert fetched tracks into a pandas dataframe
+        Streaming pipeline: fetch a page -> flatten to compact records -> validate -> write -> drop it.
+        Memory stays at one page regardless of history size and rows land as soon as each page arrives.
+        The data-quality checks run on every page and are saved as one metrics row for the run.
+        :param dq_level: data-quality level ("off", "counts", "full"), defaults to SPOTIFY_DQ_LEVEL
+        :return: LoadResult with inserted/updated/skipped counts
         """
 
-        if not tracks:
-            logging.warning("No tracks available to store in Dataframe.")
-            return pd.DataFrame()
-        
-        # convert track data into a structured data
+        from spotify_pipeline.resources.data_quality import StreamProfile, save_metrics
 
-        track_data = [
-            {
-                "track_id": track["track"]["id"],
-                "track_name": track["track"]["name"],
-                "artist_name": track["track"]["artists"][0]["name"],
-                "album_name": track["track"]["album"]["name"],
-                "played_at": track["played_at"]
+        result = LoadResult()
+        newest_played_at = None
+        profile = StreamProfile(dq_level)
 
-            }
-            for track in tracks
-        ]
+        for page in self.iter_recently_played_pages(limit, max_tracks, incremental):
+            with timed("transform"):
+                batch = PlayBatch.from_items(page, self.user_id)
+                profile.update(batch)
+            if not len(batch):
+                continue
+            result += self._upsert(batch, chunk_size, on_conflict)
 
-        df = pd.DataFrame(track_data)
+            # pages arrive newest first, so the first page seen holds the newest play
+            if newest_played_at is None:
+                newest_played_at = max(batch.played_at)
 
-        logging.info(f"Total records fetched: {len(df)}")
+        logging.info(f" {result.inserted} new tracks saved to database for user '{self.user_id}'.")
 
-        # Check for missing values
-        missing_values = df.isnull().sum().sum()
-        if missing_values > 0:
-            logging.warning(f"Missing value found: {missing_values}")
+        self.quality_metrics = profile.metrics()
+        if self.quality_metrics:
+            save_metrics(self.quality_metrics, self.engine, self.user_id)
 
-        # Check for duplicates on track_id + played_at
-        duplicate_count= df.duplicated(subset=["track_id", "played_at"]).sum()
-        if duplicate_count > 0:
-            logging.warning(f"Duplicate records found: {duplicate_count}")
+        if newest_played_at is not None:
+            if self.fetch_complete:
+                self.watermarks.advance(self.user_id, newest_played_at)
+            else:
+                logging.warning(f"Fetch for user '{self.user_id}' was incomplete; watermark not advanced.")
+        return result
 
-        # Display summary stats
-        logging.info(f"Unique tracks: {df['track_id'].nunique()}")
-        logging.info(f"Top 5 artists:\n{df['artist_name'].value_counts().head()}")
 
-        # Show first 5 records
-        logging.info(f"Displaying first 5 records:\n{df.head()}")
+
+    @timed("transform")
+    def store_tracks_in_dataframe(self, tracks, dq_level=None):
+        """
+        convert fetched tracks into a pandas dataframe: string columns are Categoricals over
+        the PlayBatch's interned strings, played_at is epoch ms and "artists" holds every
+        credited (spotify_id, name) pair, main artist first
+        :param tracks: raw recently-played items, or a PlayBatch already holding them
+        :param dq_level: data-quality level ("off", "counts", "full"), defaults to SPOTIFY_DQ_LEVEL
+        """
+
+        import pandas as pd
+        from spotify_pipeline.resources.data_quality import profile_tracks, save_metrics
+
+        batch = tracks if isinstance(tracks, PlayBatch) else PlayBatch.from_items(tracks or [], self.user_id)
+        if not len(batch):
+            logging.warning("No tracks available to store in Dataframe.")
+            return pd.DataFrame()
+
+        df = batch.to_pandas(self.DATAFRAME_COLUMNS)
+
+        logging.info(f"Total records fetched: {len(df)}")
+
+        # missing values, duplicate keys and (at "full") summary stats, kept as a metrics row
+        self.quality_metrics = profile_tracks(df, level=dq_level)
+        if self.quality_metrics:
+            save_metrics(self.quality_metrics, self.engine, self.user_id)
 
         return df
 
 
-    # def get_audio_features(self, track_id):
-    #     """
-    #     Fetch audio features of the tacks such as energy, dancability etc
-    #     """
-
-    #     url = f"https://api.spotify.com/v1/audio-features/{track_id}"
-    #     headers = {"Authorization": f"Bearer {self.access_token}"}
-
-    #     response = requests.get(url, headers=headers)
-
-    #     if response.status_code == 200:
-    #         return response.json()
-        
-    #     else:
-    #         logging.error(f"Error fetching audio features for {track_id}: {response.status_code}")
-            
-    #         return None
-        
-    def save_track_data(self, df):
-        """
-        saves tracks into database
-        """
-
-        session = SessionLocal()
-
-        for _, row in df.iterrows():
-            track_obj = Track(
-                id=row["track_id"],
-                name=row["track_name"],
-                artist=row["artist_name"],
-                album=row["album_name"],
-                played_at=row["played_at"]
-            )
-            session.merge(track_obj)   #avoids duplicates
-        session.commit
-        session.close()
-        logging.info(f" {len(df)} tracks saved to database.")
-
-
-    # def save_audio_features(self, track_id, features):
-    #     """
-    #     save audio features into database
-    #     """
-
-    #     session = SessionLocal()
-    #     feature_obj = AudioFeature(
-    #         track_id=track_id,
-    #         danceability=features["danceability"],
-    #         energy=features["energy"],
-    #         valence=features["valence"],
-    #         tempo=features["tempo"]
-
-    #     )
-    #     session.merge(feature_obj)
-    #     session.commit()
-    #     session.close()
-    #     logging.info(f" Audio features saved for track {track_id}.")
\ No newline at end of file
+    def save_track_data(self, df, chunk_size=DEFAULT_CHUNK_SIZE, on_conflict="nothing"):
+        """
+        saves tracks into database with a batched upsert
+        :param df: DataFrame of plays, or a PlayBatch (records are then decoded one chunk at a time)
+        :param chunk_size: Number of rows written per transaction
+        :param on_conflict: "nothing" keeps existing rows, "update" refreshes changed track/artist/album names
+        :return: LoadResult with inserted/updated/skipped counts
+        """
+
+        if not len(df):
+            logging.warning("No tracks to save.")
+            return LoadResult()
+
+        if isinstance(df, PlayBatch):
+            records, newest_played_at = df, max(df.played_at)
+        else:
+            records, newest_played_at = df.to_dict("records"), max(df["played_at"], key=played_at_to_ms)
+            for record in records:
+                record.setdefault("user_id", self.user_id)
+                record.setdefault("album_id", None)
+                record.setdefault("duration_ms", None)
+                # missing durations come back as NaN from float columns
+                if record["duration_ms"] != record["duration_ms"]:
+                    record["duration_ms"] = None
+                # frames built elsewhere may only carry the main artist's name
+                if not isinstance(record.get("artists"), (list, tuple)):
+                    record["artists"] = [(None, record.get("artist_name"))]
+
+        result = self._upsert(records, chunk_size, on_conflict)
+        logging.info(f" {result.inserted} new tracks saved to database for user '{self.user_id}'.")
+
+        self.quality_metrics = profile.metrics()
+        if self.quality_metrics:
+            save_metrics(self.quality_metrics, self.engine, self.user_id)
+
+        # only advance once the rows are committed, and never past a gap left by a partial fetch
+        if self.fetch_complete:
+            self.watermarks.advance(self.user_id, newest_played_at)
+        else:
+            logging.warning(f"Fetch for user '{self.user_id}' was incomplete; watermark not advanced.")
+        return result
+
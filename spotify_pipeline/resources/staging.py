@@ -0,0 +1,79 @@
+import io
+from datetime import date
+
+from sqlalchemy import column, select, table, text
+
+
+# COPY text format: backslash escapes for the column/row separators, \N for NULL
+_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def copy_supported(conn):
+    """
+    COPY FROM STDIN staging is used on Postgres through psycopg2 (the driver in requirements.txt)
+    """
+
+    return conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2"
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, str):
+        return value.translate(_ESCAPES)
+    if isinstance(value, bytes):
+        return "\\\\x" + value.hex()
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+# the common types skip the isinstance chain: this runs once per staged value
+_COPY_FORMATS = {int: str, str: lambda value: value.translate(_ESCAPES), type(None): lambda value: "\\N"}
+
+
+def _copy_line(row, columns):
+    return "\t".join((_COPY_FORMATS.get(type(row[c])) or _copy_value)(row[c]) for c in columns)
+
+
+def write_rows(conn, stmt, rows, key):
+    """
+    Execute an INSERT (with its ON CONFLICT and RETURNING clauses) for many rows.
+
+    SQLAlchemy sends ON CONFLICT inserts with executemany, one round trip per row on
+    Postgres. There the rows are instead COPYed into a temporary staging table shaped
+    like the target's columns, and merged with one INSERT ... SELECT carrying the same
+    ON CONFLICT clause, ordered by the conflict key: concurrent merges then lock the rows
+    they share in the same order. Elsewhere (SQLite) this is conn.execute(stmt, rows).
+    :param stmt: Insert on one table, optionally with on_conflict_do_*() and returning().
+    :param rows: List of dicts with the same keys.
+    :param key: Columns of the conflict target (the index_elements of on_conflict_do_*()).
+    :return: The rows RETURNING produced (only the rows actually written), else an empty list.
+    """
+
+    if not rows:
+        return []
+    if not copy_supported(conn):
+        result = conn.execute(stmt, rows)
+        return result.all() if result.returns_rows else []
+
+    target = stmt.table.name
+    columns = list(rows[0])
+    staging = f"staging_{target}"
+    names = ", ".join(columns)
+    # dropped at commit; recreated when one transaction stages the same table twice
+    conn.execute(text(
+        f"DROP TABLE IF EXISTS pg_temp.{staging}; "
+        f"CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS SELECT {names} FROM {target} WITH NO DATA"
+    ))
+
+    buffer = io.StringIO("".join(_copy_line(row, columns) + "\n" for row in rows))
+    with conn.connection.dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {staging} ({names}) FROM STDIN", buffer)
+
+    source = table(staging, *[column(c) for c in columns])
+    merge = stmt.from_select(columns, select(source).order_by(*[source.c[c] for c in key]))
+    result = conn.execute(merge)
+    return result.all() if result.returns_rows else []
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: the locks only cover the threads of one process
+    fcntl = None
+
+
+class FileLock:
+    """
+    Lock held by one thread of one process at a time: a thread lock plus an exclusive
+    flock on a lock file, so other processes (a cron fetch, a Dagster run) wait too.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        try:
+            self._file = open(self.path, "a")
+            if fcntl:
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+        except BaseException:
+            if self._file:
+                self._file.close()
+            self._thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self._file.close()  # closing the file releases the flock
+        finally:
+            self._file = None
+            self._thread_lock.release()
+        return False
+
+
+class TokenStore:
+    """
+    In-process and on-disk cache of OAuth token state, keyed by user.
+
+    Each entry holds access_token, refresh_token, issued_at and expires_at
+    (epoch seconds). The file is rewritten atomically (temp file + rename)
+    so a crash mid-write never leaves a truncated cache behind, and re-read
+    whenever another process has replaced it.
+    """
+
+    DEFAULT_PATH = ".spotify_token_cache.json"
+
+    # shared by every store in the process: path -> (file signature, {user_id: state})
+    _memory = {}
+    _locks = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.path = os.path.abspath(path or os.getenv("SPOTIFY_TOKEN_CACHE", self.DEFAULT_PATH))
+
+    def _lock_for(self, lock_path):
+        with self._registry_lock:
+            return self._locks.setdefault(lock_path, FileLock(lock_path))
+
+    def lock(self, user_id):
+        """
+        Lock serialising token refreshes for one user across threads and processes
+        """
+
+        digest = hashlib.sha1(user_id.encode()).hexdigest()[:12]
+        return self._lock_for(f"{self.path}.{digest}.lock")
+
+    def _file_lock(self):
+        # guards the read-modify-write of the whole cache file
+        return self._lock_for(f"{self.path}.lock")
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _read_file(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable token cache {self.path}: {e}")
+            return {}
+
+    def load(self, user_id):
+        """
+        :return: cached token state for the user, or None
+        """
+
+        # a stat per call: a token rotated by another process is picked up on the next load
+        signature = self._signature()
+        with self._registry_lock:
+            cached = self._memory.get(self.path)
+        if cached is None or cached[0] != signature:
+            with self._file_lock():
+                signature = self._signature()
+                cached = (signature, self._read_file())
+            with self._registry_lock:
+                self._memory[self.path] = cached
+        state = cached[1].get(user_id)
+        return dict(state) if state else None
+
+    def save(self, user_id, state):
+        """
+        Update the user's entry in memory and atomically rewrite the cache file
+        """
+
+        with self._file_lock():
+            states = self._read_file()
+            states[user_id] = dict(state)
+
+            directory = os.path.dirname(self.path)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".token_cache.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(states, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.chmod(tmp_path, 0o600)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+
+            with self._registry_lock:
+                self._memory[self.path] = (self._signature(), states)
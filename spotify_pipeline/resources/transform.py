@@ -0,0 +1,67 @@
+from datetime import date, datetime, timedelta, timezone
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MS_PER_DAY = 86_400_000
+# built once: constructing the timedelta costs more than the division it is used in
+ONE_MS = timedelta(milliseconds=1)
+
+
+def played_at_to_ms(played_at):
+    """
+    Convert a Spotify played_at timestamp (e.g. 2024-05-01T12:00:00.123Z) to epoch milliseconds.
+    Values that already are epoch milliseconds (e.g. from a PlayBatch) are returned as ints.
+    """
+
+    if not isinstance(played_at, str):
+        return int(played_at)
+    dt = datetime.fromisoformat(played_at.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - EPOCH) // ONE_MS
+
+
+def ms_to_played_at(ms):
+    """
+    Epoch milliseconds -> Spotify style played_at string (2024-05-01T12:00:00.123Z)
+    """
+
+    return (EPOCH + timedelta(milliseconds=ms)).strftime("%Y-%m-%dT%H:%M:%S.") + f"{ms % 1000:03d}Z"
+
+
+def to_epoch_ms(value, end=False):
+    """
+    Convert a date/datetime/ISO string bound to epoch milliseconds (naive values are UTC).
+    With end=True a plain date (or "YYYY-MM-DD") stands for its last millisecond.
+    """
+
+    if isinstance(value, str):
+        value = date.fromisoformat(value) if len(value) == 10 else datetime.fromisoformat(value.replace("Z", "+00:00"))
+    whole_day = not isinstance(value, datetime)
+    if whole_day:
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    ms = (value - EPOCH) // ONE_MS
+    return ms + MS_PER_DAY - 1 if end and whole_day else ms
+
+
+def flatten_play(item, user_id):
+    """
+    Flatten one recently-played item into a compact record.
+    All credited artists are kept as (spotify_id, name) pairs, main artist first.
+    """
+
+    track = item.get("track") or {}
+    album = track.get("album") or {}
+    return {
+        "user_id": user_id,
+        "track_id": track.get("id"),
+        "track_name": track.get("name"),
+        "duration_ms": track.get("duration_ms"),
+        "album_id": album.get("id"),
+        "album_name": album.get("name"),
+        "artists": [(artist.get("id"), artist.get("name")) for artist in track.get("artists") or []],
+        "played_at": item.get("played_at"),
+    }
+
@@ -0,0 +1,45 @@
+import logging
+
+from sqlalchemy import select
+
+from spotify_pipeline.models.spotify_models import Watermark
+from spotify_pipeline.resources.bulk_loader import dialect_insert
+from spotify_pipeline.resources.transform import ms_to_played_at, played_at_to_ms
+
+
+class WatermarkStore:
+    """
+    Persisted per-user high-water mark used for incremental extraction
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def get(self, user_id):
+        """
+        :return: epoch ms of the last loaded play for the user, or None on first run
+        """
+
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(Watermark.played_at_ms).where(Watermark.user_id == user_id)
+            ).scalar()
+
+    def advance(self, user_id, played_at):
+        """
+        Move the watermark forward to played_at (ISO string or epoch ms). Never moves it backwards.
+        """
+
+        played_at_ms = played_at_to_ms(played_at)
+        if not isinstance(played_at, str):
+            played_at = ms_to_played_at(played_at_ms)
+        insert = dialect_insert(self.engine)
+        stmt = insert(Watermark).values(user_id=user_id, played_at=played_at, played_at_ms=played_at_ms)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={"played_at": stmt.excluded.played_at, "played_at_ms": stmt.excluded.played_at_ms},
+            where=Watermark.played_at_ms < stmt.excluded.played_at_ms,
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+        logging.info(f"Watermark for user '{user_id}' is now {played_at}.")
@@ -0,0 +1,190 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from spotify_pipeline import config
+from spotify_pipeline.resources.metrics import increment
+
+
+SUFFIX = ".json"
+FRAME_TAG = "__frame__"
+
+
+def _digest(value):
+    return hashlib.sha1(repr(value).encode()).hexdigest()[:20]
+
+
+def _to_json(value):
+    # DataFrames keep their dtypes and index through pandas' table schema, NumPy scalars become plain numbers
+    if hasattr(value, "to_json") and hasattr(value, "columns"):
+        return {FRAME_TAG: value.to_json(orient="table", date_format="iso")}
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Cannot store {type(value).__name__} in the dashboard cache")
+
+
+def _from_json(obj):
+    if FRAME_TAG in obj:
+        import pandas as pd
+
+        return pd.read_json(io.StringIO(obj[FRAME_TAG]), orient="table")
+    return obj
+
+
+def dumps(value):
+    return json.dumps(value, default=_to_json)
+
+
+def loads(text):
+    return json.loads(text, object_hook=_from_json)
+
+
+class DashboardCache:
+    """
+    Two-tier cache of dashboard results, keyed by (scope, version, key):
+
+    - an in-process LRU of max_entries values, shared by every viewer of one Streamlit server
+    - with a directory, one JSON file per entry under <directory>/<scope>/, shared by every
+      process (other servers, the ETL pre-warming it) and kept to max_mb by evicting the
+      least recently used files. JSON rather than pickle: loading a file from a shared
+      directory must never run code. Values are JSON types, DataFrames and NumPy scalars;
+      tuples come back as lists.
+
+    A scope (e.g. one user's views) holds a single version: storing a newer version drops
+    the scope's older entries from both tiers, so invalidation is just a version bump.
+    Files are written to a temporary name and renamed, so readers never see a partial entry.
+    """
+
+    def __init__(self, directory=None, max_entries=None, max_mb=None):
+        self.directory = directory or config.DASHBOARD_CACHE_DIR
+        self.max_entries = max_entries or config.DASHBOARD_CACHE_ENTRIES
+        self.max_bytes = (max_mb or config.DASHBOARD_CACHE_MB) * 1024 * 1024
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        # scope -> newest version seen, to drop older entries once
+        self._versions = {}
+
+    def _path(self, scope, version, key):
+        return os.path.join(self.directory, _digest(scope), f"{_digest(version)}-{_digest(key)}{SUFFIX}")
+
+    def get(self, scope, version, key):
+        """
+        :return: (True, value) on a hit in either tier, (False, None) on a miss
+        """
+
+        memory_key = (scope, version, key)
+        with self._lock:
+            if memory_key in self._memory:
+                self._memory.move_to_end(memory_key)
+                increment("dashboard_cache", tier="memory", outcome="hit")
+                return True, self._memory[memory_key]
+
+        if self.directory:
+            path = self._path(scope, version, key)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    value = loads(f.read())
+                os.utime(path)  # the mtime orders the disk tier's LRU eviction
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable dashboard cache entry {path}: {e}")
+            else:
+                self._remember(memory_key, value)
+                increment("dashboard_cache", tier="disk", outcome="hit")
+                return True, value
+
+        increment("dashboard_cache", outcome="miss")
+        return False, None
+
+    def put(self, scope, version, key, value):
+        self._remember((scope, version, key), value)
+        if not self.directory:
+            return
+
+        path = self._path(scope, version, key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=directory, prefix=".entry.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(dumps(value))
+            os.replace(temp, path)
+        except BaseException:
+            os.remove(temp)
+            raise
+        self._evict_disk(directory, os.path.basename(path).split("-", 1)[0])
+
+    def get_or_build(self, scope, version, key, build):
+        """
+        Cached value, or build() stored under the given version
+        """
+
+        hit, value = self.get(scope, version, key)
+        if not hit:
+            value = build()
+            self.put(scope, version, key, value)
+        return value
+
+    def _remember(self, memory_key, value):
+        scope, version, _ = memory_key
+        with self._lock:
+            if self._versions.get(scope) != version:
+                self._versions[scope] = version
+                for stale in [k for k in self._memory if k[0] == scope and k[1] != version]:
+                    del self._memory[stale]
+            self._memory[memory_key] = value
+            self._memory.move_to_end(memory_key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _evict_disk(self, scope_directory, version_digest):
+        """
+        Drop the scope's entries of other versions, then the least recently used files
+        of the whole cache while it is over max_bytes
+        """
+
+        for entry in os.scandir(scope_directory):
+            if entry.name.endswith(SUFFIX) and not entry.name.startswith(f"{version_digest}-"):
+                self._remove(entry.path)
+
+        files = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _entries(self):
+        if not self.directory or not os.path.isdir(self.directory):
+            return
+        for scope in os.scandir(self.directory):
+            if scope.is_dir():
+                yield from (e for e in os.scandir(scope.path) if e.name.endswith(SUFFIX))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # another process evicted it first
+            pass
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._versions.clear()
+        for entry in list(self._entries()):
+            self._remove(entry.path)
@@ -0,0 +1,134 @@
+import logging
+
+from spotify_pipeline import config
+from spotify_pipeline.resources.metrics import timed
+from spotify_pipeline.visualization.cache import DashboardCache
+
+
+# scope of views over every user
+ALL_USERS = "*"
+
+# data_loader (pandas) and charts (Plotly) are imported inside the functions that use them:
+# ETL entry points import warm_dashboard_cache, and a fetch with no new plays must stay cheap
+
+
+def build_page(user_id=None, start=None, end=None, artists=(), source="Database", approximate=False):
+    """
+    Everything the dashboard page shows for one filter selection, with the figures
+    serialized to Plotly JSON so the page can be cached and shared.
+    :param source: "Database" (rollups and pushed-down queries) or "Archive" (the Parquet history).
+    :param approximate: Summary and top lists from the play sketches (Database source, no artist filter).
+    :return: dict with summary, recent (DataFrame, None without plays), figures (JSON strings)
+             and error (approximate mode's bounds, else None)
+    """
+
+    from spotify_pipeline.visualization import charts, data_loader
+
+    filters = dict(user_id=user_id, start=start, end=end, artists=artists)
+    sketches = None
+    if approximate and source == "Database" and not artists:
+        sketches = data_loader.load_approximate(10, user_id=user_id, start=start, end=end)
+
+    if source == "Archive":
+        # one memory-mapped archive read, shared as a typed feature frame by every chart
+        features = data_loader.load_archive_features(**filters)
+        summary = {
+            "total_plays": len(features),
+            "unique_artists": features["artist"].nunique() if len(features) else 0,
+            "unique_albums": features["album"].nunique() if len(features) else 0,
+        }
+    elif sketches:
+        summary = sketches["summary"]
+    else:
+        summary = data_loader.load_summary(**filters)
+
+    page = {"summary": summary, "recent": None, "figures": [], "error": sketches["error"] if sketches else None}
+    if summary["total_plays"] == 0:
+        return page
+
+    if source == "Archive":
+        page["recent"] = features.nlargest(10, "played_at")[["user_id", "id", "name", "artist", "album", "played_at"]]
+        figures = [charts.top_artists_chart(features), charts.top_songs_chart(features),
+                   charts.listening_trends_chart(features), charts.listening_heatmap(features),
+                   charts.listening_by_hour_chart(features), charts.weekly_listening_trends(features),
+                   charts.track_repeat_frequency(features), charts.session_length_distribution(features)]
+    else:
+        page["recent"] = data_loader.load_recent_plays(10, **filters)
+        hourly_counts = data_loader.load_hourly_counts(**filters)
+        sessions = data_loader.load_sessions(user_id=user_id, start=start, end=end)
+        if sketches:
+            top_artists, top_songs, track_repeats = (sketches["top_artists"], sketches["top_songs"],
+                                                     sketches["track_repeats"])
+        else:
+            top_artists = data_loader.load_top_artists(10, **filters)
+            top_songs = data_loader.load_top_tracks(10, **filters)
+            track_repeats = data_loader.load_track_repeats(5, **filters)
+        figures = [
+            charts.top_artists_figure(top_artists),
+            charts.top_songs_figure(top_songs),
+            charts.listening_trends_figure(data_loader.load_daily_counts(**filters)),
+            charts.listening_heatmap_figure(hourly_counts),
+            charts.listening_by_hour_figure(hourly_counts),
+            charts.weekly_listening_figure(hourly_counts),
+            charts.track_repeat_figure(track_repeats),
+            charts.session_length_figure((sessions["ended_at"] - sessions["started_at"]) / 60000),
+        ]
+
+    page["figures"] = [fig.to_json() for fig in figures]
+    return page
+
+
+def data_version(user_id=None, source="Database"):
+    """
+    Cache version of a view: the database load counter, plus the archive's files for archive views
+    """
+
+    from spotify_pipeline.visualization import data_loader
+
+    version = data_loader.load_data_version(user_id)
+    return (version, data_loader.load_archive_version()) if source == "Archive" else version
+
+
+def cached_page(cache, user_id=None, start=None, end=None, artists=(), source="Database", approximate=False):
+    """
+    build_page through the cache: a filter selection is only computed once per data version
+    """
+
+    version = data_version(user_id, source)
+    key = ("page", start, end, tuple(artists), source, bool(approximate))
+    return cache.get_or_build(user_id or ALL_USERS, version, key,
+                              lambda: build_page(user_id, start, end, tuple(artists), source, approximate))
+
+
+def cached_users(cache):
+    """
+    data_loader.load_users through the cache
+    """
+
+    from spotify_pipeline.visualization import data_loader
+
+    return cache.get_or_build(ALL_USERS, data_version(), ("users",), data_loader.load_users)
+
+
+def warm_dashboard_cache(user_ids=(), cache=None):
+    """
+    Called after a load that inserted plays: builds the user list and the default
+    (unfiltered) page for all users and for each of user_ids into the shared disk tier,
+    so the next viewers are served from cache. Does nothing without
+    SPOTIFY_DASHBOARD_CACHE_DIR, and never fails the run: the dashboard simply
+    computes what is missing.
+    :param user_ids: Users whose plays changed, for their own pages.
+    """
+
+    if not (cache or config.DASHBOARD_CACHE_DIR):
+        return
+    user_ids = sorted(set(user_ids))
+    try:
+        cache = cache or DashboardCache()
+        with timed("cache_warm"):
+            cached_users(cache)
+            for user_id in [None, *user_ids]:
+                cached_page(cache, user_id)
+        logging.info(f"Dashboard cache warmed for all users and {len(user_ids)} user pages.")
+    except Exception as e:
+        logging.warning(f"Dashboard cache pre-warm failed: {e}")
@@ -1,37 +1,330 @@
-import sqlite3
 import pandas as pd
 import logging
+from datetime import timedelta
+from sqlalchemy import text
+from spotify_pipeline.visualization.features import build_feature_frame
+from spotify_pipeline.resources.archive import PlayArchive
+from spotify_pipeline.resources.metrics import timed
+from spotify_pipeline.resources.transform import to_epoch_ms
+from spotify_pipeline.visualization.queries import PlayQuery, query_plays, reader_engine
+
+# archive column -> dashboard column
+ARCHIVE_COLUMNS = {"user_id": "user_id", "track_id": "id", "track_name": "name", "artist_name": "artist",
+                   "album_name": "album", "played_at": "played_at", "duration_ms": "duration_ms"}
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-def load_data(db_path="spotify_data.db"):
+def load_data(db_path=None, user_id=None, start=None, end=None, artists=None, limit=None):
     """
-    Load Spotify track data from SQLite into a Pandas DataFrame.
-    :param db_path: Path to SQLite database file.
+    Load plays into a Pandas DataFrame through the shared read-only connection pool.
+    Filters are pushed down into SQL, so only matching rows leave the database.
+    :param db_path: Path to a SQLite database file, defaults to the configured database.
+    :param user_id, start, end, artists, limit: See queries.PlayQuery.
     :return: Pandas DataFrame containing track data.
     """
     try:
-        # Connect to the SQLite database
-        conn = sqlite3.connect(db_path)
-        
-        # Load track data into a DataFrame
-        query = """
-        SELECT id, name, artist, album, played_at 
-        FROM tracks
-        """
-        df = pd.read_sql(query, conn)
-        
-        # Close the database connection
-        conn.close()
-        
+        df = query_plays(PlayQuery(user_id=user_id, start=start, end=end, artists=artists, limit=limit), db_path)
         logging.info(f"✅ Successfully loaded {len(df)} records from database.")
         return df
     except Exception as e:
         logging.error(f"❌ Error loading data from database: {e}")
         return pd.DataFrame()  # Return an empty DataFrame in case of failure
 
+def _filtered(start, end, artists):
+    # rollups hold all-time totals; any time or artist filter goes to the plays table instead
+    return start is not None or end is not None or bool(artists)
+
+def _query(spec, db_path=None):
+    try:
+        return query_plays(spec, db_path)
+    except Exception as e:
+        logging.error(f"❌ Error querying plays: {e}")
+        return pd.DataFrame()
+
+def _read_rollup(query, user_id=None, db_path=None, user_column="user_id", suffix="", where=None, params=None):
+    """
+    Run a query against the rollup tables, optionally restricted to one user.
+    :param query: SELECT ... FROM ... without WHERE; suffix holds GROUP BY/ORDER BY/LIMIT.
+    :param where: Extra SQL conditions, with their bind values in params.
+    :return: Pandas DataFrame, empty on failure.
+    """
+    try:
+        engine = reader_engine(db_path)
+        conditions, params = list(where or []), dict(params or {})
+        if user_id:
+            conditions.append(f"{user_column} = :user_id")
+            params["user_id"] = user_id
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with timed("query", source="rollups"), engine.connect() as conn:
+            return pd.read_sql(text(f"{query} {suffix}"), conn, params=params)
+    except Exception as e:
+        logging.error(f"❌ Error reading rollups from database: {e}")
+        return pd.DataFrame()
+
+def _scalar(frame):
+    return int(frame["n"].iloc[0]) if not frame.empty else 0
+
+def load_data_version(user_id=None, db_path=None):
+    """
+    Load counter behind a view's data: the user's changes plus those affecting everyone,
+    or every change when user_id is None. Loads bump it in their own transaction, so it
+    moves exactly when the data does; use it as a cache key.
+    """
+    where = ["user_id IN (:version_user, '')"] if user_id else None
+    df = _read_rollup("SELECT COALESCE(SUM(loads), 0) AS n FROM data_versions", db_path=db_path,
+                      where=where, params={"version_user": user_id} if user_id else None)
+    return _scalar(df)
+
+def load_archive_version(archive_dir=None):
+    """
+    (files, newest modification) of the Parquet archive, the cache key part of archive views
+    """
+    return PlayArchive(archive_dir).version()
+
+def load_feature_frame(db_path=None, **filters):
+    """
+    Plays matching the filters as a typed feature frame (see features.py), ready for the *_chart functions.
+    """
+    return build_feature_frame(load_data(db_path, **filters))
+
+def load_archive_data(archive_dir=None, user_id=None, start=None, end=None, artists=None):
+    """
+    Load plays from the Parquet archive, shaped like load_data. Only the partitions in range
+    are opened and only the charted columns are read; strings arrive as categoricals.
+    :return: Pandas DataFrame, empty when there is no archive.
+    """
+    try:
+        with timed("query", source="archive"):
+            table = PlayArchive(archive_dir).read(
+                columns=list(ARCHIVE_COLUMNS), user_id=user_id, start=start, end=end, artists=artists,
+            )
+        df = table.to_pandas().rename(columns=ARCHIVE_COLUMNS)
+        df["played_at"] = pd.to_datetime(df["played_at"], unit="ms", utc=True)
+        logging.info(f"✅ Loaded {len(df)} records from the archive.")
+        return df
+    except Exception as e:
+        logging.error(f"❌ Error loading data from the archive: {e}")
+        return pd.DataFrame()
+
+def load_archive_features(archive_dir=None, **filters):
+    """
+    Archive plays as a typed feature frame for the *_chart functions.
+    """
+    df = load_archive_data(archive_dir, **filters)
+    return build_feature_frame(df) if not df.empty else df
+
+def load_users(db_path=None):
+    """
+    User ids with at least one play, for the dashboard's user filter
+    """
+    df = _read_rollup("SELECT DISTINCT user_id FROM daily_plays", db_path=db_path, suffix="ORDER BY user_id")
+    return df["user_id"].tolist() if not df.empty else []
+
+def load_summary(user_id=None, db_path=None, start=None, end=None, artists=None):
+    """
+    Total plays, unique artists and unique albums from the rollup tables.
+    :return: dict with total_plays, unique_artists, unique_albums.
+    """
+    if _filtered(start, end, artists):
+        df = _query(PlayQuery(user_id=user_id, start=start, end=end, artists=artists,
+                              metrics=("play_count", "unique_artists", "unique_albums")), db_path)
+        row = df.iloc[0] if not df.empty else {}
+        return {"total_plays": int(row.get("play_count", 0)), "unique_artists": int(row.get("unique_artists", 0)),
+                "unique_albums": int(row.get("unique_albums", 0))}
+
+    total = _read_rollup("SELECT COALESCE(SUM(play_count), 0) AS n FROM daily_plays", user_id, db_path)
+    artists = _read_rollup("SELECT COUNT(DISTINCT artist_id) AS n FROM artist_plays", user_id, db_path)
+    albums = _read_rollup(
+        "SELECT COUNT(DISTINCT t.album_id) AS n FROM track_plays tp JOIN tracks t ON t.id = tp.track_id",
+        user_id, db_path, user_column="tp.user_id",
+    )
+    return {"total_plays": _scalar(total), "unique_artists": _scalar(artists), "unique_albums": _scalar(albums)}
+
+def load_recent_plays(limit=10, user_id=None, db_path=None, start=None, end=None, artists=None):
+    """
+    The latest plays, newest first, read through the played_at index.
+    """
+    return _query(PlayQuery(user_id=user_id, start=start, end=end, artists=artists, limit=limit), db_path)
+
+def load_daily_counts(user_id=None, db_path=None, start=None, end=None, artists=None):
+    """
+    Plays per UTC day (columns played_at, play_count)
+    """
+    if _filtered(start, end, artists):
+        return _query(PlayQuery(user_id=user_id, start=start, end=end, artists=artists, group_by=("day",)),
+                      db_path).rename(columns={"day": "played_at"})
+    df = _read_rollup(
+        "SELECT day AS played_at, SUM(play_count) AS play_count FROM daily_plays",
+        user_id, db_path, suffix="GROUP BY day ORDER BY day",
+    )
+    if not df.empty:
+        df["played_at"] = pd.to_datetime(df["played_at"]).dt.date
+    return df
+
+def load_hourly_counts(user_id=None, db_path=None, start=None, end=None, artists=None):
+    """
+    Plays per (weekday, hour) bucket, weekday 0 = Monday (columns weekday, hour, play_count)
+    """
+    if _filtered(start, end, artists):
+        return _query(PlayQuery(user_id=user_id, start=start, end=end, artists=artists,
+                                group_by=("weekday", "hour")), db_path)
+    return _read_rollup(
+        "SELECT weekday, hour, SUM(play_count) AS play_count FROM hourly_plays",
+        user_id, db_path, suffix="GROUP BY weekday, hour",
+    )
+
+def load_top_artists(limit=10, user_id=None, db_path=None, start=None, end=None, artists=None):
+    """
+    Most played artists (columns artist, play_count)
+    """
+    if _filtered(start, end, artists):
+        return _query(PlayQuery(user_id=user_id, start=start, end=end, artists=artists, group_by=("artist",),
+                                order_by="play_count", limit=limit), db_path)
+    return _read_rollup(
+        "SELECT a.name AS artist, SUM(ap.play_count) AS play_count "
+        "FROM artist_plays ap JOIN artists a ON a.id = ap.artist_id",
+        user_id, db_path, user_column="ap.user_id",
+        suffix=f"GROUP BY a.id, a.name ORDER BY play_count DESC LIMIT {int(limit)}",
+    )
+
+def _track_names(track_ids, db_path=None):
+    """
+    :return: dict track id -> (name, main artist name) for a few ranked ids
+    """
+    if not track_ids:
+        return {}
+    names = _read_rollup(
+        "SELECT t.id, t.name, a.name AS artist FROM tracks t "
+        "LEFT JOIN track_artists ta ON ta.track_id = t.id AND ta.position = 0 "
+        "LEFT JOIN artists a ON a.id = ta.artist_id",
+        db_path=db_path, where=[f"t.id IN ({', '.join(str(int(i)) for i in track_ids)})"],
+    )
+    return {row.id: (row.name, row.artist) for row in names.itertuples()} if not names.empty else {}
+
+def _top_track_rollup(limit, user_id=None, db_path=None):
+    """
+    Most played tracks from track_plays, grouped by track key like the filtered queries
+    (tracks sharing a name stay apart), with names joined on afterwards
+    :return: DataFrame with columns name, artist, play_count
+    """
+    top = _read_rollup(
+        "SELECT track_id, SUM(play_count) AS play_count FROM track_plays", user_id, db_path,
+        suffix=f"GROUP BY track_id ORDER BY play_count DESC LIMIT {int(limit)}",
+    )
+    if top.empty:
+        return pd.DataFrame(columns=["name", "artist", "play_count"])
+    names = _track_names(top["track_id"].tolist(), db_path)
+    return pd.DataFrame([(*names.get(i, (None, None)), n) for i, n in zip(top["track_id"], top["play_count"])],
+                        columns=["name", "artist", "play_count"])
+
+def load_top_tracks(limit=10, user_id=None, db_path=None, start=None, end=None, artists=None):
+    """
+    Most played songs by name and main artist (columns name, artist, play_count)
+    """
+    if _filtered(start, end, artists):
+        return _query(PlayQuery(user_id=user_id, start=start, end=end, artists=artists,
+                                group_by=("track", "artist"), order_by="play_count", limit=limit), db_path)
+    return _top_track_rollup(limit, user_id, db_path)
+
+def load_track_repeats(limit=5, user_id=None, db_path=None, start=None, end=None, artists=None):
+    """
+    Most replayed tracks (columns track_name, play_count)
+    """
+    if _filtered(start, end, artists):
+        return _query(PlayQuery(user_id=user_id, start=start, end=end, artists=artists, group_by=("track",),
+                                order_by="play_count", limit=limit), db_path).rename(columns={"name": "track_name"})
+    return _top_track_rollup(limit, user_id, db_path)[["name", "play_count"]].rename(columns={"name": "track_name"})
+
+def load_sessions(user_id=None, db_path=None, start=None, end=None):
+    """
+    Listening session summaries (started_at, ended_at as epoch ms, track_count, distinct_artists),
+    optionally only the sessions that started within [start, end].
+    """
+    where, params = [], {}
+    if start is not None:
+        where.append("started_at >= :start")
+        params["start"] = to_epoch_ms(start)
+    if end is not None:
+        where.append("started_at <= :end")
+        params["end"] = to_epoch_ms(end, end=True)
+    return _read_rollup(
+        "SELECT user_id, started_at, ended_at, track_count, distinct_artists FROM listening_sessions",
+        user_id, db_path, suffix="ORDER BY started_at", where=where, params=params,
+    )
+
+def _sketch_cover(start=None, end=None):
+    """
+    WHERE condition picking the sketches that exactly cover [start, end]: monthly sketches
+    for the whole calendar months inside it, daily ones for the days at either edge.
+    :return: (condition, params)
+    """
+    first = pd.Timestamp(to_epoch_ms(start), unit="ms").date() if start is not None else None
+    last = pd.Timestamp(to_epoch_ms(end, end=True), unit="ms").date() if end is not None else None
+    params = {}
+    months, edges = ["grain = 'month'"], []
+    if first is not None:
+        month_lo = first if first.day == 1 else (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+        params.update(first=first.isoformat(), month_lo=month_lo.isoformat())
+        months.append("day >= :month_lo")
+        edges.append("day >= :first AND day < :month_lo")
+    if last is not None:
+        month_end = last if (last + timedelta(days=1)).day == 1 else last.replace(day=1) - timedelta(days=1)
+        params.update(last=last.isoformat(), month_hi=month_end.replace(day=1).isoformat(),
+                      month_end=month_end.isoformat())
+        months.append("day <= :month_hi")
+        edges.append("day > :month_end AND day <= :last")
+    if first is not None and last is not None and month_lo > month_end:
+        # no whole month in range
+        return "grain = 'day' AND day >= :first AND day <= :last", params
+
+    condition = f"({' AND '.join(months)})"
+    if edges:
+        condition += f" OR (grain = 'day' AND (({') OR ('.join(edges)})))"
+    return f"({condition})", params
+
+def load_approximate(limit=10, user_id=None, db_path=None, start=None, end=None):
+    """
+    Summary metrics and top artists/songs merged from the play sketches, for the dashboard's
+    fast approximate mode: the cost grows with the months (and edge days) in range, not with plays.
+    Play totals are exact; distinct counts and top lists carry the bounds under "error".
+    Sketches cover whole UTC days, so start and end are widened to the days containing them.
+    :return: dict with summary, top_artists, top_songs, track_repeats and error; None without sketches.
+    """
+    from spotify_pipeline.resources.sketches import merge_sketches
+
+    condition, params = _sketch_cover(start, end)
+    blobs = _read_rollup("SELECT data FROM play_sketches", user_id, db_path, where=[condition], params=params)
+    if blobs.empty:
+        return None
+
+    with timed("sketch_merge"):
+        sketch = merge_sketches(blobs["data"])
+    top_artists = sketch.top_items("artist", limit)
+    top_tracks = sketch.top_items("track", limit)
+
+    # only the few ranked ids are looked up by name
+    artist_names = {}
+    if top_artists:
+        names = _read_rollup("SELECT id, name FROM artists", db_path=db_path,
+                             where=[f"id IN ({', '.join(str(int(i)) for i, _ in top_artists)})"])
+        artist_names = dict(zip(names["id"], names["name"])) if not names.empty else {}
+    track_names = _track_names([i for i, _ in top_tracks], db_path)
+
+    top_songs = pd.DataFrame([(*track_names.get(i, (None, None)), n) for i, n in top_tracks],
+                             columns=["name", "artist", "play_count"])
+    return {
+        "summary": {"total_plays": sketch.plays, "unique_artists": sketch.distinct_count("artist"),
+                    "unique_albums": sketch.distinct_count("album")},
+        "top_artists": pd.DataFrame([(artist_names.get(i), n) for i, n in top_artists],
+                                    columns=["artist", "play_count"]),
+        "top_songs": top_songs,
+        "track_repeats": top_songs.head(5)[["name", "play_count"]].rename(columns={"name": "track_name"}),
+        "error": sketch.error_bounds(),
+    }
+
 # Test loading data
 if __name__ == "__main__":
     df = load_data()
-    print(df.head())
\ No newline at end of file
+    print(df.head())
@@ -0,0 +1,43 @@
+import pandas as pd
+
+
+CATEGORICAL_COLUMNS = ("artist", "name", "album")
+
+
+def is_feature_frame(df):
+    """
+    True when df already carries the parsed, typed feature columns
+    """
+
+    return (
+        "hour" in df and df["hour"].dtype == "int8"
+        and "weekday" in df and df["weekday"].dtype == "int8"
+        and isinstance(df["played_at"].dtype, pd.DatetimeTZDtype)
+    )
+
+
+def build_feature_frame(df):
+    """
+    Parse and type a plays frame once, for every chart to share.
+    The input frame is left untouched.
+
+    :param df: Plays with at least played_at, plus any of artist, name, album.
+    :return: New DataFrame with played_at as datetime64[UTC], categorical
+             artist/name/album, day (UTC midnight), and int8 hour and weekday (0 = Monday).
+    """
+
+    if is_feature_frame(df):
+        return df
+
+    played_at = pd.to_datetime(df["played_at"], utc=True)
+    features = pd.DataFrame({"played_at": played_at}, index=df.index)
+    for name in CATEGORICAL_COLUMNS:
+        if name in df:
+            features[name] = df[name].astype("category")
+    for name in df.columns.difference(features.columns):
+        features[name] = df[name]
+
+    features["day"] = played_at.dt.floor("D")
+    features["hour"] = played_at.dt.hour.astype("int8")
+    features["weekday"] = played_at.dt.weekday.astype("int8")
+    return features
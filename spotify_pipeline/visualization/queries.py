@@ -0,0 +1,171 @@
+import logging
+import os
+from dataclasses import dataclass
+
+import pandas as pd
+from sqlalchemy import BigInteger, Integer, String, column, distinct, func, select, table
+
+from spotify_pipeline.models.database import get_reader_engine
+from spotify_pipeline.resources.metrics import timed
+from spotify_pipeline.resources.transform import to_epoch_ms
+
+
+# Lightweight table handles: the dashboard only needs column names, not the ORM
+# models (importing those opens the writer engine).
+plays = table(
+    "plays", column("user_id", String), column("played_at", BigInteger),
+    column("track_id", Integer), column("artist_id", Integer),
+)
+tracks = table(
+    "tracks", column("id", Integer), column("spotify_id", String),
+    column("name", String), column("album_id", Integer), column("duration_ms", Integer),
+)
+artists = table("artists", column("id", Integer), column("name", String))
+albums = table("albums", column("id", Integer), column("name", String))
+
+MS_PER_HOUR = 3_600_000
+MS_PER_DAY = 86_400_000
+
+# Time buckets are plain integer arithmetic on epoch milliseconds (UTC), which
+# SQLite and Postgres evaluate the same way. 1970-01-01 was a Thursday, hence the + 3.
+DIMENSIONS = {
+    "user": lambda: [plays.c.user_id.label("user_id")],
+    "day": lambda: [(plays.c.played_at // MS_PER_DAY).label("day")],
+    "hour": lambda: [((plays.c.played_at // MS_PER_HOUR) % 24).label("hour")],
+    "weekday": lambda: [((plays.c.played_at // MS_PER_DAY + 3) % 7).label("weekday")],
+    "artist": lambda: [artists.c.id.label("artist_key"), artists.c.name.label("artist")],
+    "track": lambda: [tracks.c.id.label("track_key"), tracks.c.name.label("name")],
+    "album": lambda: [albums.c.id.label("album_key"), albums.c.name.label("album")],
+}
+METRICS = {
+    "play_count": lambda: func.count(),
+    "unique_tracks": lambda: func.count(distinct(plays.c.track_id)),
+    "unique_artists": lambda: func.count(distinct(plays.c.artist_id)),
+    "unique_albums": lambda: func.count(distinct(tracks.c.album_id)),
+    "first_played": lambda: func.min(plays.c.played_at),
+    "last_played": lambda: func.max(plays.c.played_at),
+}
+
+
+@dataclass
+class PlayQuery:
+    """
+    What to read from the plays table. Filters become WHERE clauses; with group_by
+    or metrics set, the aggregation runs in the database and only the groups come
+    back, otherwise matching plays are returned newest first.
+
+    :param user_id: Restrict to one user.
+    :param start: Earliest play (date, datetime or ISO string, naive values are UTC).
+    :param end: Latest play, inclusive; a plain date covers the whole day.
+    :param artists: Iterable of artist names to keep.
+    :param group_by: Dimensions from DIMENSIONS, e.g. ("day",) or ("weekday", "hour").
+    :param metrics: Aggregates from METRICS, play_count when only group_by is given.
+    :param order_by: A metric name (sorted descending); defaults to the group keys.
+    :param limit: Maximum number of rows.
+    """
+
+    user_id: str = None
+    start: object = None
+    end: object = None
+    artists: tuple = None
+    group_by: tuple = ()
+    metrics: tuple = ()
+    order_by: str = None
+    limit: int = None
+
+
+def build_query(spec):
+    """
+    Translate a PlayQuery into a SQLAlchemy select over the star schema
+    """
+
+    unknown = [d for d in spec.group_by if d not in DIMENSIONS] + [m for m in spec.metrics if m not in METRICS]
+    if unknown:
+        raise ValueError(f"Unknown dimensions or metrics: {unknown}")
+
+    aggregate = bool(spec.group_by or spec.metrics)
+    metric_names = tuple(spec.metrics) or ("play_count",)
+    group_by = set(spec.group_by)
+
+    # join only the dimensions the query actually touches
+    source = plays
+    if not aggregate or group_by & {"track", "album"} or "unique_albums" in metric_names:
+        source = source.join(tracks, tracks.c.id == plays.c.track_id)
+    if not aggregate or "artist" in group_by or spec.artists:
+        source = source.outerjoin(artists, artists.c.id == plays.c.artist_id)
+    if not aggregate or "album" in group_by:
+        source = source.outerjoin(albums, albums.c.id == tracks.c.album_id)
+
+    if aggregate:
+        keys = [c for d in spec.group_by for c in DIMENSIONS[d]()]
+        metrics = [METRICS[m]().label(m) for m in metric_names]
+        query = select(*keys, *metrics).select_from(source)
+        if keys:
+            query = query.group_by(*keys)
+        if spec.order_by:
+            if spec.order_by not in metric_names:
+                raise ValueError(f"order_by must be one of the requested metrics {metric_names}")
+            query = query.order_by(metrics[metric_names.index(spec.order_by)].desc())
+        elif keys:
+            query = query.order_by(*keys)
+    else:
+        query = select(
+            plays.c.user_id, tracks.c.spotify_id.label("id"), tracks.c.name,
+            artists.c.name.label("artist"), albums.c.name.label("album"), plays.c.played_at,
+            tracks.c.duration_ms,
+        ).select_from(source).order_by(plays.c.played_at.desc())
+
+    if spec.user_id:
+        query = query.where(plays.c.user_id == spec.user_id)
+    if spec.start is not None:
+        query = query.where(plays.c.played_at >= to_epoch_ms(spec.start))
+    if spec.end is not None:
+        query = query.where(plays.c.played_at <= to_epoch_ms(spec.end, end=True))
+    if spec.artists:
+        query = query.where(artists.c.name.in_(list(spec.artists)))
+    if spec.limit:
+        query = query.limit(spec.limit)
+    return query
+
+
+def _finish(df):
+    """
+    Turn epoch based columns back into dates/timestamps and drop surrogate keys
+    """
+
+    df = df.drop(columns=[c for c in df.columns if c.endswith("_key")])
+    if "day" in df:
+        df["day"] = pd.to_datetime(df["day"] * MS_PER_DAY, unit="ms").dt.date
+    for name in ("played_at", "first_played", "last_played"):
+        if name in df:
+            df[name] = pd.to_datetime(df[name], unit="ms", utc=True)
+    return df
+
+
+def reader_engine(db_path=None):
+    return get_reader_engine(f"sqlite:///{os.path.abspath(db_path)}" if db_path else None)
+
+
+@timed("query", source="plays")
+def query_plays(spec, db_path=None):
+    """
+    Run a PlayQuery and return only its result rows.
+    :return: Pandas DataFrame
+    """
+
+    with reader_engine(db_path).connect() as conn:
+        df = pd.read_sql(build_query(spec), conn)
+    logging.info(f"Query returned {len(df)} rows.")
+    return _finish(df)
+
+
+def iter_plays(spec, chunk_size=10_000, db_path=None):
+    """
+    Stream a PlayQuery's result in DataFrame chunks, e.g. for exports
+    that should not hold the whole answer in memory.
+    """
+
+    with reader_engine(db_path).connect() as conn:
+        conn = conn.execution_options(stream_results=True)
+        for chunk in pd.read_sql(build_query(spec), conn, chunksize=chunk_size):
+            yield _finish(chunk)
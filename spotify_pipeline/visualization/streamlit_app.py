@@ -1,62 +1,96 @@
+import json
+
 import streamlit as st
-import pandas as pd
-from spotify_pipeline.visualization.data_loader import load_data
-from spotify_pipeline.visualization.charts import (
-    top_artists_chart, top_songs_chart, listening_trends_chart,
-    listening_heatmap, listening_by_hour_chart, weekly_listening_trends, track_repeat_frequency, session_length_distribution)
+from spotify_pipeline import config
+from spotify_pipeline.resources.metrics import DASHBOARD_METRICS_FILE, export_metrics
+from spotify_pipeline.visualization.cache import DashboardCache
+from spotify_pipeline.visualization.dashboard import cached_page, cached_users
 
 # Set Streamlit page title and layout
 st.set_page_config(page_title="Spotify Listening Trends", layout="wide")
 
-# Load data from SQLite database
-df = load_data()
+@st.cache_resource
+def dashboard_cache():
+    """
+    One cache per server process, shared by every session. Pages are keyed on the
+    per-user load counters, so a rerun without a new load is served from memory and
+    a fresh server (or one after a load the ETL pre-warmed) from SPOTIFY_DASHBOARD_CACHE_DIR.
+    """
+    return DashboardCache()
+
+cache = dashboard_cache()
+
+# Sidebar filters are pushed down into SQL. Unfiltered, every chart reads the small
+# rollup tables the ETL load keeps up to date, so a render costs the number of
+# buckets rather than the number of plays
+st.sidebar.header("Filters")
+users = cached_users(cache)
+user_id = st.sidebar.selectbox("User", ["All users"] + users) if len(users) > 1 else None
+user_id = None if user_id == "All users" else user_id
+date_range = st.sidebar.date_input("Date range", value=())
+start, end = (date_range[0], date_range[-1]) if date_range else (None, None)
+artist_filter = tuple(a.strip() for a in st.sidebar.text_input("Artists (comma separated)").split(",") if a.strip())
+
+# The Parquet archive holds the full history when the hot database only keeps a recent window
+source = st.sidebar.radio("Source", ["Database", "Archive"]) if config.ARCHIVE_DIR else "Database"
+
+# Summary metrics and top lists merged from the monthly sketches plus day tallies for the partial
+# months at the range edges: cost grows with the months in range, not with plays.
+# Sketches know nothing about artist names, so an artist filter falls back to the exact queries
+approximate = False
+if source == "Database" and config.PLAY_SKETCHES and st.sidebar.checkbox(
+        "Fast approximate mode", help="Distinct counts and top lists estimated from monthly sketches"):
+    if artist_filter:
+        st.sidebar.caption("Approximate mode ignores the artist filter; showing exact results.")
+    else:
+        approximate = True
+
+page = cached_page(cache, user_id=user_id, start=start, end=end, artists=artist_filter,
+                   source=source, approximate=approximate)
+summary, error = page["summary"], page["error"]
 
 # Check if data is available
-if df.empty:
-    st.error("No data available. Please run the ETL pipeline first.")
+if summary["total_plays"] == 0:
+    if users and (start or artist_filter):
+        st.warning("No plays match the selected filters.")
+    else:
+        st.error("No data available. Please run the ETL pipeline first.")
 else:
     # Display page title
     st.title("🎵 Spotify Listening Trends Dashboard")
-    
+
     # Show basic summary metrics
     col1, col2, col3 = st.columns(3)
-    
+
+    # approximate distinct counts are marked with ≈
+    mark = "≈ " if error else ""
+
     with col1:
-        st.metric("Total Tracks Played", df.shape[0])
-    
+        st.metric("Total Tracks Played", summary["total_plays"])
+
     with col2:
-        st.metric("Unique Artists", df['artist'].nunique())
-    
+        st.metric("Unique Artists", f"{mark}{summary['unique_artists']}")
+
     with col3:
-        st.metric("Unique Albums", df['album'].nunique())
-    
+        st.metric("Unique Albums", f"{mark}{summary['unique_albums']}")
+
+    if error:
+        st.caption(f"Approximate mode: unique counts within ±{error['distinct_error']:.1%} (one standard error); "
+                   f"top list counts overstate by at most {error['count_error']} plays with "
+                   f"{error['count_confidence']:.0%} confidence.")
+
     # Show raw data
     st.subheader("🎼 Recently Played Tracks")
-    st.dataframe(df.head(10))
-
-    # Visualizations
-    st.subheader("📊 Top 10 Most Played Artists")
-    st.plotly_chart(top_artists_chart(df), use_container_width=True)
-    
-    st.subheader("📊 Top 10 Most Played Songs")
-    st.plotly_chart(top_songs_chart(df), use_container_width=True)
-    
-    st.subheader("📈 Daily Listening Trends")
-    st.plotly_chart(listening_trends_chart(df), use_container_width=True)
-
-    # Advanced Visualizations
-    st.subheader("🔥 Listening Heatmap (Time of Day vs. Days of Week)")
-    st.plotly_chart(listening_heatmap(df), use_container_width=True)
-    
-    st.subheader("🕒 Listening Habits by Hour of Day")
-    st.plotly_chart(listening_by_hour_chart(df), use_container_width=True)
-    
-    st.subheader("📅 Weekly Listening Trends")
-    st.plotly_chart(weekly_listening_trends(df), use_container_width=True)
-    
-    st.subheader("🔁 Track Repeat Frequency")
-    st.plotly_chart(track_repeat_frequency(df), use_container_width=True)
-
-    st.subheader("⏳ Listening Session Length Distribution")
-    st.plotly_chart(session_length_distribution(df), use_container_width=True)
+    st.dataframe(page["recent"])
+
+    # Visualizations, then the advanced ones
+    titles = ["📊 Top 10 Most Played Artists", "📊 Top 10 Most Played Songs", "📈 Daily Listening Trends",
+              "🔥 Listening Heatmap (Time of Day vs. Days of Week)", "🕒 Listening Habits by Hour of Day",
+              "📅 Weekly Listening Trends", "🔁 Track Repeat Frequency", "⏳ Listening Session Length Distribution"]
+    for title, fig in zip(titles, page["figures"]):
+        st.subheader(title)
+        st.plotly_chart(json.loads(fig), use_container_width=True)
 
+# this server's chart, query and cache timers, cumulative since it started
+if DASHBOARD_METRICS_FILE:
+    export_metrics(DASHBOARD_METRICS_FILE, log=False)
@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+
+# config is read at import time: point the pipeline at a scratch database before any test imports it
+os.environ["SPOTIFY_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="spotify_tests_"), "test.db")
+os.environ.setdefault("SPOTIFY_RATE_LIMIT", "0")
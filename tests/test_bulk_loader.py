@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+from sqlalchemy import func, select
+
+from spotify_pipeline.benchmarks.synthetic import generate_n_plays, to_records
+from spotify_pipeline.models.database import create_writer_engine
+from spotify_pipeline.models.spotify_models import ArtistPlays, DailyPlays, Play, TrackPlays, init_db
+from spotify_pipeline.resources.bulk_loader import upsert_plays
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = init_db(create_writer_engine(f"sqlite:///{tmp_path / 'loader.db'}"))
+    yield engine
+    engine.dispose()
+
+
+def _totals(engine):
+    with engine.connect() as conn:
+        return {
+            model.__tablename__: conn.execute(select(func.coalesce(func.sum(model.play_count), 0))).scalar()
+            for model in (DailyPlays, ArtistPlays, TrackPlays)
+        } | {"plays": conn.execute(select(func.count()).select_from(Play)).scalar()}
+
+
+def test_reload_inserts_nothing(engine):
+    records = to_records(generate_n_plays(500, users=2))
+    first = upsert_plays(records, engine, chunk_size=100)
+    second = upsert_plays(records, engine, chunk_size=100)
+
+    assert first.inserted == len(records)
+    assert second.inserted == 0 and second.skipped == len(records)
+    assert set(_totals(engine).values()) == {len(records)}
+
+
+def test_update_mode_reload_counts_plays_not_dimension_updates(engine):
+    records = to_records(generate_n_plays(300, users=2))
+    upsert_plays(records, engine)
+    # a transform change renamed every track
+    result = upsert_plays([dict(record, track_name=f"{record['track_name']} (v2)") for record in records], engine,
+                          on_conflict="update")
+
+    assert result.updated > 0
+    assert result.plays == result.skipped == len(records)
+
+
+def test_overlapping_loads_count_each_play_once(engine):
+    records = to_records(generate_n_plays(2000, users=4))
+    # the catalog already exists, so a chunk's first write is its plays insert
+    upsert_plays([dict(record, user_id="other") for record in records], engine)
+    # four loaders on overlapping halves of the history, as when cron and Dagster fetch the same user
+    batches = [records, records, records[800:], records[:1600]]
+    barrier = threading.Barrier(len(batches))
+    results, errors = [], []
+
+    def load(batch):
+        barrier.wait()
+        try:
+            results.append(upsert_plays(batch, engine, chunk_size=100))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=load, args=(batch,)) for batch in batches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert sum(result.inserted for result in results) == len(records)
+    assert set(_totals(engine).values()) == {2 * len(records)}
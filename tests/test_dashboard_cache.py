@@ -0,0 +1,32 @@
+import os
+
+import pandas as pd
+import pandas.testing
+
+from spotify_pipeline.visualization.cache import DashboardCache
+
+
+def test_disk_tier_round_trip(tmp_path):
+    page = {
+        "summary": {"total_plays": 3, "unique_artists": 2},
+        "recent": pd.DataFrame({"name": ["a", "b", None], "played_at": pd.to_datetime([1, 2, 3], unit="s", utc=True)},
+                               index=[7, 8, 9]),
+        "figures": ['{"data": []}'],
+        "error": None,
+    }
+    DashboardCache(tmp_path).put("user0", 1, ("page",), page)
+
+    hit, cached = DashboardCache(tmp_path).get("user0", 1, ("page",))
+    assert hit
+    assert {k: v for k, v in cached.items() if k != "recent"} == {k: v for k, v in page.items() if k != "recent"}
+    pandas.testing.assert_frame_equal(cached["recent"], page["recent"], check_dtype=False)
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    cache = DashboardCache(tmp_path)
+    cache.put("user0", 1, ("page",), {"total_plays": 1})
+    [scope] = os.listdir(tmp_path)
+    [entry] = os.listdir(tmp_path / scope)
+    (tmp_path / scope / entry).write_bytes(b"\x80\x04not json")
+
+    assert DashboardCache(tmp_path).get("user0", 1, ("page",)) == (False, None)
@@ -0,0 +1,46 @@
+from datetime import date
+
+import pytest
+
+from spotify_pipeline.models.database import create_writer_engine
+from spotify_pipeline.models.spotify_models import init_db
+from spotify_pipeline.resources.bulk_loader import upsert_plays
+from spotify_pipeline.visualization import data_loader
+
+
+def _play(track_id, name, artist_id, second):
+    return {"user_id": "user0", "track_id": track_id, "track_name": name, "duration_ms": 200_000,
+            "album_id": f"album_{track_id}", "album_name": "Album", "artists": [(artist_id, f"Artist {artist_id}")],
+            "played_at": f"2024-03-01T10:00:{second:02d}.000Z"}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "dashboard.db")
+    engine = init_db(create_writer_engine(f"sqlite:///{path}"))
+    # three different tracks named "Intro": two by the same artist, one by another
+    plays = [_play("t1", "Intro", "a1", 0), _play("t1", "Intro", "a1", 1), _play("t1", "Intro", "a1", 2),
+             _play("t2", "Intro", "a2", 3), _play("t2", "Intro", "a2", 4),
+             _play("t3", "Intro", "a1", 5)]
+    upsert_plays(plays, engine)
+    engine.dispose()
+    return path
+
+
+def test_top_tracks_group_by_track_on_both_paths(db_path):
+    rollup = data_loader.load_top_tracks(10, db_path=db_path)
+    filtered = data_loader.load_top_tracks(10, db_path=db_path, start=date(2024, 1, 1), end=date(2024, 12, 31))
+
+    expected = [("Intro", "Artist a1", 3), ("Intro", "Artist a2", 2), ("Intro", "Artist a1", 1)]
+    assert list(rollup[["name", "artist", "play_count"]].itertuples(index=False, name=None)) == expected
+    assert list(filtered[["name", "artist", "play_count"]].itertuples(index=False, name=None)) == expected
+
+
+def test_track_repeats_group_by_track_on_both_paths(db_path):
+    rollup = data_loader.load_track_repeats(5, db_path=db_path)
+    filtered = data_loader.load_track_repeats(5, db_path=db_path, start=date(2024, 1, 1))
+
+    assert rollup.to_dict("records") == filtered.to_dict("records") == [
+        {"track_name": "Intro", "play_count": 3}, {"track_name": "Intro", "play_count": 2},
+        {"track_name": "Intro", "play_count": 1},
+    ]
@@ -0,0 +1,102 @@
+import json
+import uuid
+
+import pytest
+from sqlalchemy import select
+
+from spotify_pipeline.benchmarks.mock_spotify import MockSpotifyServer, make_history
+from spotify_pipeline.models.database import create_writer_engine
+from spotify_pipeline.models.spotify_models import DataQualityRun, init_db
+from spotify_pipeline.resources.data_quality import StreamProfile, profile_tracks, save_metrics
+from spotify_pipeline.resources.play_store import PlayBatch
+from spotify_pipeline.resources.spotify_data import SpotifyData
+
+
+class StaticAuth:
+    """
+    Stands in for SpotifyAuth; the mock accepts any token
+    """
+
+    access_token = "mock-token"
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    def get_access_token(self):
+        return self.access_token
+
+
+def _items():
+    items = make_history(40)
+    # one play without album (two missing cells), one without artists, and two repeated plays
+    items[3]["track"]["album"] = None
+    items[5]["track"]["artists"] = []
+    return items + items[10:12]
+
+
+def _frame(items):
+    return PlayBatch.from_items(items, "user0").to_pandas(SpotifyData.DATAFRAME_COLUMNS)
+
+
+def test_levels():
+    df = _frame(_items())
+
+    assert profile_tracks(df, level="off") is None
+
+    counts = profile_tracks(df, level="counts")
+    assert (counts.rows, counts.missing_values, counts.duplicate_rows) == (42, 3, 2)
+    assert counts.unique_tracks is None and counts.top_artists == [] and counts.sampled_rows == 0
+
+    full = profile_tracks(df, level="full")
+    assert (full.rows, full.missing_values, full.duplicate_rows, full.sampled_rows) == (42, 3, 2, 42)
+    assert full.unique_tracks == df["track_id"].nunique()
+    assert full.top_artists[0][1] == df["artist_name"].value_counts().iloc[0]
+
+    with pytest.raises(ValueError):
+        profile_tracks(df, level="everything")
+
+
+def test_full_statistics_are_sampled():
+    metrics = profile_tracks(_frame(_items()), level="full", sample_size=10)
+
+    assert metrics.rows == 42 and metrics.sampled_rows == 10
+    assert metrics.unique_tracks <= 10 and sum(count for _, count in metrics.top_artists) <= 10
+
+
+@pytest.mark.parametrize("level", ["counts", "full"])
+def test_stream_profile_matches_the_frame_profile(level):
+    items = _items()
+    profile = StreamProfile(level)
+    # the repeated plays arrive on a later page than their first copies
+    for page in (items[:20], items[20:]):
+        profile.update(PlayBatch.from_items(page, "user0"))
+
+    streamed, framed = profile.metrics(), profile_tracks(_frame(items), level=level)
+    # equal counts may be ranked in another order
+    assert streamed.to_dict() | {"top_artists": None} == framed.to_dict() | {"top_artists": None}
+    assert dict(map(tuple, streamed.top_artists)) == dict(map(tuple, framed.top_artists))
+
+
+def test_save_metrics_writes_a_row(tmp_path):
+    engine = init_db(create_writer_engine(f"sqlite:///{tmp_path / 'dq.db'}"))
+    save_metrics(profile_tracks(_frame(_items()), level="full"), engine, "user0")
+
+    with engine.connect() as conn:
+        row = conn.execute(select(DataQualityRun)).one()
+    engine.dispose()
+    assert (row.user_id, row.level, row.rows, row.missing_values, row.duplicate_rows) == ("user0", "full", 42, 3, 2)
+    assert row.sampled_rows == 42 and row.unique_tracks and json.loads(row.top_artists)
+
+
+def test_stream_to_db_saves_one_metrics_row_per_run(monkeypatch):
+    user_id = f"dq-{uuid.uuid4().hex[:8]}"
+    with MockSpotifyServer(history=make_history(120)) as server:
+        monkeypatch.setattr(SpotifyData, "BASE_URL", server.url + "/v1/me/player/recently-played")
+        spotify_data = SpotifyData(auth=StaticAuth(user_id))
+        spotify_data.stream_to_db(dq_level="counts")
+        # nothing new on the second run: no plays, no metrics row
+        spotify_data.stream_to_db(dq_level="counts")
+
+    with spotify_data.engine.connect() as conn:
+        rows = conn.execute(select(DataQualityRun).where(DataQualityRun.user_id == user_id)).all()
+    assert [(row.level, row.rows, row.duplicate_rows) for row in rows] == [("counts", 120, 0)]
@@ -0,0 +1,117 @@
+import socket
+import threading
+import time
+
+import pytest
+import requests
+
+from spotify_pipeline.benchmarks.mock_spotify import MockSpotifyServer, make_history
+from spotify_pipeline.resources.http_client import SpotifyHttpClient, TokenBucket
+
+
+RECENTLY_PLAYED = "/v1/me/player/recently-played"
+
+
+def _client(**kwargs):
+    kwargs.setdefault("backoff_base", 0.001)
+    kwargs.setdefault("backoff_max", 0.01)
+    return SpotifyHttpClient(timeout=(1, 5), **kwargs)
+
+
+def test_retries_5xx_until_success():
+    with MockSpotifyServer(history=make_history(10), fault_rate=0.5, fault_statuses=(500, 503)) as server:
+        client = _client(max_retries=30)
+        responses = [client.get(server.url + RECENTLY_PLAYED) for _ in range(20)]
+
+    assert all(response.status_code == 200 for response in responses)
+    assert server.stats["faults"] > 0
+    assert client.retry_count == server.stats["requests"] - 20
+
+
+def test_returns_last_response_after_max_retries():
+    with MockSpotifyServer(fault_rate=1.0, fault_statuses=(503,)) as server:
+        response = _client(max_retries=3).get(server.url + RECENTLY_PLAYED)
+
+    assert response.status_code == 503
+    assert server.stats["requests"] == 4
+
+
+def test_waits_out_the_full_retry_after():
+    # backoff_max is far below the server's Retry-After, which must still be honoured
+    with MockSpotifyServer(fault_rate=1.0, fault_statuses=(429,), retry_after=0.3) as server:
+        start = time.monotonic()
+        response = _client(max_retries=2, backoff_max=0.01).get(server.url + RECENTLY_PLAYED)
+        elapsed = time.monotonic() - start
+
+    assert response.status_code == 429
+    assert server.stats["requests"] == 3
+    assert elapsed >= 0.6
+
+
+def test_retry_after_over_the_limit_fails_fast():
+    with MockSpotifyServer(fault_rate=1.0, fault_statuses=(429,), retry_after=600) as server:
+        start = time.monotonic()
+        response = _client(max_retries=5, max_retry_after=60).get(server.url + RECENTLY_PLAYED)
+
+    assert response.status_code == 429
+    assert server.stats["requests"] == 1
+    assert time.monotonic() - start < 5
+
+
+def test_connection_errors_back_off_then_raise():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    client = _client(max_retries=3)
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.get(f"http://127.0.0.1:{port}{RECENTLY_PLAYED}")
+    assert client.retry_count == 3
+
+
+def test_backoff_is_capped_full_jitter():
+    client = SpotifyHttpClient(backoff_base=0.5, backoff_max=2.0)
+    delays = [client._backoff(attempt) for attempt in range(10) for _ in range(50)]
+
+    assert all(0 <= delay <= 2.0 for delay in delays)
+    assert all(client._backoff(0) <= 0.5 for _ in range(50))
+
+
+def test_rate_limiter_keeps_under_the_server_limit():
+    # the server answers 429 above 10 requests in any rolling second; the shared bucket never gets there
+    with MockSpotifyServer(history=make_history(10), rate_limit=10) as server:
+        client = _client(rate_limiter=TokenBucket(8, capacity=1))
+        threads = [threading.Thread(target=lambda: [client.get(server.url + RECENTLY_PLAYED) for _ in range(3)])
+                   for _ in range(4)]
+        start = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - start
+
+    assert server.stats["rate_limited"] == 0
+    assert server.stats["requests"] == 12
+    assert elapsed >= 11 / 8 - 0.1
+
+
+def test_rate_limited_requests_are_retried():
+    with MockSpotifyServer(history=make_history(10), rate_limit=5) as server:
+        client = _client(max_retries=10)
+        responses = [client.get(server.url + RECENTLY_PLAYED) for _ in range(8)]
+
+    assert all(response.status_code == 200 for response in responses)
+    assert server.stats["rate_limited"] > 0
+
+
+def test_retry_count_is_exact_across_threads():
+    with MockSpotifyServer(history=make_history(10), fault_rate=0.5, fault_statuses=(503,)) as server:
+        client = _client(max_retries=50)
+        threads = [threading.Thread(target=lambda: [client.get(server.url + RECENTLY_PLAYED) for _ in range(25)])
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert client.retry_count == server.stats["requests"] - 8 * 25
@@ -0,0 +1,41 @@
+import uuid
+
+from spotify_pipeline.benchmarks.mock_spotify import MockSpotifyServer, make_history
+from spotify_pipeline.resources.landing import LandingZone, read_segment
+from spotify_pipeline.resources.spotify_data import SpotifyData
+
+
+class StaticAuth:
+    """
+    Stands in for SpotifyAuth; the mock accepts any token
+    """
+
+    access_token = "mock-token"
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+
+    def get_access_token(self):
+        return self.access_token
+
+
+def _landed(landing, user_id):
+    return [item["played_at"] for path in landing.segments(user_id) for item in read_segment(path)]
+
+
+def test_incremental_runs_land_each_play_once(tmp_path, monkeypatch):
+    user_id = f"landing-{uuid.uuid4().hex[:8]}"
+    landing = LandingZone(tmp_path / "landing")
+    with MockSpotifyServer(history=make_history(130)) as server:
+        monkeypatch.setattr(SpotifyData, "BASE_URL", server.url + "/v1/me/player/recently-played")
+        spotify_data = SpotifyData(auth=StaticAuth(user_id))
+        spotify_data.landing = landing
+
+        spotify_data.stream_to_db()
+        # the next run sees 10 new plays on a page that overlaps the watermark, then nothing new
+        server.set_history(make_history(140))
+        spotify_data.stream_to_db()
+        spotify_data.stream_to_db()
+
+    landed = _landed(landing, user_id)
+    assert len(landed) == len(set(landed)) == 140
@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import create_engine, func, inspect, select, text
+
+from spotify_pipeline.models.migrations import LEGACY_TABLE
+from spotify_pipeline.models.spotify_models import DailyPlays, Play, init_db
+from spotify_pipeline.resources import bulk_loader
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    # the original text-only tracks table: one row per play, keyed on (id, played_at)
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE tracks (id VARCHAR, name VARCHAR, artist VARCHAR, album VARCHAR, played_at VARCHAR, "
+            "PRIMARY KEY (id, played_at))"
+        ))
+        conn.execute(text("INSERT INTO tracks VALUES (:id, :name, :artist, :album, :played_at)"), [
+            {"id": f"track{i % 7}", "name": f"Song {i % 7}", "artist": f"Artist {i % 3}", "album": f"Album {i % 5}",
+             "played_at": f"2024-05-01T{i // 60:02d}:{i % 60:02d}:00.000Z"}
+            for i in range(50)
+        ])
+    yield engine
+    engine.dispose()
+
+
+def _counts(engine):
+    with engine.connect() as conn:
+        return (conn.execute(select(func.count()).select_from(Play)).scalar(),
+                conn.execute(select(func.coalesce(func.sum(DailyPlays.play_count), 0))).scalar())
+
+
+def test_migrates_legacy_tracks(legacy_engine):
+    init_db(legacy_engine)
+
+    assert _counts(legacy_engine) == (50, 50)
+    assert LEGACY_TABLE not in inspect(legacy_engine).get_table_names()
+
+
+def test_resumes_a_migration_that_died_during_the_load(legacy_engine, monkeypatch):
+    upsert_plays = bulk_loader.upsert_plays
+
+    def crash_after_first_chunk(records, engine, chunk_size):
+        upsert_plays(list(records)[:20], engine, chunk_size=chunk_size)
+        raise RuntimeError("killed")
+
+    monkeypatch.setattr(bulk_loader, "upsert_plays", crash_after_first_chunk)
+    with pytest.raises(RuntimeError):
+        init_db(legacy_engine)
+    assert LEGACY_TABLE in inspect(legacy_engine).get_table_names()
+    assert _counts(legacy_engine) == (20, 20)
+
+    # the restart finds tracks_legacy next to the new tracks dimension and loads the rest
+    monkeypatch.setattr(bulk_loader, "upsert_plays", upsert_plays)
+    init_db(legacy_engine)
+
+    assert _counts(legacy_engine) == (50, 50)
+    assert LEGACY_TABLE not in inspect(legacy_engine).get_table_names()
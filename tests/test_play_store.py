@@ -0,0 +1,102 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from spotify_pipeline.benchmarks.mock_spotify import make_history, make_play_item
+from spotify_pipeline.resources.play_store import PlayBatch
+from spotify_pipeline.resources.spotify_data import SpotifyData
+from spotify_pipeline.resources.transform import flatten_play, played_at_to_ms
+
+
+class StaticAuth:
+    """
+    Stands in for SpotifyAuth; no request is made
+    """
+
+    access_token = "mock-token"
+    user_id = "user0"
+
+    def get_access_token(self):
+        return self.access_token
+
+
+def _items():
+    items = make_history(20)
+    # a play without album or duration, one whose only artist has no id, and one without artists
+    items[3]["track"].update(album=None, duration_ms=None)
+    items[5]["track"]["artists"] = [{"id": None, "name": "Someone"}]
+    items[7]["track"]["artists"] = []
+    return items
+
+
+def _expected(items, user_id="user0"):
+    records = [flatten_play(item, user_id) for item in items]
+    for record in records:
+        record.update(played_at=played_at_to_ms(record["played_at"]), artists=tuple(record["artists"]))
+    return records
+
+
+def test_iteration_round_trips_flattened_records():
+    items = _items()
+    batch = PlayBatch.from_items(items, "user0")
+
+    assert len(batch) == len(items)
+    assert list(batch) == _expected(items)
+    # what replay workers send back to the main process
+    assert list(pickle.loads(pickle.dumps(batch))) == _expected(items)
+
+
+def test_items_without_track_id_or_played_at_are_dropped():
+    items = make_history(3)
+    items[0]["track"]["id"] = None
+    del items[1]["played_at"]
+    podcast = {"played_at": items[2]["played_at"], "track": None}
+
+    batch = PlayBatch()
+    assert batch.extend([*items, podcast], "user0") == 1
+    assert list(batch) == _expected(items[2:])
+
+
+def test_to_pandas_types_and_values():
+    items = _items()
+    df = PlayBatch.from_items(items, "user0").to_pandas()
+    expected = _expected(items)
+
+    for column in ("user_id", "track_id", "track_name", "album_id", "album_name", "artist_name"):
+        assert isinstance(df[column].dtype, pd.CategoricalDtype)
+    assert df["played_at"].dtype == np.int64
+    # one missing duration turns the column into float with NaN
+    assert df["duration_ms"].dtype == np.float64 and df["duration_ms"].isna().tolist() == [
+        i == 3 for i in range(len(items))]
+
+    for column in ("user_id", "track_id", "track_name", "album_id", "album_name", "played_at"):
+        assert [None if pd.isna(value) else value for value in df[column]] == [r[column] for r in expected]
+    assert df["artists"].tolist() == [r["artists"] for r in expected]
+    assert df.loc[3, ["album_id", "album_name"]].isna().all()
+    assert df.loc[5, "artist_name"] == "Someone" and pd.isna(df.loc[7, "artist_name"])
+
+
+def test_to_arrow_types_and_values():
+    items = _items()
+    table = PlayBatch.from_items(items, "user0").to_arrow()
+
+    assert table.schema.field("track_id").type == pa.dictionary(pa.int32(), pa.string())
+    assert table.schema.field("played_at").type == pa.int64()
+    assert table.column("played_at").to_pylist() == [played_at_to_ms(item["played_at"]) for item in items]
+    assert table.column("duration_ms").null_count == 1 and table.column("duration_ms")[3].as_py() is None
+    assert table.column("album_id")[3].as_py() is None
+    assert table.column("artist_name").to_pylist()[5:8] == ["Someone", items[6]["track"]["artists"][0]["name"], None]
+
+
+def test_store_tracks_in_dataframe_columns_and_dtypes():
+    spotify_data = SpotifyData(auth=StaticAuth())
+    items = [make_play_item(1_700_000_000_000 + i * 200_000, i) for i in range(5)]
+    df = spotify_data.store_tracks_in_dataframe(items, dq_level="off")
+
+    assert list(df.columns) == SpotifyData.DATAFRAME_COLUMNS
+    assert {column: str(df[column].dtype) for column in df if not isinstance(df[column].dtype, pd.CategoricalDtype)} \
+        == {"played_at": "int64", "duration_ms": "int64", "artists": "object"}
+    assert df["played_at"].tolist() == [1_700_000_000_000 + i * 200_000 for i in range(5)]
+    assert df["artists"].tolist() == [((f"artist{i:05d}", f"Artist {i}"),) for i in range(5)]
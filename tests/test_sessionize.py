@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+from spotify_pipeline.resources.sessionize import SESSION_COLUMNS, sessionize, sessionize_frame
+
+
+MINUTE = 60_000
+T0 = 1_700_000_000_000
+
+
+def test_splits_per_user():
+    # interleaved in time and unsorted: each user's plays form their own sessions
+    played_at = [T0 + 2 * MINUTE, T0, T0 + MINUTE, T0 + 3 * MINUTE]
+    sessions = sessionize(played_at, user_ids=["b", "a", "b", "a"], gap_minutes=30)
+
+    assert sessions[["user_id", "started_at", "ended_at", "track_count"]].values.tolist() == [
+        ["b", T0 + MINUTE, T0 + 2 * MINUTE, 2],
+        ["a", T0, T0 + 3 * MINUTE, 2],
+    ]
+
+
+def test_gap_at_the_threshold_continues_the_session():
+    played_at = [T0, T0 + 30 * MINUTE, T0 + 60 * MINUTE + 1]
+    sessions = sessionize(played_at, gap_minutes=30)
+
+    assert sessions["started_at"].tolist() == [T0, T0 + 60 * MINUTE + 1]
+    assert sessions["track_count"].tolist() == [2, 1]
+
+
+def test_ended_at_includes_the_last_track_duration():
+    sessions = sessionize([T0, T0 + MINUTE, T0 + 90 * MINUTE], durations=[180_000, 200_000, None], gap_minutes=30)
+
+    # a missing duration ends the session at its last play
+    assert sessions["ended_at"].tolist() == [T0 + MINUTE + 200_000, T0 + 90 * MINUTE]
+
+
+def test_distinct_artists_skip_missing_artists():
+    frame = pd.DataFrame({
+        "played_at": [T0, T0 + MINUTE, T0 + 2 * MINUTE, T0 + 3 * MINUTE, T0 + 120 * MINUTE],
+        "artist": ["x", "y", np.nan, "x", np.nan],
+    })
+    sessions = sessionize_frame(frame, gap_minutes=30)
+
+    assert sessions["distinct_artists"].tolist() == [2, 0]
+    assert sessions["track_count"].tolist() == [4, 1]
+
+
+def test_sessions_longer_than_a_day():
+    # a play every 20 minutes for 30 hours never breaks a 30 minute gap
+    played_at = T0 + np.arange(0, 30 * 60 + 1, 20) * MINUTE
+    sessions = sessionize_frame(pd.DataFrame({"played_at": pd.to_datetime(played_at, unit="ms", utc=True)}),
+                                gap_minutes=30)
+
+    assert len(sessions) == 1
+    assert sessions["ended_at"].iloc[0] - sessions["started_at"].iloc[0] == 30 * 60 * MINUTE
+
+
+def test_empty_input():
+    sessions = sessionize([])
+
+    assert sessions.empty and list(sessions.columns) == SESSION_COLUMNS
@@ -0,0 +1,114 @@
+import random
+from datetime import date
+
+import numpy as np
+import pytest
+
+from spotify_pipeline.benchmarks.synthetic import generate_n_plays, to_records
+from spotify_pipeline.models.database import create_writer_engine
+from spotify_pipeline.models.spotify_models import init_db
+from spotify_pipeline.resources.bulk_loader import upsert_plays
+from spotify_pipeline.resources.sketches import (
+    CMS_DEPTH, KINDS, PlaySketch, PlayTally, _columns, hash64, merge_sketches,
+)
+from spotify_pipeline.visualization import data_loader
+
+
+def _plays(n, tracks=50, artists=5000, seed=0):
+    # few tracks, so Space-Saving keeps every one of them exactly; many artists for the HyperLogLog
+    rng = random.Random(seed)
+    return [{"track_id": 1 + int(rng.paretovariate(1.2)) % tracks, "artist_id": rng.randrange(1, artists),
+             "album_id": None if i % 10 == 0 else rng.randrange(1, 300)} for i in range(n)]
+
+
+def _assert_same(a, b, kinds=KINDS):
+    assert a.plays == b.plays
+    assert np.array_equal(a.registers, b.registers)
+    assert np.array_equal(a.cells, b.cells)
+    for kind in kinds:
+        assert a.top[kind].counters == b.top[kind].counters
+
+
+def test_distinct_count_within_three_standard_errors():
+    n = 20_000
+    sketch = PlaySketch().update({"track_id": i, "artist_id": None, "album_id": None} for i in range(1, n + 1))
+
+    error = sketch.error_bounds()["distinct_error"]
+    assert abs(sketch.distinct_count("track") - n) <= 3 * error * n
+    assert sketch.distinct_count("artist") == 0
+
+
+def test_merging_split_sketches_equals_the_sketch_of_all_plays():
+    plays = _plays(6000)
+    whole = PlaySketch().update(plays)
+
+    # HyperLogLog and Count-Min merge exactly; Space-Saving only while the ids fit its capacity (tracks here)
+    merged = PlaySketch().update(plays[:2500]).merge(PlaySketch().update(plays[2500:]))
+    _assert_same(merged, whole, kinds=("track",))
+    # the vectorized merge of stored sketches and day tallies agrees too
+    blobs = [PlaySketch().update(plays[:2500]).to_bytes(), PlayTally().update(plays[2500:4000]).to_bytes(),
+             PlaySketch().update(plays[4000:]).to_bytes()]
+    _assert_same(merge_sketches(blobs), whole, kinds=("track",))
+
+
+def test_serialization_round_trip():
+    sketch = PlaySketch().update(_plays(3000))
+    _assert_same(PlaySketch.from_bytes(sketch.to_bytes()), sketch)
+
+    tally = PlayTally().update(_plays(200))
+    restored = PlayTally.from_bytes(tally.to_bytes())
+    assert restored.plays == tally.plays and restored.counts == tally.counts
+    with pytest.raises(ValueError):
+        PlayTally.from_bytes(sketch.to_bytes())
+
+
+def test_count_min_never_underestimates():
+    plays = _plays(20_000, tracks=5000)
+    sketch = PlaySketch().update(plays)
+    true = {}
+    for play in plays:
+        true[play["track_id"]] = true.get(play["track_id"], 0) + 1
+
+    ids = list(true)
+    cells = sketch.cells[KINDS.index("track")]
+    estimates = cells[np.arange(CMS_DEPTH)[:, None], _columns(hash64(ids))].min(axis=0)
+    assert all(estimate >= true[i] for i, estimate in zip(ids, estimates))
+    assert all(count >= true[i] for i, count in sketch.top_items("track", 20))
+
+
+@pytest.fixture(scope="module")
+def db_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("sketches") / "sketches.db")
+    engine = init_db(create_writer_engine(f"sqlite:///{path}"))
+    upsert_plays(to_records(generate_n_plays(3000, users=2)), engine)
+    engine.dispose()
+    return path
+
+
+@pytest.mark.parametrize("user_id, start, end", [
+    (None, None, None),
+    ("user0", None, None),
+    # November from its monthly sketch, edge days on either side from the daily ones
+    (None, date(2023, 10, 29), date(2023, 12, 20)),
+    # no whole month in range: daily sketches only
+    ("user1", date(2023, 11, 12), date(2023, 12, 20)),
+])
+def test_load_approximate_agrees_with_the_exact_views(db_path, user_id, start, end):
+    approximate = data_loader.load_approximate(10, user_id=user_id, db_path=db_path, start=start, end=end)
+    summary = data_loader.load_summary(user_id=user_id, db_path=db_path, start=start, end=end)
+    error = approximate["error"]
+
+    assert approximate["summary"]["total_plays"] == summary["total_plays"]
+    for metric in ("unique_artists", "unique_albums"):
+        assert abs(approximate["summary"][metric] - summary[metric]) <= 3 * error["distinct_error"] * summary[metric]
+
+    # ties may rank differently; each estimate is at or slightly above the exact count
+    exact = data_loader.load_top_artists(50, user_id=user_id, db_path=db_path, start=start, end=end)
+    exact = dict(zip(exact["artist"], exact["play_count"]))
+    for artist, count in approximate["top_artists"].head(5).itertuples(index=False, name=None):
+        assert exact[artist] <= count <= exact[artist] + error["count_error"]
+
+    exact = data_loader.load_top_tracks(50, user_id=user_id, db_path=db_path, start=start, end=end)
+    exact = {(row.name, row.artist): row.play_count for row in exact.itertuples()}
+    for row in approximate["top_songs"].head(5).itertuples():
+        assert exact[(row.name, row.artist)] <= row.play_count <= exact[(row.name, row.artist)] + error["count_error"]
@@ -0,0 +1,79 @@
+import json
+import multiprocessing
+import os
+import time
+
+from spotify_pipeline.resources.spotify_auth import SpotifyAuth
+from spotify_pipeline.resources.token_store import TokenStore
+
+
+def _rotate_in_another_process(path, user_id, state):
+    # what a cron fetch or Dagster run does after refreshing: rewrite the whole file
+    with open(f"{path}.new", "w") as f:
+        json.dump({user_id: state}, f)
+    os.replace(f"{path}.new", path)
+
+
+def _hold_lock(path, user_id, seconds, ready):
+    with TokenStore(path).lock(user_id):
+        ready.set()
+        time.sleep(seconds)
+
+
+def test_load_sees_a_token_rotated_by_another_process(tmp_path):
+    path = str(tmp_path / "tokens.json")
+    store = TokenStore(path)
+    store.save("user0", {"access_token": "old", "refresh_token": "r1", "expires_at": 1})
+    assert store.load("user0")["refresh_token"] == "r1"
+
+    _rotate_in_another_process(path, "user0", {"access_token": "new", "refresh_token": "r2",
+                                               "expires_at": time.time() + 3600})
+
+    assert store.load("user0")["refresh_token"] == "r2"
+
+
+def test_expired_token_is_taken_from_the_file_before_refreshing(tmp_path):
+    path = str(tmp_path / "tokens.json")
+    store = TokenStore(path)
+    # both entries descend from the registry's r0, rotated to r1 and r2 by earlier refreshes
+    store.save("user0", {"access_token": "old", "refresh_token": "r1", "granted_refresh_token": "r0",
+                         "expires_at": 1})
+    auth = SpotifyAuth(user_id="user0", token_store=store, refresh_token="r0")
+
+    _rotate_in_another_process(path, "user0", {"access_token": "new", "refresh_token": "r2",
+                                               "granted_refresh_token": "r0", "expires_at": time.time() + 3600})
+
+    # no HTTP call: AUTH_URL is never reached because the rotated token is still valid
+    auth.AUTH_URL = "http://127.0.0.1:9/unreachable"
+    assert auth.get_access_token() == "new"
+    assert auth.refresh_token == "r2"
+
+
+def test_explicit_refresh_token_wins_over_another_grant(tmp_path):
+    store = TokenStore(str(tmp_path / "tokens.json"))
+    store.save("user0", {"access_token": "cached", "refresh_token": "revoked", "expires_at": time.time() + 3600})
+
+    # the user re-authorized and the registry now holds a new refresh token
+    auth = SpotifyAuth(user_id="user0", token_store=store, refresh_token="fresh")
+    assert auth.refresh_token == "fresh" and not auth.is_token_valid()
+
+    # the same grant keeps using its cached (and rotated) tokens
+    store.save("user0", {"access_token": "cached", "refresh_token": "rotated", "granted_refresh_token": "fresh",
+                         "expires_at": time.time() + 3600})
+    auth = SpotifyAuth(user_id="user0", token_store=store, refresh_token="fresh")
+    assert auth.get_access_token() == "cached" and auth.refresh_token == "rotated"
+
+
+def test_refresh_lock_is_held_across_processes(tmp_path):
+    path = str(tmp_path / "tokens.json")
+    ready = multiprocessing.Event()
+    other = multiprocessing.Process(target=_hold_lock, args=(path, "user0", 0.5, ready))
+    other.start()
+    assert ready.wait(10)
+
+    start = time.monotonic()
+    with TokenStore(path).lock("user0"):
+        waited = time.monotonic() - start
+    other.join()
+
+    assert waited >= 0.3